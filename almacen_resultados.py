@@ -0,0 +1,529 @@
+import csv
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+FORMATOS_EXPORTACION = ("xlsx", "csv", "json")
+# Tipos de trabajo con un único documento (su Excel conserva el formato de dos hojas)
+TIPOS_DOCUMENTO = ("texto", "pdf", "docx")
+# Tramos del histograma de notas finales (sobre 10)
+TRAMOS_DISTRIBUCION = 10
+
+
+def clave_rubrica(criterios_dict: Dict[str, float]) -> str:
+    """
+    Calcula la clave de una rúbrica (mismos criterios y notas en el mismo orden).
+    Args:
+        criterios_dict (Dict[str, float]): Criterios con sus notas máximas.
+    Returns:
+        str: Hash SHA-256 en hexadecimal (16 caracteres).
+    """
+    material = json.dumps([[nombre, float(nota)] for nombre, nota in criterios_dict.items()], ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
+
+
+def _numero(valor) -> Optional[float]:
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(numero) else numero
+
+
+class AlmacenResultados:
+    def __init__(
+        self,
+        ruta_db: str = os.path.join("resultados", "resultados.sqlite3"),
+        carpeta_exportaciones: str = os.path.join("resultados", "exportaciones")
+    ):
+        """
+        Almacén de resultados en SQLite indexado por trabajo, entrega y rúbrica.
+        Cada trabajo guarda sus entregas (una por documento o fila de Excel) y los
+        puntajes por criterio en tablas aparte, de modo que las consultas y los
+        agregados de la clase no necesitan leer ningún Excel. Las exportaciones
+        (Excel, CSV o JSON) se generan solo cuando alguien las descarga y se
+        conservan en disco hasta que el trabajo cambia.
+        Args:
+            ruta_db (str): Ruta de la base SQLite.
+            carpeta_exportaciones (str): Carpeta de las exportaciones ya generadas.
+        """
+        self.carpeta_exportaciones = os.path.abspath(carpeta_exportaciones)
+        for carpeta in (os.path.dirname(ruta_db), self.carpeta_exportaciones):
+            if carpeta:
+                os.makedirs(carpeta, exist_ok=True)
+        self._lock = threading.Lock()
+        self._lock_exportar = threading.Lock()
+        self._db = sqlite3.connect(ruta_db, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS trabajos ("
+            " id TEXT PRIMARY KEY, tipo TEXT NOT NULL, origen TEXT NOT NULL, rubrica TEXT NOT NULL,"
+            " clave_rubrica TEXT NOT NULL, estado TEXT NOT NULL, creado REAL NOT NULL, actualizado REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_trabajos_rubrica ON trabajos (clave_rubrica, creado);"
+            "CREATE TABLE IF NOT EXISTS entregas ("
+            " trabajo TEXT NOT NULL, posicion INTEGER NOT NULL, archivo TEXT, tarea TEXT, nota REAL,"
+            " error TEXT, revision TEXT, tokens_original INTEGER, tokens_enviado INTEGER,"
+            " PRIMARY KEY (trabajo, posicion)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS puntajes ("
+            " trabajo TEXT NOT NULL, posicion INTEGER NOT NULL, criterio INTEGER NOT NULL, puntaje REAL,"
+            " justificacion TEXT, PRIMARY KEY (trabajo, posicion, criterio)) WITHOUT ROWID;"
+        )
+        # Bases creadas antes de registrar los tokens del texto de cada entrega
+        columnas = {fila[1] for fila in self._db.execute("PRAGMA table_info(entregas)")}
+        for columna in ("tokens_original", "tokens_enviado"):
+            if columna not in columnas:
+                self._db.execute(f"ALTER TABLE entregas ADD COLUMN {columna} INTEGER")
+        self._db.commit()
+
+    # =====================================================
+    # ESCRITURA
+    # =====================================================
+    def registrar_trabajo(self, trabajo_id: str, criterios_dict: Dict[str, float], tipo: str, origen: str = "") -> None:
+        """
+        Crea (o reinicia) un trabajo con su rúbrica.
+        Args:
+            trabajo_id (str): Identificador del trabajo.
+            criterios_dict (Dict[str, float]): Criterios con sus notas máximas.
+            tipo (str): Tipo de entrada (texto, pdf, docx, xlsx, zip...).
+            origen (str): Nombre del archivo subido.
+        """
+        rubrica = [{"nombre": nombre, "notaMax": float(nota)} for nombre, nota in criterios_dict.items()]
+        ahora = time.time()
+        with self._lock:
+            self._db.execute("DELETE FROM entregas WHERE trabajo = ?", (trabajo_id,))
+            self._db.execute("DELETE FROM puntajes WHERE trabajo = ?", (trabajo_id,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO trabajos (id, tipo, origen, rubrica, clave_rubrica, estado, creado, actualizado)"
+                " VALUES (?, ?, ?, ?, ?, 'en_proceso', ?, ?)",
+                (trabajo_id, tipo, origen, json.dumps(rubrica, ensure_ascii=False),
+                 clave_rubrica(criterios_dict), ahora, ahora)
+            )
+            self._db.commit()
+
+    def escritor(self, trabajo_id: str, criterios_dict: Dict[str, float], tipo: str,
+                 origen: str = "") -> "EscritorAlmacen":
+        """
+        Registra el trabajo y devuelve un escritor de filas con la misma interfaz que
+        `EscritorResultados` (escribir, cerrar, abortar).
+        Args:
+            trabajo_id (str): Identificador del trabajo.
+            criterios_dict (Dict[str, float]): Criterios con sus notas máximas.
+            tipo (str): Tipo de entrada.
+            origen (str): Nombre del archivo subido.
+        Returns:
+            EscritorAlmacen: Escritor de las entregas del trabajo.
+        """
+        self.registrar_trabajo(trabajo_id, criterios_dict, tipo, origen)
+        return EscritorAlmacen(self, trabajo_id, list(criterios_dict))
+
+    def guardar_resultado(self, trabajo_id: str, criterios_dict: Dict[str, float], tipo: str, origen: str,
+                          resultado: Dict) -> None:
+        """
+        Guarda la evaluación de un único documento como un trabajo de una entrega.
+        Args:
+            trabajo_id (str): Identificador del trabajo.
+            criterios_dict (Dict[str, float]): Criterios con sus notas máximas.
+            tipo (str): Tipo de entrada (texto, pdf o docx).
+            origen (str): Nombre del archivo subido.
+            resultado (Dict): Resultado devuelto por el evaluador.
+        """
+        fila = {"Tarea": origen, "Calificación Final": resultado.get("Calificación Final"),
+                "Error": resultado.get("error")}
+        if "tokens_texto" in resultado:
+            fila["Tokens originales"] = resultado["tokens_texto"]["original"]
+            fila["Tokens enviados"] = resultado["tokens_texto"]["enviado"]
+        for criterio in resultado.get("criterios", []):
+            fila[f"{criterio['nombre']} (Puntaje)"] = criterio.get("puntaje")
+            fila[f"{criterio['nombre']} (Justificación)"] = criterio.get("justificacion")
+        escritor = self.escritor(trabajo_id, criterios_dict, tipo, origen)
+        escritor.escribir(fila)
+        escritor.cerrar()
+
+    def _insertar(self, trabajo_id: str, entregas: List[Tuple], puntajes: List[Tuple],
+                  estado: Optional[str] = None) -> None:
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO entregas (trabajo, posicion, archivo, tarea, nota, error, revision,"
+                " tokens_original, tokens_enviado) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", entregas
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO puntajes (trabajo, posicion, criterio, puntaje, justificacion)"
+                " VALUES (?, ?, ?, ?, ?)", puntajes
+            )
+            if estado is None:
+                self._db.execute("UPDATE trabajos SET actualizado = ? WHERE id = ?", (time.time(), trabajo_id))
+            else:
+                self._db.execute("UPDATE trabajos SET actualizado = ?, estado = ? WHERE id = ?",
+                                 (time.time(), estado, trabajo_id))
+            self._db.commit()
+
+    # =====================================================
+    # CONSULTAS
+    # =====================================================
+    def trabajo(self, trabajo_id: str) -> Optional[Dict]:
+        """
+        Devuelve los datos de un trabajo.
+        Args:
+            trabajo_id (str): Identificador del trabajo.
+        Returns:
+            Optional[Dict]: Tipo, origen, rubrica, estado, fechas y número de entregas; None si no existe.
+        """
+        with self._lock:
+            fila = self._db.execute(
+                "SELECT t.id, t.tipo, t.origen, t.rubrica, t.clave_rubrica, t.estado, t.creado, t.actualizado,"
+                " (SELECT COUNT(*) FROM entregas e WHERE e.trabajo = t.id) FROM trabajos t WHERE t.id = ?",
+                (trabajo_id,)
+            ).fetchone()
+        return self._trabajo_desde_fila(fila) if fila else None
+
+    def trabajos(self, clave: Optional[str] = None, limite: int = 50) -> List[Dict]:
+        """
+        Lista los trabajos más recientes.
+        Args:
+            clave (Optional[str]): Si se indica, solo los trabajos con esta clave de rúbrica.
+            limite (int): Trabajos máximos.
+        Returns:
+            List[Dict]: Trabajos del más reciente al más antiguo.
+        """
+        consulta = ("SELECT t.id, t.tipo, t.origen, t.rubrica, t.clave_rubrica, t.estado, t.creado, t.actualizado,"
+                    " (SELECT COUNT(*) FROM entregas e WHERE e.trabajo = t.id) FROM trabajos t")
+        parametros: Tuple = ()
+        if clave:
+            consulta += " WHERE t.clave_rubrica = ?"
+            parametros = (clave,)
+        with self._lock:
+            filas = self._db.execute(consulta + " ORDER BY t.creado DESC LIMIT ?", parametros + (limite,)).fetchall()
+        return [self._trabajo_desde_fila(fila) for fila in filas]
+
+    @staticmethod
+    def _trabajo_desde_fila(fila: Tuple) -> Dict:
+        return {"id": fila[0], "tipo": fila[1], "origen": fila[2], "rubrica": json.loads(fila[3]),
+                "clave_rubrica": fila[4], "estado": fila[5], "creado": fila[6], "actualizado": fila[7],
+                "entregas": fila[8]}
+
+    def entregas(
+        self,
+        trabajo_id: str,
+        desplazamiento: int = 0,
+        limite: Optional[int] = 100,
+        orden: str = "posicion",
+        nota_min: Optional[float] = None,
+        nota_max: Optional[float] = None,
+        solo_errores: bool = False
+    ) -> List[Dict]:
+        """
+        Consulta las entregas de un trabajo con sus puntajes por criterio.
+        Args:
+            trabajo_id (str): Identificador del trabajo.
+            desplazamiento (int): Entregas a saltar (paginación).
+            limite (Optional[int]): Entregas máximas; None para todas.
+            orden (str): "posicion", "nota" (ascendente) o "-nota" (descendente).
+            nota_min (Optional[float]): Nota final mínima.
+            nota_max (Optional[float]): Nota final máxima.
+            solo_errores (bool): Solo las entregas que no se pudieron evaluar.
+        Returns:
+            List[Dict]: Entregas con posicion, archivo, tarea, nota, error, revision, tokens y criterios.
+        """
+        trabajo = self.trabajo(trabajo_id)
+        if trabajo is None:
+            return []
+        condiciones, parametros = ["trabajo = ?"], [trabajo_id]
+        if nota_min is not None:
+            condiciones.append("nota >= ?")
+            parametros.append(nota_min)
+        if nota_max is not None:
+            condiciones.append("nota <= ?")
+            parametros.append(nota_max)
+        if solo_errores:
+            condiciones.append("error IS NOT NULL")
+        ordenes = {"posicion": "posicion", "nota": "nota IS NULL, nota, posicion",
+                   "-nota": "nota IS NULL, nota DESC, posicion"}
+        consulta = (f"SELECT posicion, archivo, tarea, nota, error, revision, tokens_original, tokens_enviado"
+                    f" FROM entregas"
+                    f" WHERE {' AND '.join(condiciones)} ORDER BY {ordenes.get(orden, 'posicion')}"
+                    f" LIMIT ? OFFSET ?")
+        parametros += [-1 if limite is None else limite, desplazamiento]
+        with self._lock:
+            filas = self._db.execute(consulta, parametros).fetchall()
+            posiciones = [fila[0] for fila in filas]
+            puntajes: Dict[int, Dict[int, Tuple]] = {}
+            # Los puntajes se leen por tramos de posiciones (límite de parámetros de SQLite)
+            for inicio in range(0, len(posiciones), 500):
+                tramo = posiciones[inicio:inicio + 500]
+                for posicion, criterio, puntaje, justificacion in self._db.execute(
+                    f"SELECT posicion, criterio, puntaje, justificacion FROM puntajes WHERE trabajo = ?"
+                    f" AND posicion IN ({','.join('?' * len(tramo))})", [trabajo_id] + tramo
+                ):
+                    puntajes.setdefault(posicion, {})[criterio] = (puntaje, justificacion)
+        return [self._entrega(fila, trabajo["rubrica"], puntajes.get(fila[0], {})) for fila in filas]
+
+    @staticmethod
+    def _entrega(fila: Tuple, rubrica: List[Dict], puntajes: Dict[int, Tuple]) -> Dict:
+        posicion, archivo, tarea, nota, error, revision, tokens_original, tokens_enviado = fila
+        return {
+            "posicion": posicion, "archivo": archivo, "tarea": tarea, "nota": nota,
+            "error": error, "revision": revision,
+            "tokens": ({"original": tokens_original, "enviado": tokens_enviado}
+                       if tokens_original is not None else None),
+            "criterios": [{"nombre": criterio["nombre"], "notaMax": criterio["notaMax"],
+                           "puntaje": puntajes.get(i, (None, None))[0],
+                           "justificacion": puntajes.get(i, (None, None))[1]}
+                          for i, criterio in enumerate(rubrica)]
+        }
+
+    # =====================================================
+    # AGREGADOS DE LA CLASE
+    # =====================================================
+    def resumen(self, trabajo_id: Optional[str] = None, clave: Optional[str] = None) -> Optional[Dict]:
+        """
+        Calcula los agregados de un trabajo o de todos los trabajos con la misma rúbrica:
+        media, mediana, desviación, extremos, distribución de notas finales, medias por criterio
+        y tokens del texto antes y después de normalizarlo.
+        Las columnas se leen una sola vez y se agregan con NumPy.
+        Args:
+            trabajo_id (Optional[str]): Trabajo a resumir.
+            clave (Optional[str]): Clave de rúbrica (se usa si no se indica el trabajo).
+        Returns:
+            Optional[Dict]: Agregados; None si el trabajo o la rúbrica no existen.
+        """
+        import numpy as np
+
+        with self._lock:
+            if trabajo_id is not None:
+                fila = self._db.execute("SELECT rubrica FROM trabajos WHERE id = ?", (trabajo_id,)).fetchone()
+                filtro, parametro = "trabajo = ?", trabajo_id
+            else:
+                fila = self._db.execute("SELECT rubrica FROM trabajos WHERE clave_rubrica = ? LIMIT 1",
+                                        (clave,)).fetchone()
+                filtro, parametro = "trabajo IN (SELECT id FROM trabajos WHERE clave_rubrica = ?)", clave
+            if fila is None:
+                return None
+            rubrica = json.loads(fila[0])
+            entregas = self._db.execute(f"SELECT nota FROM entregas WHERE {filtro}", (parametro,)).fetchall()
+            tokens_original, tokens_enviado = self._db.execute(
+                f"SELECT SUM(tokens_original), SUM(tokens_enviado) FROM entregas WHERE {filtro}", (parametro,)
+            ).fetchone()
+            puntajes = self._db.execute(
+                f"SELECT criterio, puntaje FROM puntajes WHERE {filtro} AND puntaje IS NOT NULL", (parametro,)
+            ).fetchall()
+
+        notas = np.array([nota for (nota,) in entregas if nota is not None], dtype=float)
+        resumen = {"trabajo": trabajo_id, "clave_rubrica": clave, "entregas": len(entregas),
+                   "evaluadas": int(notas.size), "errores": len(entregas) - int(notas.size)}
+        if notas.size:
+            cuartil_1, mediana, cuartil_3 = np.percentile(notas, [25, 50, 75])
+            resumen.update(media=round(float(notas.mean()), 2), mediana=round(float(mediana), 2),
+                           desviacion=round(float(notas.std()), 2), minimo=float(notas.min()),
+                           maximo=float(notas.max()), cuartil_1=round(float(cuartil_1), 2),
+                           cuartil_3=round(float(cuartil_3), 2))
+        conteos, bordes = np.histogram(notas, bins=TRAMOS_DISTRIBUCION, range=(0, 10))
+        resumen["distribucion"] = [{"desde": float(bordes[i]), "hasta": float(bordes[i + 1]), "entregas": int(n)}
+                                   for i, n in enumerate(conteos)]
+        if tokens_original:
+            resumen["tokens"] = {"original": tokens_original, "enviado": tokens_enviado,
+                                 "ahorro_porcentaje": round((1 - tokens_enviado / tokens_original) * 100, 1)}
+
+        # Medias, mínimos y máximos por criterio agrupando por su índice en la rúbrica
+        datos = np.array(puntajes, dtype=float).reshape(-1, 2)
+        indices, valores = datos[:, 0].astype(np.int64), datos[:, 1]
+        validos = indices < len(rubrica)
+        indices, valores = indices[validos], valores[validos]
+        cantidad = np.bincount(indices, minlength=len(rubrica))
+        sumas = np.bincount(indices, weights=valores, minlength=len(rubrica))
+        minimos = np.full(len(rubrica), np.inf)
+        maximos = np.full(len(rubrica), -np.inf)
+        np.minimum.at(minimos, indices, valores)
+        np.maximum.at(maximos, indices, valores)
+        resumen["criterios"] = []
+        for i, criterio in enumerate(rubrica):
+            media = sumas[i] / cantidad[i] if cantidad[i] else None
+            resumen["criterios"].append({
+                "nombre": criterio["nombre"],
+                "notaMax": criterio["notaMax"],
+                "evaluadas": int(cantidad[i]),
+                "media": None if media is None else round(float(media), 2),
+                "minimo": float(minimos[i]) if cantidad[i] else None,
+                "maximo": float(maximos[i]) if cantidad[i] else None,
+                "porcentaje_medio": (round(float(media / criterio["notaMax"] * 100), 1)
+                                     if media is not None and criterio["notaMax"] > 0 else None)
+            })
+        return resumen
+
+    # =====================================================
+    # EXPORTACIONES (BAJO DEMANDA)
+    # =====================================================
+    def exportar(self, trabajo_id: str, formato: str) -> Optional[str]:
+        """
+        Devuelve la ruta de la exportación de un trabajo, generándola solo si no existe
+        o si el trabajo cambió después de generarla.
+        Args:
+            trabajo_id (str): Identificador del trabajo.
+            formato (str): "xlsx", "csv" o "json".
+        Returns:
+            Optional[str]: Ruta del archivo; None si el trabajo no existe o no tiene entregas.
+        Raises:
+            ValueError: Si el formato no está soportado.
+        """
+        if formato not in FORMATOS_EXPORTACION:
+            raise ValueError(f"Formato de exportación no soportado: {formato}")
+        trabajo = self.trabajo(trabajo_id)
+        if trabajo is None or not trabajo["entregas"]:
+            return None
+        ruta = os.path.join(self.carpeta_exportaciones, f"{trabajo_id}.{formato}")
+        with self._lock_exportar:
+            if os.path.exists(ruta) and os.path.getmtime(ruta) >= trabajo["actualizado"]:
+                return ruta
+            descriptor, temporal = tempfile.mkstemp(dir=self.carpeta_exportaciones, suffix=".tmp")
+            os.close(descriptor)
+            try:
+                getattr(self, f"_exportar_{formato}")(trabajo, temporal)
+                os.replace(temporal, ruta)
+            except Exception:
+                os.remove(temporal)
+                raise
+        return ruta
+
+    def _iterar_entregas(self, trabajo_id: str, tam_pagina: int = 1000) -> Iterator[Dict]:
+        desplazamiento = 0
+        while True:
+            pagina = self.entregas(trabajo_id, desplazamiento, tam_pagina)
+            yield from pagina
+            if len(pagina) < tam_pagina:
+                return
+            desplazamiento += tam_pagina
+
+    def _columnas(self, trabajo: Dict) -> List[str]:
+        """Columnas de la tabla de resultados (las mismas que el Excel de `procesar_excel`)."""
+        with self._lock:
+            con_archivo, con_revision = self._db.execute(
+                "SELECT COUNT(archivo), COUNT(revision) FROM entregas WHERE trabajo = ?", (trabajo["id"],)
+            ).fetchone()
+        nombres = [criterio["nombre"] for criterio in trabajo["rubrica"]]
+        return ((["Archivo"] if con_archivo else []) + ["Tarea", "Calificación Final"]
+                + [f"{nombre} (Puntaje)" for nombre in nombres]
+                + [f"{nombre} (Justificación)" for nombre in nombres]
+                + ["Error"] + (["Revisión de plagio"] if con_revision else []))
+
+    @staticmethod
+    def _fila(entrega: Dict) -> Dict:
+        fila = {"Archivo": entrega["archivo"], "Tarea": entrega["tarea"], "Calificación Final": entrega["nota"],
+                "Error": entrega["error"], "Revisión de plagio": entrega["revision"]}
+        for criterio in entrega["criterios"]:
+            fila[f"{criterio['nombre']} (Puntaje)"] = criterio["puntaje"]
+            fila[f"{criterio['nombre']} (Justificación)"] = criterio["justificacion"]
+        return fila
+
+    def _exportar_xlsx(self, trabajo: Dict, ruta: str) -> None:
+        from openpyxl import Workbook
+
+        libro = Workbook(write_only=True)
+        if trabajo["tipo"] in TIPOS_DOCUMENTO and trabajo["entregas"] == 1:
+            # Un solo documento: hoja de criterios y hoja con la calificación final
+            entrega = self.entregas(trabajo["id"])[0]
+            hoja = libro.create_sheet("Criterios")
+            hoja.append(["Criterio", "Nota Máxima", "Puntaje", "Justificación"])
+            for criterio in entrega["criterios"]:
+                hoja.append([criterio["nombre"], criterio["notaMax"], criterio["puntaje"], criterio["justificacion"]])
+            hoja = libro.create_sheet("Calificación Final")
+            hoja.append(["Calificación Final", "Error"])
+            hoja.append([entrega["nota"], entrega["error"]])
+        else:
+            columnas = self._columnas(trabajo)
+            hoja = libro.create_sheet("Resultados")
+            hoja.append(columnas)
+            for entrega in self._iterar_entregas(trabajo["id"]):
+                fila = self._fila(entrega)
+                hoja.append([fila.get(columna) for columna in columnas])
+        libro.save(ruta)
+
+    def _exportar_csv(self, trabajo: Dict, ruta: str) -> None:
+        columnas = self._columnas(trabajo)
+        # utf-8-sig para que Excel reconozca las tildes al abrir el CSV
+        with open(ruta, "w", newline="", encoding="utf-8-sig") as archivo:
+            escritor = csv.writer(archivo)
+            escritor.writerow(columnas)
+            for entrega in self._iterar_entregas(trabajo["id"]):
+                fila = self._fila(entrega)
+                escritor.writerow(["" if fila.get(columna) is None else fila.get(columna) for columna in columnas])
+
+    def _exportar_json(self, trabajo: Dict, ruta: str) -> None:
+        with open(ruta, "w", encoding="utf-8") as archivo:
+            cabecera = json.dumps(trabajo, ensure_ascii=False)
+            # Se escribe entrega a entrega para no armar todo el documento en memoria
+            archivo.write(cabecera[:-1] + ', "resultados": [')
+            for i, entrega in enumerate(self._iterar_entregas(trabajo["id"])):
+                archivo.write((", " if i else "") + json.dumps(entrega, ensure_ascii=False))
+            archivo.write("]}")
+
+    def cerrar(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+# =====================================================
+# ESCRITOR DE FILAS
+# =====================================================
+class EscritorAlmacen:
+    def __init__(self, almacen: AlmacenResultados, trabajo_id: str, criterios: List[str], tam_lote: int = 1,
+                 max_espera: float = 1.0):
+        """
+        Guarda en el almacén las filas de resultados (el mismo diccionario que se escribe
+        en el Excel de `procesar_excel`). Por defecto cada fila se confirma al escribirla
+        (con WAL es barato), de modo que si el proceso se interrumpe las filas ya evaluadas
+        no se pierden, igual que con el CSV parcial de `EscritorResultados`.
+        Args:
+            almacen (AlmacenResultados): Almacén de destino.
+            trabajo_id (str): Trabajo al que pertenecen las filas.
+            criterios (List[str]): Nombres de los criterios, en el orden de la rúbrica.
+            tam_lote (int): Filas que se acumulan antes de cada inserción.
+            max_espera (float): Segundos máximos que una fila queda sin confirmar si `tam_lote` > 1.
+        """
+        self.almacen = almacen
+        self.trabajo_id = trabajo_id
+        self.criterios = criterios
+        self.tam_lote = tam_lote
+        self.max_espera = max_espera
+        self.filas = 0
+        self._ultimo_volcado = time.monotonic()
+        self._entregas: List[Tuple] = []
+        self._puntajes: List[Tuple] = []
+
+    def escribir(self, fila: Dict) -> None:
+        """
+        Agrega una fila de resultados.
+        Args:
+            fila (Dict): Valores indexados por nombre de columna.
+        """
+        posicion = self.filas
+        self._entregas.append((self.trabajo_id, posicion, fila.get("Archivo"), fila.get("Tarea"),
+                               _numero(fila.get("Calificación Final")), fila.get("Error") or None,
+                               fila.get("Revisión de plagio") or None, fila.get("Tokens originales"),
+                               fila.get("Tokens enviados")))
+        for i, nombre in enumerate(self.criterios):
+            puntaje = _numero(fila.get(f"{nombre} (Puntaje)"))
+            justificacion = fila.get(f"{nombre} (Justificación)")
+            if puntaje is not None or justificacion:
+                self._puntajes.append((self.trabajo_id, posicion, i, puntaje, justificacion))
+        self.filas += 1
+        if len(self._entregas) >= self.tam_lote or time.monotonic() - self._ultimo_volcado >= self.max_espera:
+            self._volcar()
+
+    def _volcar(self, estado: Optional[str] = None) -> None:
+        self.almacen._insertar(self.trabajo_id, self._entregas, self._puntajes, estado)
+        self._entregas, self._puntajes = [], []
+        self._ultimo_volcado = time.monotonic()
+
+    def cerrar(self) -> None:
+        """Inserta las filas pendientes y marca el trabajo como completado."""
+        self._volcar("completado")
+
+    def abortar(self) -> None:
+        """Conserva las filas ya evaluadas y marca el trabajo como incompleto."""
+        self._volcar("incompleto")
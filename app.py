@@ -1,24 +1,199 @@
-from flask import Flask, render_template, request, send_file, redirect, url_for
+from flask import Flask, Request, render_template, request, send_file, redirect, url_for, jsonify, Response, stream_with_context, abort
+import io
 import os
+import tempfile
+import json
+import threading
+import time
 from flask import send_from_directory
+from werkzeug.datastructures import FileStorage
 from werkzeug.utils import secure_filename
-from evaluador import EvaluadorTareas  # Usamos la nueva clase
+from evaluador import EvaluadorTareas, crear_rubrica  # Usamos la nueva clase
+from cliente_ollama import ClienteOllama
+from pool_ollama import PoolOllama
+from almacen_resultados import AlmacenResultados, FORMATOS_EXPORTACION
+from cache_evaluaciones import CacheEvaluaciones
+from cache_extraccion import configurar_cache_extraccion
+from trabajos import GestorTrabajos, ProcesoNoUnico, Trabajo
+from planificador import INTERACTIVA, LOTE, ColaLlena, PlanificadorModelo, identidad
+import metricas
+from metricas import medir_etapa, tipo_archivo
 #from procesadores.procesar_archivo import procesar_excel, procesar_pdf, procesar_word
-from procesadores.procesar_pdf import extraer_texto_pdf
-from procesadores.procesar_word import extraer_texto_word
-from procesadores.procesar_excel import extraer_texto_excel, procesar_excel
+# Los extractores (PyPDF2, python-docx, pandas, openpyxl) se importan en la ruta que los usa:
+# un worker nuevo arranca sin cargarlos y una petición de texto nunca los necesita
+
+
+class PeticionSubida(Request):
+    """
+    Petición que recibe cada archivo subido directamente en un SpooledTemporaryFile de hasta
+    SUBIDA_EN_MEMORIA bytes (por encima pasa a un temporal anónimo en disco). El trabajo se
+    queda con ese mismo flujo mediante `ceder_archivo`, sin copiarlo a otro buffer.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=app.config["SUBIDA_EN_MEMORIA"], mode="rb+")
+
+    @staticmethod
+    def ceder_archivo(archivo: FileStorage):
+        """
+        Entrega el flujo de la subida a quien lo procesa fuera de la petición.
+        Flask cierra los archivos de la petición al terminarla; a partir de aquí cierra un
+        flujo vacío y el flujo real lo cierra el trabajo.
+        """
+        flujo = archivo.stream
+        archivo.stream = io.BytesIO()
+        return flujo
+
 
 # ======================================================
 # CONFIGURACIÓN
 # ======================================================
 app = Flask(__name__)
-app.config["UPLOAD_FOLDER"] = "uploads"
+app.request_class = PeticionSubida
 app.config["RESULTADOS_FOLDER"] = "resultados"
-os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
+# Almacén SQLite de resultados; las exportaciones se generan al descargarlas (vacío para volver a los Excel por evaluación)
+app.config["RESULTADOS_DB"] = os.environ.get("RESULTADOS_DB", os.path.join("resultados", "resultados.sqlite3"))
+app.config["EXPORTACIONES_FOLDER"] = os.environ.get("EXPORTACIONES_FOLDER", os.path.join("resultados", "exportaciones"))
+# Las subidas se reciben en memoria; solo pasan a un temporal en disco por encima del umbral
+app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("MAX_SUBIDA_MB", 50)) * 1024 * 1024
+app.config["SUBIDA_EN_MEMORIA"] = int(os.environ.get("SUBIDA_EN_MEMORIA_MB", 8)) * 1024 * 1024
+# Servidor y modelo de Ollama
+app.config["OLLAMA_URL"] = os.environ.get("OLLAMA_URL", "http://localhost:11434/api/generate")
+app.config["OLLAMA_MODELO"] = os.environ.get("OLLAMA_MODELO", "mistral")
+# Varios servidores de Ollama separados por comas (reparto por menor carga); vacío usa solo OLLAMA_URL
+app.config["OLLAMA_URLS"] = [url.strip() for url in os.environ.get("OLLAMA_URLS", "").split(",") if url.strip()]
+# Peticiones simultáneas máximas por servidor del pool (0 = sin límite)
+app.config["OLLAMA_MAX_POR_SERVIDOR"] = int(os.environ.get("OLLAMA_MAX_POR_SERVIDOR", 0))
+# Filas de Excel evaluadas en paralelo (ajustar a OLLAMA_NUM_PARALLEL del servidor)
+app.config["CONCURRENCIA_EXCEL"] = int(os.environ.get("CONCURRENCIA_EXCEL", 4))
+# Filas de un Excel que se muestran en la página de resultados (el resto se descarga)
+app.config["VISTA_PREVIA_FILAS"] = int(os.environ.get("VISTA_PREVIA_FILAS", 20))
+# Filas cortas de Excel evaluadas juntas en un solo prompt (0 para desactivar)
+app.config["LOTE_TOKENS"] = int(os.environ.get("LOTE_TOKENS", 0))
+app.config["LOTE_MAX_FILAS"] = int(os.environ.get("LOTE_MAX_FILAS", 8))
+# Caché de evaluaciones (vacío para desactivarla)
+app.config["CACHE_EVALUACIONES"] = os.environ.get("CACHE_EVALUACIONES", os.path.join("cache", "evaluaciones.sqlite3"))
+app.config["CACHE_TTL"] = float(os.environ.get("CACHE_TTL", 7 * 24 * 3600))
+# Caché del texto extraído de PDF y Word por hash del contenido (vacío para desactivarla)
+app.config["CACHE_EXTRACCION"] = os.environ.get("CACHE_EXTRACCION", os.path.join("cache", "extraccion"))
+# Los textos en disco sin usar durante el TTL se borran; por encima de los límites, los de uso más antiguo
+app.config["CACHE_EXTRACCION_TTL"] = float(os.environ.get("CACHE_EXTRACCION_TTL", 30 * 24 * 3600))
+app.config["CACHE_EXTRACCION_MAX_ENTRADAS"] = int(os.environ.get("CACHE_EXTRACCION_MAX_ENTRADAS", 10000))
+app.config["CACHE_EXTRACCION_MAX_BYTES"] = int(os.environ.get("CACHE_EXTRACCION_MAX_MB", 1024)) * 1024 * 1024
+# Índice de entregas duplicadas o casi duplicadas en Excel (vacío para desactivarlo)
+app.config["INDICE_SIMILITUD"] = os.environ.get("INDICE_SIMILITUD", os.path.join("cache", "similitud.npz"))
+app.config["UMBRAL_SIMILITUD"] = float(os.environ.get("UMBRAL_SIMILITUD", 0.8))
+# Leer las respuestas del modelo en streaming y cortar al cerrarse el JSON
+app.config["OLLAMA_STREAM"] = os.environ.get("OLLAMA_STREAM", "1") == "1"
+# Mantener el modelo cargado entre filas y reutilizar la rúbrica ya procesada
+app.config["OLLAMA_KEEP_ALIVE"] = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+app.config["OLLAMA_REUTILIZAR_CONTEXTO"] = os.environ.get("OLLAMA_REUTILIZAR_CONTEXTO", "0") == "1"
+# Evaluar cada criterio en su propia llamada concurrente (rúbricas con muchos criterios)
+app.config["EVALUAR_POR_CRITERIO"] = os.environ.get("EVALUAR_POR_CRITERIO", "0") == "1"
+# Quitar encabezados, pies y números de página y unir cortes con guion antes de armar el prompt
+app.config["NORMALIZAR_TEXTO"] = os.environ.get("NORMALIZAR_TEXTO", "1") == "1"
+# Procesos que extraen el texto de los archivos de un ZIP (0 = uno por CPU)
+app.config["PROCESOS_EXTRACCION"] = int(os.environ.get("PROCESOS_EXTRACCION", 0))
+# Tamaño descomprimido máximo de cada archivo de un ZIP y del ZIP completo
+app.config["MAX_ZIP_ARCHIVO"] = int(os.environ.get("MAX_ZIP_ARCHIVO_MB", 50)) * 1024 * 1024
+app.config["MAX_ZIP_TOTAL"] = int(os.environ.get("MAX_ZIP_TOTAL_MB", 200)) * 1024 * 1024
+# Al arrancar, cargar el modelo en Ollama y los extractores en segundo plano (/listo indica cuándo terminó)
+app.config["PRECALENTAR"] = os.environ.get("PRECALENTAR", "0") == "1"
+# Trabajos de evaluación ejecutados a la vez en segundo plano (Excel/ZIP y textos o documentos sueltos)
+app.config["TRABAJADORES"] = int(os.environ.get("TRABAJADORES", 2))
+app.config["TRABAJADORES_INTERACTIVOS"] = int(os.environ.get("TRABAJADORES_INTERACTIVOS", 4))
+# Los trabajos, el planificador y las cachés en memoria son de este proceso: se sirve con un único
+# proceso y varios hilos (p. ej. gunicorn -w 1 --threads 8). El bloqueo impide encolar desde un segundo proceso
+app.config["BLOQUEO_TRABAJOS"] = os.environ.get("BLOQUEO_TRABAJOS", os.path.join("resultados", "trabajos.lock"))
+# Llamadas simultáneas al modelo entre todos los trabajos (OLLAMA_NUM_PARALLEL x servidores)
+app.config["MAX_LLAMADAS_MODELO"] = int(os.environ.get("MAX_LLAMADAS_MODELO", 4))
+# Trabajos admitidos a la vez, en total y por usuario; por encima se responde 429 con Retry-After
+app.config["MAX_TRABAJOS_EN_COLA"] = int(os.environ.get("MAX_TRABAJOS_EN_COLA", 20))
+app.config["MAX_TRABAJOS_POR_USUARIO"] = int(os.environ.get("MAX_TRABAJOS_POR_USUARIO", 3))
+# IP de los proxies cuya cabecera X-Usuario identifica al usuario (separadas por comas; sin proxies, se usa la IP)
+app.config["PROXIES_CONFIABLES"] = {ip.strip() for ip in os.environ.get("PROXIES_CONFIABLES", "").split(",") if ip.strip()}
 os.makedirs(app.config["RESULTADOS_FOLDER"], exist_ok=True)
 
-# Inicializar el evaluador de tareas
-evaluador = EvaluadorTareas()
+# Conexiones y caché compartidas por todos los evaluadores del proceso
+opciones_cliente = dict(
+    timeout_lectura=float(os.environ.get("OLLAMA_TIMEOUT", 180)),
+    tam_pool=max(10, app.config["TRABAJADORES"] * app.config["CONCURRENCIA_EXCEL"])
+)
+if app.config["OLLAMA_URLS"]:
+    cliente_ollama = PoolOllama(app.config["OLLAMA_URLS"],
+                                max_concurrencia_por_backend=app.config["OLLAMA_MAX_POR_SERVIDOR"] or None,
+                                **opciones_cliente)
+else:
+    cliente_ollama = ClienteOllama(app.config["OLLAMA_URL"], **opciones_cliente)
+cache_evaluaciones = None
+if app.config["CACHE_EVALUACIONES"]:
+    cache_evaluaciones = CacheEvaluaciones(app.config["CACHE_EVALUACIONES"], ttl=app.config["CACHE_TTL"])
+cache_textos = configurar_cache_extraccion(app.config["CACHE_EXTRACCION"], activa=bool(app.config["CACHE_EXTRACCION"]),
+                                          max_disco=app.config["CACHE_EXTRACCION_MAX_ENTRADAS"],
+                                          max_bytes_disco=app.config["CACHE_EXTRACCION_MAX_BYTES"],
+                                          ttl=app.config["CACHE_EXTRACCION_TTL"])
+almacen_resultados = None
+if app.config["RESULTADOS_DB"]:
+    almacen_resultados = AlmacenResultados(app.config["RESULTADOS_DB"], app.config["EXPORTACIONES_FOLDER"])
+indice_similitud = None
+lock_indice_similitud = threading.Lock()
+
+# Turnos de acceso al modelo: interactivos primero y reparto equitativo entre usuarios
+planificador = PlanificadorModelo(cliente_ollama, max_en_vuelo=app.config["MAX_LLAMADAS_MODELO"],
+                                  max_trabajos=app.config["MAX_TRABAJOS_EN_COLA"],
+                                  max_trabajos_usuario=app.config["MAX_TRABAJOS_POR_USUARIO"])
+
+# Un único evaluador para todo el proceso: es reentrante y la rúbrica viaja en cada llamada
+evaluador = EvaluadorTareas(app.config["OLLAMA_URL"], app.config["OLLAMA_MODELO"],
+                            cliente=planificador, cache=cache_evaluaciones,
+                            stream=app.config["OLLAMA_STREAM"],
+                            keep_alive=app.config["OLLAMA_KEEP_ALIVE"],
+                            reutilizar_contexto=app.config["OLLAMA_REUTILIZAR_CONTEXTO"],
+                            por_criterio=app.config["EVALUAR_POR_CRITERIO"],
+                            normalizar=app.config["NORMALIZAR_TEXTO"])
+
+# Cola de trabajos: /procesar encola y responde de inmediato
+gestor_trabajos = GestorTrabajos(app.config["TRABAJADORES"],
+                                 max_interactivos=app.config["TRABAJADORES_INTERACTIVOS"],
+                                 archivo_bloqueo=app.config["BLOQUEO_TRABAJOS"] or None)
+
+
+def obtener_indice_similitud():
+    """Carga el índice de similitud (NumPy y el .npz) la primera vez que se evalúa un Excel."""
+    global indice_similitud
+    if not app.config["INDICE_SIMILITUD"]:
+        return None
+    with lock_indice_similitud:
+        if indice_similitud is None:
+            from similitud import IndiceSimilitud
+            indice_similitud = IndiceSimilitud(app.config["INDICE_SIMILITUD"], umbral=app.config["UMBRAL_SIMILITUD"])
+        return indice_similitud
+
+
+# ======================================================
+# PRECALENTAMIENTO
+# ======================================================
+arranque = {"listo": threading.Event(), "modelo_s": None, "modulos_s": None, "error": None}
+
+
+def precalentar():
+    """Carga el modelo en Ollama y luego importa los extractores pesados."""
+    try:
+        arranque["modelo_s"] = round(evaluador.precalentar(), 3)
+    except Exception as e:
+        arranque["error"] = str(e)
+        print(f"No se pudo precalentar el modelo: {e}")
+    inicio = time.perf_counter()
+    import procesadores.procesar_zip  # noqa: F401 (importa también PDF, Word y Excel)
+    import similitud  # noqa: F401
+    arranque["modulos_s"] = round(time.perf_counter() - inicio, 3)
+    arranque["listo"].set()
+
+
+if app.config["PRECALENTAR"]:
+    threading.Thread(target=precalentar, name="precalentar", daemon=True).start()
+else:
+    arranque["listo"].set()
 
 # ======================================================
 # RUTA PRINCIPAL
@@ -48,9 +223,6 @@ def procesar():
         if nombre.strip() != "":
             criterios_dict[nombre] = float(nota)
 
-    # Actualizar la rúbrica en el evaluador
-    evaluador.actualizar_rubrica(criterios_dict)
-
     # --------------------------------------------------
     # 2. ARCHIVO O TEXTO DIRECTO
     # --------------------------------------------------
@@ -61,61 +233,342 @@ def procesar():
         return render_template("resultado.html", error="Debe subir un archivo o escribir texto.")
 
     # --------------------------------------------------
-    # 3. EVALUAR TEXTO DIRECTO
+    # 3. ADMISIÓN: PRIORIDAD Y LÍMITE DE TRABAJOS POR USUARIO
+    # --------------------------------------------------
+    nombre = None if texto_manual else secure_filename(archivo.filename)
+    por_lotes = nombre is not None and nombre.lower().endswith((".xlsx", ".zip"))
+    prioridad = LOTE if por_lotes else INTERACTIVA
+    usuario = identificar_usuario()
+    try:
+        planificador.admitir(usuario)
+    except ColaLlena as e:
+        return respuesta_cola_llena(e)
+
+    # --------------------------------------------------
+    # 4. CEDER EL ARCHIVO SUBIDO AL TRABAJO Y ENCOLARLO
+    # --------------------------------------------------
+    # El trabajo recibe el mismo buffer en el que se recibió la subida (ver PeticionSubida)
+    # y lo cierra al terminar
+    flujo = None if texto_manual else PeticionSubida.ceder_archivo(archivo)
+    try:
+        trabajo = gestor_trabajos.encolar(ejecutar_evaluacion, criterios_dict, texto_manual, flujo, nombre,
+                                          usuario, prioridad,
+                                          paralelismo=app.config["CONCURRENCIA_EXCEL"] if por_lotes else 1,
+                                          interactivo=not por_lotes)
+    except Exception:
+        planificador.liberar(usuario)
+        if flujo is not None:
+            flujo.close()
+        raise
+
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify({"job_id": trabajo.id}), 202
+    return render_template("procesando.html", job_id=trabajo.id)
+
+
+def identificar_usuario() -> str:
+    """
+    Usuario de la petición: la IP del cliente. La cabecera X-Usuario solo se acepta si la
+    petición llega desde uno de PROXIES_CONFIABLES (el proxy autentica al usuario y la
+    pone); de otro modo cualquier cliente podría esquivar su límite cambiándola.
+    """
+    if request.remote_addr in app.config["PROXIES_CONFIABLES"]:
+        usuario = request.headers.get("X-Usuario", "").strip()[:128]
+        if usuario:
+            return usuario
+    return request.remote_addr or "anonimo"
+
+
+def respuesta_cola_llena(error: ColaLlena):
+    """429 con Retry-After cuando el planificador no admite más trabajos."""
+    cabeceras = {"Retry-After": str(error.reintentar_en)}
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify({"error": str(error), "reintentar_en": error.reintentar_en}), 429, cabeceras
+    mensaje = f"{error} Vuelva a intentarlo en {error.reintentar_en} s."
+    return render_template("resultado.html", error=mensaje), 429, cabeceras
+
+
+def ejecutar_evaluacion(trabajo: Trabajo, criterios_dict, texto_manual, archivo, nombre, usuario, prioridad):
+    """
+    Evalúa el texto o archivo recibido en /procesar (se ejecuta en segundo plano).
+    Devuelve los datos para renderizar resultado.html.
+    """
+    tipo = "texto" if texto_manual else nombre.lower().rsplit(".", 1)[-1]
+    inicio = time.perf_counter()
+    try:
+        # Las llamadas al modelo de este trabajo (y de sus hilos) esperan turno como `usuario`
+        with identidad(usuario, prioridad), tipo_archivo(tipo), medir_etapa("total"):
+            return _evaluar_entrada(trabajo, criterios_dict, texto_manual, archivo, nombre)
+    finally:
+        planificador.liberar(usuario, time.perf_counter() - inicio)
+        if archivo is not None:
+            archivo.close()
+
+
+def _evaluar_entrada(trabajo: Trabajo, criterios_dict, texto_manual, archivo, nombre):
+    rubrica = crear_rubrica(criterios_dict)
+
+    # --------------------------------------------------
+    # EVALUAR TEXTO DIRECTO
     # --------------------------------------------------
     if texto_manual:
-        resultado = evaluador.evaluar_texto(texto_manual)
-        # Generar archivo Excel con los resultados
-        nombre_excel = f"rubrica_texto_manual.xlsx"
-        ruta_excel = os.path.join(app.config["RESULTADOS_FOLDER"], nombre_excel)
-        evaluador.generar_rubrica_excel(resultado, ruta_excel)
-        return render_template("resultado.html",
-                               resultado=resultado,
-                               archivo_generado=nombre_excel)
+        resultado = evaluar_documento(trabajo, rubrica, texto_manual)
+        return guardar_documento(trabajo, criterios_dict, "texto", "texto_manual", resultado)
 
     # --------------------------------------------------
-    # 4. PROCESAR ARCHIVO SUBIDO
+    # PROCESAR ARCHIVO SUBIDO
     # --------------------------------------------------
-    nombre = secure_filename(archivo.filename)
-    ruta = os.path.join(app.config["UPLOAD_FOLDER"], nombre)
-    archivo.save(ruta)
     extension = nombre.lower().rsplit(".", 1)[-1]
 
-    # ----- PDF -----
-    if extension == "pdf":
-        texto = extraer_texto_pdf(ruta)
-        resultado = evaluador.evaluar_texto(texto)
-        # Generar archivo Excel con los resultados
-        nombre_excel = f"rubrica_{nombre}.xlsx"
-        ruta_excel = os.path.join(app.config["RESULTADOS_FOLDER"], nombre_excel)
-        evaluador.generar_rubrica_excel(resultado, ruta_excel)
-        return render_template("resultado.html",
-                               resultado=resultado,
-                               archivo_generado=nombre_excel)
-
-    # ----- WORD -----
-    if extension == "docx":
-        texto = extraer_texto_word(ruta)
-        resultado = evaluador.evaluar_texto(texto)
-        # Generar archivo Excel con los resultados
-        nombre_excel = f"rubrica_{nombre}.xlsx"
-        ruta_excel = os.path.join(app.config["RESULTADOS_FOLDER"], nombre_excel)
-        evaluador.generar_rubrica_excel(resultado, ruta_excel)
-        return render_template("resultado.html",
-                               resultado=resultado,
-                               archivo_generado=nombre_excel)
+    # ----- PDF / WORD -----
+    if extension in ("pdf", "docx"):
+        if extension == "pdf":
+            from procesadores.procesar_pdf import extraer_texto_pdf as extraer_texto
+        else:
+            from procesadores.procesar_word import extraer_texto_word as extraer_texto
+        texto = extraer_texto(archivo)
+        # Los extractores devuelven None si el archivo está dañado o no es del formato indicado
+        if not texto or not texto.strip():
+            return {"error": "No se pudo extraer texto del archivo"}
+        resultado = evaluar_documento(trabajo, rubrica, texto, paginado=extension == "pdf")
+        return guardar_documento(trabajo, criterios_dict, extension, nombre, resultado)
 
     # ----- EXCEL (múltiples resúmenes) -----
     if extension == "xlsx":
-        df_resultado, nombre_archivo = procesar_excel(ruta, criterios_dict, evaluador, 
-    app.config["RESULTADOS_FOLDER"])
+        from procesadores.procesar_excel import procesar_excel
+        df_resultado, nombre_archivo = procesar_excel(archivo, criterios_dict, evaluador,
+                                                      app.config["RESULTADOS_FOLDER"],
+                                                      app.config["CONCURRENCIA_EXCEL"],
+                                                      progreso=trabajo.registrar_avance,
+                                                      devolver_resultados=False,
+                                                      vista_previa=app.config["VISTA_PREVIA_FILAS"],
+                                                      presupuesto_lote_tokens=app.config["LOTE_TOKENS"],
+                                                      max_filas_lote=app.config["LOTE_MAX_FILAS"],
+                                                      indice_similitud=obtener_indice_similitud(),
+                                                      origen=nombre,
+                                                      almacen=almacen_resultados,
+                                                      trabajo_id=trabajo.id)
+        # Sin devolver_resultados el DataFrame solo trae la vista previa: el error se reconoce por el nombre
+        if nombre_archivo.startswith("error_"):
+            return {"error": f"Error al procesar el archivo Excel: {nombre_archivo}"}
+        return {"resultado": df_resultado.to_dict(orient="records"),
+                "vista_previa": len(df_resultado) >= app.config["VISTA_PREVIA_FILAS"],
+                **enlace_resultados(nombre_archivo)}
+
+    # ----- ZIP (varios PDF, Word y Excel) -----
+    if extension == "zip":
+        from procesadores.procesar_zip import procesar_zip
+        df_resultado, nombre_archivo = procesar_zip(archivo, criterios_dict, evaluador,
+                                                    app.config["RESULTADOS_FOLDER"],
+                                                    app.config["CONCURRENCIA_EXCEL"],
+                                                    procesos=app.config["PROCESOS_EXTRACCION"] or None,
+                                                    progreso=trabajo.registrar_avance,
+                                                    almacen=almacen_resultados,
+                                                    trabajo_id=trabajo.id,
+                                                    origen=nombre,
+                                                    max_bytes_archivo=app.config["MAX_ZIP_ARCHIVO"],
+                                                    max_bytes_total=app.config["MAX_ZIP_TOTAL"])
         if df_resultado.empty:
-            return render_template("resultado.html", error=f"Error al procesar el archivo Excel: {nombre_archivo}")
-    return render_template(
-        "resultado.html",
-        resultado=df_resultado.to_dict(orient="records"),
-        archivo_generado=nombre_archivo
-    )
+            return {"error": f"Error al procesar el archivo ZIP: {nombre_archivo}"}
+        return {"resultado": df_resultado.to_dict(orient="records"), **enlace_resultados(nombre_archivo)}
+
+    return {"error": f"Formato de archivo no soportado: {extension}"}
+
+
+def guardar_documento(trabajo: Trabajo, criterios_dict, tipo: str, nombre: str, resultado):
+    """
+    Guarda la evaluación de un único documento en el almacén (o en un Excel si no hay almacén).
+    Una evaluación fallida no se guarda: se devuelve su error para que el trabajo conste como fallido.
+    """
+    if "error" in resultado:
+        return {"error": resultado["error"]}
+    if almacen_resultados is not None:
+        with medir_etapa("guardar_resultados"):
+            almacen_resultados.guardar_resultado(trabajo.id, criterios_dict, tipo, nombre, resultado)
+        return {"resultado": resultado, **enlace_resultados(trabajo.id)}
+    # El identificador del trabajo evita que dos evaluaciones del mismo archivo se sobrescriban
+    nombre_excel = f"rubrica_{nombre}_{trabajo.id[:8]}.xlsx"
+    with medir_etapa("escribir_excel"):
+        evaluador.generar_rubrica_excel(resultado, os.path.join(app.config["RESULTADOS_FOLDER"], nombre_excel))
+    return {"resultado": resultado, "archivo_generado": nombre_excel}
+
+
+def enlace_resultados(nombre: str):
+    """Datos de descarga para resultado.html: trabajo del almacén o Excel ya generado."""
+    if almacen_resultados is not None:
+        return {"trabajo_resultados": nombre, "formatos": FORMATOS_EXPORTACION}
+    return {"archivo_generado": nombre}
+
+
+def evaluar_documento(trabajo: Trabajo, rubrica, texto: str, paginado: bool = False):
+    """Evalúa un único texto registrando el avance del trabajo (`paginado` si viene de un PDF)."""
+    trabajo.registrar_avance(0, 1, 0.0)
+    inicio = time.perf_counter()
+    resultado = evaluador.evaluar_texto(texto, rubrica, al_recibir_token=trabajo.registrar_token, paginado=paginado)
+    trabajo.registrar_avance(1, 1, time.perf_counter() - inicio)
+    return resultado
+
+
+@app.errorhandler(413)
+def archivo_demasiado_grande(error):
+    limite = app.config["MAX_CONTENT_LENGTH"] // (1024 * 1024)
+    return render_template("resultado.html", error=f"El archivo supera el tamaño máximo de {limite} MB."), 413
+
+
+@app.errorhandler(ProcesoNoUnico)
+def proceso_no_unico(error):
+    print(f"Trabajo rechazado: {error}")
+    return render_template("resultado.html", error=str(error)), 503
+
+
+# ======================================================
+# PROGRESO (SERVER-SENT EVENTS) Y RESULTADO DEL TRABAJO
+# ======================================================
+@app.route("/progreso/<job_id>")
+def progreso(job_id):
+    trabajo = gestor_trabajos.obtener(job_id)
+    if trabajo is None:
+        return "Trabajo no encontrado", 404
+
+    def eventos():
+        while True:
+            estado = trabajo.instantanea()
+            yield f"data: {json.dumps(estado)}\n\n"
+            if estado["estado"] in ("completado", "error"):
+                break
+            time.sleep(1)
+
+    return Response(stream_with_context(eventos()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/resultado/<job_id>")
+def resultado_trabajo(job_id):
+    trabajo = gestor_trabajos.obtener(job_id)
+    if trabajo is None:
+        return render_template("resultado.html", error="Trabajo no encontrado o expirado.")
+    if trabajo.estado == "error":
+        return render_template("resultado.html", error=f"Error al procesar la evaluación: {trabajo.error}")
+    if trabajo.estado != "completado":
+        return render_template("procesando.html", job_id=trabajo.id)
+    return render_template("resultado.html", **trabajo.resultado)
+
+
+# ======================================================
+# DISPONIBILIDAD DEL WORKER
+# ======================================================
+@app.route("/listo")
+def listo():
+    estado = {clave: valor for clave, valor in arranque.items() if clave != "listo"}
+    if not arranque["listo"].is_set():
+        return jsonify({"listo": False, **estado}), 503
+    return jsonify({"listo": True, **estado})
+
+
+# ======================================================
+# MÉTRICAS (FORMATO PROMETHEUS)
+# ======================================================
+@app.route("/metrics")
+def metrics():
+    if cache_evaluaciones is not None:
+        estadisticas = cache_evaluaciones.estadisticas()
+        medidor = metricas.registro.medidor("calificador_cache", "Aciertos y fallos de la caché de evaluaciones.")
+        for nombre, valor in estadisticas.items():
+            medidor.fijar(valor, tipo=nombre)
+    if cache_textos is not None:
+        medidor = metricas.registro.medidor("calificador_cache_extraccion", "Aciertos y fallos de la caché de extracción de texto.")
+        for nombre, valor in cache_textos.estadisticas().items():
+            medidor.fijar(valor, tipo=nombre)
+    estado_planificador = planificador.estado()
+    metricas.registro.medidor("calificador_llamadas_en_vuelo", "Llamadas al modelo en curso.").fijar(
+        estado_planificador["en_vuelo"])
+    en_espera = metricas.registro.medidor("calificador_llamadas_en_espera", "Llamadas al modelo esperando turno.")
+    for prioridad, valor in estado_planificador["en_espera"].items():
+        en_espera.fijar(valor, prioridad=prioridad)
+    metricas.registro.medidor("calificador_trabajos_admitidos", "Trabajos en cola o en proceso.").fijar(
+        estado_planificador["trabajos"])
+    if isinstance(cliente_ollama, PoolOllama):
+        sano = metricas.registro.medidor("ollama_backend_sano", "1 si el servidor de Ollama recibe peticiones.")
+        en_vuelo = metricas.registro.medidor("ollama_backend_en_vuelo", "Peticiones en curso por servidor de Ollama.")
+        for backend in cliente_ollama.estado():
+            sano.fijar(1 if backend["sano"] and backend["circuito"] != "abierto" else 0, backend=backend["url"])
+            en_vuelo.fijar(backend["en_vuelo"], backend=backend["url"])
+    else:
+        metricas.registro.medidor(
+            "ollama_circuito_abierto", "1 si el interruptor de circuito hacia Ollama está abierto."
+        ).fijar(0 if cliente_ollama.circuito.estado == "cerrado" else 1)
+    return Response(metricas.registro.exportar(), mimetype="text/plain; version=0.0.4")
+
+
+# ======================================================
+# CONSULTA DE RESULTADOS GUARDADOS
+# ======================================================
+def _almacen_o_404():
+    if almacen_resultados is None:
+        abort(404, description="El almacén de resultados está desactivado.")
+    return almacen_resultados
+
+
+def _parametro_numero(nombre: str, tipo=float):
+    valor = request.args.get(nombre)
+    if valor in (None, ""):
+        return None
+    try:
+        return tipo(valor)
+    except ValueError:
+        abort(400, description=f"Parámetro inválido: {nombre}")
+
+
+@app.route("/resultados")
+def listar_resultados():
+    almacen = _almacen_o_404()
+    return jsonify(almacen.trabajos(request.args.get("rubrica"), _parametro_numero("limite", int) or 50))
+
+
+@app.route("/resultados/<trabajo_id>")
+def consultar_resultados(trabajo_id):
+    almacen = _almacen_o_404()
+    trabajo = almacen.trabajo(trabajo_id)
+    if trabajo is None:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+    entregas = almacen.entregas(trabajo_id,
+                                desplazamiento=_parametro_numero("desde", int) or 0,
+                                limite=_parametro_numero("limite", int) or 100,
+                                orden=request.args.get("orden", "posicion"),
+                                nota_min=_parametro_numero("nota_min"),
+                                nota_max=_parametro_numero("nota_max"),
+                                solo_errores=request.args.get("errores") == "1")
+    return jsonify({**trabajo, "resultados": entregas})
+
+
+@app.route("/resultados/<trabajo_id>/resumen")
+def resumen_resultados(trabajo_id):
+    resumen = _almacen_o_404().resumen(trabajo_id=trabajo_id)
+    if resumen is None:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+    return jsonify(resumen)
+
+
+@app.route("/rubricas/<clave>/resumen")
+def resumen_rubrica(clave):
+    resumen = _almacen_o_404().resumen(clave=clave)
+    if resumen is None:
+        return jsonify({"error": "Rúbrica no encontrada"}), 404
+    return jsonify(resumen)
+
+
+@app.route("/resultados/<trabajo_id>/exportar/<formato>")
+def exportar_resultados(trabajo_id, formato):
+    almacen = _almacen_o_404()
+    if formato not in FORMATOS_EXPORTACION:
+        return f"Formato no soportado: {formato}", 400
+    with medir_etapa("exportar", formato):
+        ruta = almacen.exportar(trabajo_id, formato)
+    if ruta is None:
+        return "Resultados no encontrados", 404
+    trabajo = almacen.trabajo(trabajo_id)
+    base = secure_filename(trabajo["origen"].rsplit(".", 1)[0]) or trabajo["tipo"]
+    return send_file(ruta, as_attachment=True, download_name=f"rubrica_{base}_{trabajo_id[:8]}.{formato}")
 
 
 # ======================================================
@@ -137,4 +590,4 @@ def favicon():
 # EJECUTAR
 # ======================================================
 if __name__ == "__main__":
-    app.run(debug=True)
+    app.run(debug=True, threaded=True)
@@ -0,0 +1,105 @@
+"""
+Benchmark de arranque en frío: en procesos nuevos mide cuánto tarda un worker en
+importar la aplicación, en responder 200 en /listo y en devolver la primera
+evaluación de texto, contra un servidor falso recién iniciado que simula la carga
+del modelo en su primera petición. Compara el arranque sin precalentar (la primera
+evaluación paga la carga) con PRECALENTAR=1.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.arranque_en_frio
+    python -m benchmarks.arranque_en_frio --carga-modelo 5 --repeticiones 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from benchmarks.ejecutar import percentil
+from benchmarks.servidor_falso import ServidorOllamaFalso
+
+COLUMNAS = ("importar_s", "listo_s", "primera_evaluacion_s", "extractores_s", "proceso_s")
+
+
+def medir_worker() -> Dict[str, float]:
+    """
+    Se ejecuta en el proceso hijo: importa la aplicación, espera a /listo y evalúa un texto.
+    Returns:
+        Dict[str, float]: Segundos desde el inicio del import hasta cada hito.
+    """
+    inicio = time.perf_counter()
+    import app as aplicacion
+    importar = time.perf_counter() - inicio
+
+    cliente = aplicacion.app.test_client()
+    while cliente.get("/listo").status_code != 200:
+        time.sleep(0.01)
+    listo = time.perf_counter() - inicio
+
+    primera = time.perf_counter()
+    respuesta = cliente.post(
+        "/procesar",
+        data={"criterio_nombre": ["Claridad", "Argumentación"], "criterio_peso": ["5", "5"],
+              "texto_manual": "La fotosíntesis convierte la luz en energía química para la planta."},
+        headers={"Accept": "application/json"}
+    )
+    trabajo = aplicacion.gestor_trabajos.obtener(respuesta.get_json()["job_id"])
+    while trabajo.estado not in ("completado", "error"):
+        time.sleep(0.005)
+    primera = time.perf_counter() - primera
+
+    # Lo que el arranque dejó de importar y ahora paga la primera petición de archivo
+    extractores = time.perf_counter()
+    import procesadores.procesar_zip  # noqa: F401
+    import similitud  # noqa: F401
+    extractores = time.perf_counter() - extractores
+    return {"importar_s": importar, "listo_s": listo, "primera_evaluacion_s": primera,
+            "extractores_s": extractores}
+
+
+def ejecutar(args: argparse.Namespace) -> List[Dict]:
+    resultados = []
+    for precalentar in (False, True):
+        mediciones: Dict[str, List[float]] = {columna: [] for columna in COLUMNAS}
+        for _ in range(args.repeticiones):
+            # Un servidor nuevo por repetición: el modelo siempre empieza sin cargar
+            with ServidorOllamaFalso(latencia=args.latencia, carga_modelo=args.carga_modelo) as servidor, \
+                    tempfile.TemporaryDirectory(prefix="bench_arranque_") as carpeta:
+                entorno = {**os.environ, "OLLAMA_URL": servidor.url, "CACHE_EVALUACIONES": "",
+                           "PRECALENTAR": "1" if precalentar else "0", "PYTHONPATH": RAIZ}
+                inicio = time.perf_counter()
+                salida = subprocess.run([sys.executable, "-m", "benchmarks.arranque_en_frio", "--hijo"],
+                                        cwd=carpeta, env=entorno, capture_output=True, text=True, check=True)
+                medicion = json.loads(salida.stdout.strip().splitlines()[-1])
+                medicion["proceso_s"] = time.perf_counter() - inicio
+            for columna in COLUMNAS:
+                mediciones[columna].append(medicion[columna])
+        resultados.append({"caso": "precalentando" if precalentar else "sin precalentar",
+                           **{columna: percentil(valores, 50) for columna, valores in mediciones.items()}})
+    return resultados
+
+
+def imprimir(resultados: List[Dict]) -> None:
+    ancho = max(len(r["caso"]) for r in resultados)
+    print(f"{'caso (p50, s)':<{ancho}}  " + "  ".join(f"{c[:-2]:>19}" for c in COLUMNAS))
+    for r in resultados:
+        print(f"{r['caso']:<{ancho}}  " + "  ".join(f"{r[c]:>19.3f}" for c in COLUMNAS))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de arranque en frío del calificador.")
+    parser.add_argument("--carga-modelo", type=float, default=2.0, help="Segundos que tarda en cargarse el modelo.")
+    parser.add_argument("--latencia", type=float, default=0.05, help="Segundos hasta el primer token.")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--hijo", action="store_true", help=argparse.SUPPRESS)
+    argumentos = parser.parse_args()
+    if argumentos.hijo:
+        print(json.dumps(medir_worker()))
+    else:
+        imprimir(ejecutar(argumentos))
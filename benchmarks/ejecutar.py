@@ -0,0 +1,160 @@
+"""
+Suite de benchmarks: mide extracción, evaluación de Excel, generación de rúbricas
+y la ruta /procesar completa contra un servidor falso de Ollama.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.ejecutar
+    python -m benchmarks.ejecutar --latencia 0.5 --tokens-por-segundo 60 --tamanos 1 10 50
+    python -m benchmarks.ejecutar --backends 3   # varios servidores falsos en puertos distintos
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixtures import generar_fixtures
+from benchmarks.servidor_falso import ServidorOllamaFalso
+
+
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil por interpolación lineal (p entre 0 y 100)."""
+    ordenados = sorted(valores)
+    if len(ordenados) == 1:
+        return ordenados[0]
+    posicion = (len(ordenados) - 1) * p / 100
+    inferior = int(posicion)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicion - inferior)
+
+
+def medir(nombre: str, funcion: Callable[[], object], repeticiones: int, unidades: int = 1) -> Dict:
+    """
+    Ejecuta `funcion` varias veces y resume sus tiempos.
+    Args:
+        nombre (str): Nombre del caso.
+        funcion (Callable[[], object]): Operación a medir.
+        repeticiones (int): Número de ejecuciones.
+        unidades (int): Elementos procesados por ejecución (filas, documentos...).
+    Returns:
+        Dict: Nombre, p50, p95 (ms) y rendimiento (unidades/s).
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return {
+        "caso": nombre,
+        "n": repeticiones,
+        "p50_ms": percentil(tiempos, 50) * 1000,
+        "p95_ms": percentil(tiempos, 95) * 1000,
+        "unidades_s": unidades * repeticiones / sum(tiempos) if sum(tiempos) else float("inf")
+    }
+
+
+def imprimir(resultados: List[Dict]) -> None:
+    ancho = max(len(r["caso"]) for r in resultados)
+    print(f"{'caso':<{ancho}}  {'n':>4}  {'p50 ms':>10}  {'p95 ms':>10}  {'unid/s':>10}")
+    for r in resultados:
+        print(f"{r['caso']:<{ancho}}  {r['n']:>4}  {r['p50_ms']:>10.1f}  {r['p95_ms']:>10.1f}  {r['unidades_s']:>10.2f}")
+
+
+def ejecutar(args: argparse.Namespace) -> List[Dict]:
+    carpeta = tempfile.mkdtemp(prefix="bench_calificador_")
+    rutas = generar_fixtures(os.path.join(carpeta, "fixtures"), args.tamanos)
+    resultados_dir = os.path.join(carpeta, "resultados")
+    os.makedirs(resultados_dir, exist_ok=True)
+
+    servidores = [ServidorOllamaFalso(
+        latencia=args.latencia,
+        tokens_por_segundo=args.tokens_por_segundo,
+        prob_json_malformado=args.prob_json_malformado,
+        semilla=i
+    ).iniciar() for i in range(max(1, args.backends))]
+    servidor = servidores[0]
+
+    # La aplicación lee su configuración al importarse
+    os.environ["OLLAMA_URL"] = servidor.url
+    if len(servidores) > 1:
+        os.environ["OLLAMA_URLS"] = ",".join(s.url for s in servidores)
+    os.environ["CACHE_EVALUACIONES"] = ""
+    os.environ.setdefault("CONCURRENCIA_EXCEL", str(args.concurrencia))
+    directorio_original = os.getcwd()
+    os.chdir(carpeta)
+
+    from cache_extraccion import configurar_cache_extraccion
+    from evaluador import EvaluadorTareas, crear_rubrica
+    from procesadores.procesar_excel import procesar_excel
+    from procesadores.procesar_pdf import extraer_texto_pdf
+    from procesadores.procesar_word import extraer_texto_word
+
+    criterios = {"Coherencia": 5, "Claridad": 5, "Ortografía": 5}
+    evaluador = EvaluadorTareas(servidor.url, stream=True,
+                                backends=[s.url for s in servidores] if len(servidores) > 1 else None)
+    resultados = []
+    try:
+        # ----- Extracción (sin caché: se mide el parseo de cada documento) -----
+        configurar_cache_extraccion(None, activa=False)
+        for tamano, ruta in zip(args.tamanos, rutas["pdf"]):
+            resultados.append(medir(f"extraer_texto_pdf ({tamano} pág.)", lambda: extraer_texto_pdf(ruta),
+                                    args.repeticiones, tamano))
+        for tamano, ruta in zip(args.tamanos, rutas["docx"]):
+            resultados.append(medir(f"extraer_texto_word ({tamano * 4} párr.)", lambda: extraer_texto_word(ruta),
+                                    args.repeticiones, tamano * 4))
+
+        # ----- Rúbrica en Excel -----
+        resultado = evaluador.evaluar_texto("Texto de prueba.", crear_rubrica(criterios))
+        ruta_rubrica = os.path.join(resultados_dir, "rubrica_bench.xlsx")
+        resultados.append(medir("generar_rubrica_excel", lambda: evaluador.generar_rubrica_excel(resultado, ruta_rubrica),
+                                args.repeticiones))
+
+        # ----- Evaluación de Excel (filas por segundo) -----
+        for tamano, ruta in zip(args.tamanos, rutas["xlsx"]):
+            resultados.append(medir(
+                f"procesar_excel ({tamano} filas, c={args.concurrencia})",
+                lambda: procesar_excel(ruta, criterios, evaluador, resultados_dir, args.concurrencia),
+                max(1, args.repeticiones // 5), tamano
+            ))
+
+        # ----- Ruta /procesar completa (encolar + esperar el trabajo) -----
+        import app as aplicacion
+        cliente = aplicacion.app.test_client()
+
+        def procesar(ruta: str) -> None:
+            with open(ruta, "rb") as archivo:
+                respuesta = cliente.post(
+                    "/procesar",
+                    data={"criterio_nombre": list(criterios), "criterio_peso": [str(v) for v in criterios.values()],
+                          "archivo": (archivo, os.path.basename(ruta))},
+                    headers={"Accept": "application/json"}
+                )
+            trabajo = aplicacion.gestor_trabajos.obtener(respuesta.get_json()["job_id"])
+            while trabajo.estado not in ("completado", "error"):
+                time.sleep(0.01)
+
+        resultados.append(medir("/procesar (PDF 1 pág.)", lambda: procesar(rutas["pdf"][0]), args.repeticiones))
+        resultados.append(medir(f"/procesar (Excel {args.tamanos[-1]} filas)", lambda: procesar(rutas["xlsx"][-1]),
+                                max(1, args.repeticiones // 5), args.tamanos[-1]))
+    finally:
+        os.chdir(directorio_original)
+        for s in servidores:
+            s.detener()
+
+    print(f"Peticiones a los servidores falsos: {[s.peticiones for s in servidores]}")
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks del calificador de tareas.")
+    parser.add_argument("--latencia", type=float, default=0.05, help="Segundos hasta el primer token.")
+    parser.add_argument("--tokens-por-segundo", type=float, default=0.0, help="0 para respuestas instantáneas.")
+    parser.add_argument("--prob-json-malformado", type=float, default=0.0)
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--repeticiones", type=int, default=10)
+    parser.add_argument("--concurrencia", type=int, default=4)
+    parser.add_argument("--backends", type=int, default=1, help="Servidores falsos entre los que repartir.")
+    imprimir(ejecutar(parser.parse_args()))
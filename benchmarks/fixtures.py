@@ -0,0 +1,136 @@
+"""
+Generación de documentos de prueba (PDF, DOCX y XLSX) de distintos tamaños.
+"""
+import os
+import random
+from typing import List, Optional
+
+from docx import Document
+from openpyxl import Workbook
+
+PALABRAS = (
+    "la inteligencia artificial ha transformado la educacion y el trabajo en las ultimas "
+    "decadas los modelos de lenguaje permiten resumir analizar y generar textos con una "
+    "calidad sorprendente sin embargo plantean retos eticos sobre la privacidad el sesgo "
+    "y la evaluacion academica de los estudiantes que deben aprender a usarlos con criterio"
+).split()
+
+
+def generar_parrafo(aleatorio: random.Random, palabras: int = 80) -> str:
+    texto = " ".join(aleatorio.choice(PALABRAS) for _ in range(palabras))
+    return texto[0].upper() + texto[1:] + "."
+
+
+def generar_pdf(ruta: str, paginas: int, semilla: int = 0) -> str:
+    """
+    Escribe un PDF de texto con `paginas` páginas sin depender de librerías externas.
+    Cada página tiene encabezado, número de página y unas 40 líneas de texto.
+    Args:
+        ruta (str): Ruta del PDF a crear.
+        paginas (int): Número de páginas.
+        semilla (int): Semilla del texto aleatorio.
+    Returns:
+        str: Ruta del PDF generado.
+    """
+    aleatorio = random.Random(semilla)
+    objetos: List[bytes] = []
+
+    def escapar(linea: str) -> str:
+        return linea.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    # 1: catálogo, 2: árbol de páginas, 3: fuente; luego página y contenido alternados
+    ids_paginas = [4 + 2 * i for i in range(paginas)]
+    objetos.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{i} 0 R" for i in ids_paginas)
+    objetos.append(f"<< /Type /Pages /Kids [{kids}] /Count {paginas} >>".encode())
+    objetos.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for numero, id_pagina in enumerate(ids_paginas, start=1):
+        lineas = ["Universidad Tecnica de Manabi - Trabajo de investigacion", ""]
+        while len(lineas) < 42:
+            parrafo = generar_parrafo(aleatorio, 60)
+            palabras = parrafo.split()
+            for i in range(0, len(palabras), 12):
+                lineas.append(" ".join(palabras[i:i + 12]))
+            lineas.append("")
+        lineas = lineas[:42] + [f"Pagina {numero}"]
+        contenido = "BT /F1 10 Tf 14 TL 50 780 Td " + " ".join(f"({escapar(l)}) '" for l in lineas) + " ET"
+        contenido = contenido.encode("latin-1")
+        objetos.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {id_pagina + 1} 0 R >>".encode()
+        )
+        objetos.append(b"<< /Length %d >>\nstream\n" % len(contenido) + contenido + b"\nendstream")
+
+    salida = bytearray(b"%PDF-1.4\n")
+    desplazamientos = []
+    for i, objeto in enumerate(objetos, start=1):
+        desplazamientos.append(len(salida))
+        salida += f"{i} 0 obj\n".encode() + objeto + b"\nendobj\n"
+    inicio_xref = len(salida)
+    salida += f"xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n".encode()
+    for desplazamiento in desplazamientos:
+        salida += f"{desplazamiento:010d} 00000 n \n".encode()
+    salida += f"trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n".encode()
+
+    with open(ruta, "wb") as archivo:
+        archivo.write(salida)
+    return ruta
+
+
+def generar_docx(ruta: str, parrafos: int, semilla: int = 0) -> str:
+    """
+    Escribe un documento Word con `parrafos` párrafos.
+    Args:
+        ruta (str): Ruta del DOCX a crear.
+        parrafos (int): Número de párrafos.
+        semilla (int): Semilla del texto aleatorio.
+    Returns:
+        str: Ruta del DOCX generado.
+    """
+    aleatorio = random.Random(semilla)
+    documento = Document()
+    documento.add_heading("Trabajo de investigacion", level=1)
+    for _ in range(parrafos):
+        documento.add_paragraph(generar_parrafo(aleatorio))
+    documento.save(ruta)
+    return ruta
+
+
+def generar_xlsx(ruta: str, filas: int, palabras_por_resumen: int = 40, semilla: int = 0) -> str:
+    """
+    Escribe un Excel con las columnas Autor y Resumen.
+    Args:
+        ruta (str): Ruta del XLSX a crear.
+        filas (int): Número de filas (tareas).
+        palabras_por_resumen (int): Longitud aproximada de cada resumen.
+        semilla (int): Semilla del texto aleatorio.
+    Returns:
+        str: Ruta del XLSX generado.
+    """
+    aleatorio = random.Random(semilla)
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet()
+    hoja.append(["Autor", "Resumen"])
+    for i in range(filas):
+        hoja.append([f"Estudiante {i + 1}", generar_parrafo(aleatorio, palabras_por_resumen)])
+    libro.save(ruta)
+    return ruta
+
+
+def generar_fixtures(carpeta: str, tamanos: Optional[List[int]] = None) -> dict:
+    """
+    Genera un juego de documentos de varios tamaños.
+    Args:
+        carpeta (str): Carpeta de destino.
+        tamanos (Optional[List[int]]): Escalas a generar (páginas, párrafos / 4 y filas).
+    Returns:
+        dict: {"pdf": [...], "docx": [...], "xlsx": [...]} con las rutas generadas.
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    tamanos = tamanos or [1, 10, 50]
+    rutas = {"pdf": [], "docx": [], "xlsx": []}
+    for tamano in tamanos:
+        rutas["pdf"].append(generar_pdf(os.path.join(carpeta, f"documento_{tamano}p.pdf"), tamano))
+        rutas["docx"].append(generar_docx(os.path.join(carpeta, f"documento_{tamano}p.docx"), tamano * 4))
+        rutas["xlsx"].append(generar_xlsx(os.path.join(carpeta, f"tareas_{tamano}f.xlsx"), tamano))
+    return rutas
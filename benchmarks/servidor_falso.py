@@ -0,0 +1,235 @@
+"""
+Servidor local que imita /api/generate de Ollama para medir el rendimiento sin un modelo real.
+
+Uso:
+    python -m benchmarks.servidor_falso --puerto 11500 --latencia 0.5 --tokens-por-segundo 80
+    python -m benchmarks.servidor_falso --carga-modelo 20   # la primera petición carga el modelo
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+
+class ServidorOllamaFalso:
+    def __init__(
+        self,
+        puerto: int = 0,
+        latencia: float = 0.2,
+        tokens_por_segundo: float = 0.0,
+        prob_json_malformado: float = 0.0,
+        caracteres_por_token: int = 4,
+        semilla: Optional[int] = None,
+        carga_modelo: float = 0.0
+    ):
+        """
+        Servidor HTTP que responde como /api/generate de Ollama.
+        Args:
+            puerto (int): Puerto de escucha (0 elige uno libre).
+            latencia (float): Segundos antes del primer token (simula la evaluación del prompt).
+            tokens_por_segundo (float): Velocidad de generación; 0 para responder de inmediato.
+            prob_json_malformado (float): Probabilidad de devolver un JSON roto.
+            caracteres_por_token (int): Caracteres de la respuesta que forman un token.
+            semilla (Optional[int]): Semilla para que la inyección de errores sea reproducible.
+            carga_modelo (float): Segundos que tarda la primera petición de cada modelo (carga en memoria).
+        """
+        self.latencia = latencia
+        self.tokens_por_segundo = tokens_por_segundo
+        self.prob_json_malformado = prob_json_malformado
+        self.caracteres_por_token = caracteres_por_token
+        self.carga_modelo = carga_modelo
+        self.peticiones = 0
+        self._modelos_cargados = set()
+        self._lock_carga = threading.Lock()
+        self._aleatorio = random.Random(semilla)
+        self._lock = threading.Lock()
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", puerto), self._crear_manejador())
+        self._servidor.daemon_threads = True
+        self._hilo: Optional[threading.Thread] = None
+
+    @property
+    def puerto(self) -> int:
+        return self._servidor.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.puerto}/api/generate"
+
+    def iniciar(self) -> "ServidorOllamaFalso":
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._hilo.start()
+        return self
+
+    def servir(self) -> None:
+        """Atiende peticiones en el hilo actual hasta Ctrl+C."""
+        try:
+            self._servidor.serve_forever()
+        except KeyboardInterrupt:
+            self.detener()
+
+    def detener(self) -> None:
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def __enter__(self) -> "ServidorOllamaFalso":
+        return self.iniciar()
+
+    def __exit__(self, *args) -> None:
+        self.detener()
+
+    def cargar_modelo(self, modelo: str) -> None:
+        """Simula la carga del modelo: las peticiones que llegan mientras tanto esperan a que termine."""
+        with self._lock_carga:
+            if modelo not in self._modelos_cargados:
+                time.sleep(self.carga_modelo)
+                self._modelos_cargados.add(modelo)
+
+    # =====================================================
+    # RESPUESTA SIMULADA
+    # =====================================================
+    def generar_respuesta(self, payload: Dict) -> str:
+        """
+        Construye una respuesta plausible a partir de la rúbrica incluida en el prompt.
+        Args:
+            payload (Dict): Cuerpo de la petición.
+        Returns:
+            str: Texto que "genera" el modelo.
+        """
+        texto = f"{payload.get('system') or ''}\n{payload.get('prompt', '')}"
+        nombres = [n for n in dict.fromkeys(re.findall(r'"nombre": "([^"]+)"', texto)) if n != "NombreCriterio"]
+        nombres = nombres or ["Criterio"]
+        maximos = dict(re.findall(r'"nombre": "([^"]+)",\s*"notaMax": ([\d.]+)', texto))
+
+        def criterios() -> List[Dict]:
+            lista = []
+            for nombre in nombres:
+                nota_max = float(maximos.get(nombre, 10))
+                lista.append({
+                    "nombre": nombre,
+                    "notaMax": nota_max,
+                    "puntaje": round(self._aleatorio.uniform(0.5, 1) * nota_max, 1),
+                    "justificacion": "Respuesta generada por el servidor de pruebas."
+                })
+            return lista
+
+        def nota(lista: List[Dict]) -> float:
+            return round(sum(c["puntaje"] / c["notaMax"] * 10 for c in lista) / len(lista), 2)
+
+        esquema = payload.get("format")
+        if isinstance(esquema, dict) and "puntaje" in esquema.get("properties", {}):
+            # Modo por criterio: un solo puntaje con la nota máxima indicada en el esquema
+            nota_max = float(esquema["properties"]["puntaje"].get("maximum", 10))
+            datos = {"puntaje": round(self._aleatorio.uniform(0.5, 1) * nota_max, 1),
+                     "justificacion": "Respuesta generada por el servidor de pruebas."}
+        elif '"resultados"' in texto:
+            datos: Dict = {"resultados": []}
+            for id_tarea in re.findall(r"\[ID: ([^\]]+)\]", texto):
+                lista = criterios()
+                datos["resultados"].append({"id": id_tarea, "criterios": lista, "notaFinal": nota(lista)})
+        else:
+            lista = criterios()
+            datos = {"criterios": lista, "notaFinal": nota(lista)}
+
+        respuesta = json.dumps(datos, ensure_ascii=False)
+        with self._lock:
+            malformado = self._aleatorio.random() < self.prob_json_malformado
+        if malformado:
+            respuesta = respuesta[: len(respuesta) // 2]
+        # Los modelos suelen seguir hablando después del JSON
+        return respuesta + "\n\nEspero que esta evaluación sea de ayuda."
+
+    def _crear_manejador(self):
+        servidor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def _enviar_json(self, datos: Dict) -> None:
+                cuerpo = json.dumps(datos).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def do_GET(self) -> None:
+                # Equivalente a /api/tags, útil como comprobación de salud
+                self._enviar_json({"models": [{"name": "falso"}]})
+
+            def do_POST(self) -> None:
+                longitud = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(longitud) or b"{}")
+                with servidor._lock:
+                    servidor.peticiones += 1
+
+                inicio = time.perf_counter()
+                servidor.cargar_modelo(payload.get("model", "falso"))
+                if "prompt" not in payload and "system" not in payload:
+                    # Petición sin prompt: Ollama solo carga el modelo
+                    self._enviar_json({"model": payload.get("model", "falso"), "response": "", "done": True,
+                                       "done_reason": "load"})
+                    return
+                time.sleep(servidor.latencia)
+                respuesta = servidor.generar_respuesta(payload)
+                paso = servidor.caracteres_por_token
+                tokens = [respuesta[i:i + paso] for i in range(0, len(respuesta), paso)]
+                prompt = f"{payload.get('system') or ''}{payload.get('prompt', '')}"
+                espera = 1 / servidor.tokens_por_segundo if servidor.tokens_por_segundo else 0
+
+                def metadatos() -> Dict:
+                    return {
+                        "model": payload.get("model", "falso"),
+                        "done": True,
+                        "context": [1, 2, 3],
+                        "prompt_eval_count": len(prompt) // paso,
+                        "eval_count": len(tokens),
+                        "eval_duration": int((time.perf_counter() - inicio) * 1e9),
+                        "total_duration": int((time.perf_counter() - inicio) * 1e9)
+                    }
+
+                if not payload.get("stream", True):
+                    time.sleep(espera * len(tokens))
+                    self._enviar_json({**metadatos(), "response": respuesta})
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for token in tokens:
+                        time.sleep(espera)
+                        self._enviar_fragmento({"model": payload.get("model", "falso"), "response": token, "done": False})
+                    self._enviar_fragmento({**metadatos(), "response": ""})
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # El cliente cortó el stream al recibir el JSON completo
+                    self.close_connection = True
+
+            def _enviar_fragmento(self, datos: Dict) -> None:
+                linea = (json.dumps(datos) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(linea):x}\r\n".encode() + linea + b"\r\n")
+                self.wfile.flush()
+
+        return Manejador
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor falso de Ollama para benchmarks.")
+    parser.add_argument("--puerto", type=int, default=11500)
+    parser.add_argument("--latencia", type=float, default=0.5)
+    parser.add_argument("--tokens-por-segundo", type=float, default=0.0)
+    parser.add_argument("--prob-json-malformado", type=float, default=0.0)
+    parser.add_argument("--carga-modelo", type=float, default=0.0)
+    args = parser.parse_args()
+    servidor = ServidorOllamaFalso(args.puerto, args.latencia, args.tokens_por_segundo, args.prob_json_malformado,
+                                   carga_modelo=args.carga_modelo)
+    print(f"Servidor falso escuchando en {servidor.url}")
+    servidor.servir()
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+class CacheEvaluaciones:
+    def __init__(
+        self,
+        ruta_db: Optional[str] = os.path.join("cache", "evaluaciones.sqlite3"),
+        max_memoria: int = 256,
+        max_disco: int = 10000,
+        ttl: float = 7 * 24 * 3600
+    ):
+        """
+        Caché de evaluaciones en dos niveles: LRU en memoria y SQLite en disco.
+        Args:
+            ruta_db (Optional[str]): Ruta de la base SQLite; None para usar solo memoria.
+            max_memoria (int): Entradas máximas en el nivel de memoria.
+            max_disco (int): Entradas máximas en el nivel de disco.
+            ttl (float): Segundos de validez de cada entrada.
+        """
+        self.max_memoria = max_memoria
+        self.max_disco = max_disco
+        self.ttl = ttl
+        self._memoria: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos_memoria = 0
+        self.aciertos_disco = 0
+        self.fallos = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if ruta_db:
+            carpeta = os.path.dirname(ruta_db)
+            if carpeta:
+                os.makedirs(carpeta, exist_ok=True)
+            self._db = sqlite3.connect(ruta_db, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS evaluaciones ("
+                "clave TEXT PRIMARY KEY, valor TEXT NOT NULL, creado REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_creado ON evaluaciones (creado)")
+            self._db.commit()
+
+    # =====================================================
+    # CLAVE DE CONTENIDO
+    # =====================================================
+    @staticmethod
+    def clave(texto: str, rubrica: List[Dict], modelo: str, version_prompt: str) -> str:
+        """
+        Calcula la clave de una evaluación a partir de su contenido.
+        Args:
+            texto (str): Texto evaluado (se normalizan los espacios).
+            rubrica (List[Dict]): Criterios con sus notas máximas.
+            modelo (str): Nombre del modelo.
+            version_prompt (str): Versión de la plantilla del prompt.
+        Returns:
+            str: Hash SHA-256 en hexadecimal.
+        """
+        texto_normalizado = " ".join(texto.split())
+        material = json.dumps(
+            [texto_normalizado, rubrica, modelo, version_prompt],
+            ensure_ascii=False, sort_keys=True
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    # =====================================================
+    # LECTURA / ESCRITURA
+    # =====================================================
+    def obtener(self, clave: str) -> Optional[Dict]:
+        """
+        Busca una evaluación primero en memoria y luego en disco.
+        Args:
+            clave (str): Clave calculada con `clave()`.
+        Returns:
+            Optional[Dict]: Evaluación guardada o None si no existe o expiró.
+        """
+        ahora = time.time()
+        with self._lock:
+            entrada = self._memoria.get(clave)
+            if entrada and ahora - entrada[1] < self.ttl:
+                self._memoria.move_to_end(clave)
+                self.aciertos_memoria += 1
+                return json.loads(entrada[0])
+            if entrada:
+                del self._memoria[clave]
+
+            if self._db is not None:
+                fila = self._db.execute(
+                    "SELECT valor, creado FROM evaluaciones WHERE clave = ?", (clave,)
+                ).fetchone()
+                if fila and ahora - fila[1] < self.ttl:
+                    self._guardar_memoria(clave, fila[0], fila[1])
+                    self.aciertos_disco += 1
+                    return json.loads(fila[0])
+
+            self.fallos += 1
+            return None
+
+    def guardar(self, clave: str, valor: Dict) -> None:
+        """
+        Guarda una evaluación en ambos niveles.
+        Args:
+            clave (str): Clave calculada con `clave()`.
+            valor (Dict): Evaluación a guardar.
+        """
+        serializado = json.dumps(valor, ensure_ascii=False)
+        ahora = time.time()
+        with self._lock:
+            self._guardar_memoria(clave, serializado, ahora)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO evaluaciones (clave, valor, creado) VALUES (?, ?, ?)",
+                    (clave, serializado, ahora)
+                )
+                self._purgar_disco(ahora)
+                self._db.commit()
+
+    def _guardar_memoria(self, clave: str, serializado: str, creado: float) -> None:
+        self._memoria[clave] = (serializado, creado)
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.max_memoria:
+            self._memoria.popitem(last=False)
+
+    def _purgar_disco(self, ahora: float) -> None:
+        """Elimina las entradas expiradas y las más antiguas si se supera `max_disco`."""
+        self._db.execute("DELETE FROM evaluaciones WHERE creado < ?", (ahora - self.ttl,))
+        self._db.execute(
+            "DELETE FROM evaluaciones WHERE clave IN ("
+            "SELECT clave FROM evaluaciones ORDER BY creado DESC LIMIT -1 OFFSET ?)",
+            (self.max_disco,)
+        )
+
+    # =====================================================
+    # ESTADÍSTICAS
+    # =====================================================
+    def estadisticas(self) -> Dict[str, int]:
+        """
+        Devuelve los contadores de aciertos y fallos.
+        Returns:
+            Dict[str, int]: Aciertos en memoria, en disco, fallos y entradas en memoria.
+        """
+        with self._lock:
+            return {
+                "aciertos_memoria": self.aciertos_memoria,
+                "aciertos_disco": self.aciertos_disco,
+                "fallos": self.fallos,
+                "entradas_memoria": len(self._memoria)
+            }
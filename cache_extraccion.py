@@ -0,0 +1,222 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+# Cambiar si cambia la forma de extraer el texto, para no reutilizar textos viejos
+VERSION_EXTRACCION = "1"
+# Cada cuántas escrituras se recorre la carpeta en disco para aplicar el TTL y los límites
+ESCRITURAS_POR_PURGA = 100
+
+
+class CacheExtraccion:
+    def __init__(
+        self,
+        carpeta: Optional[str] = os.path.join("cache", "extraccion"),
+        max_memoria: int = 64,
+        max_disco: int = 10000,
+        max_bytes_disco: int = 1024 * 1024 * 1024,
+        ttl: float = 30 * 24 * 3600
+    ):
+        """
+        Caché del texto extraído de documentos, indexada por el hash de su contenido:
+        LRU en memoria y un archivo de texto por documento en disco. Al guardarse en
+        disco la comparten los procesos de extracción (p. ej. los de un ZIP). En disco
+        se descartan los textos sin usar durante `ttl` segundos y, por encima de los
+        límites, los de uso más antiguo (la fecha de modificación marca el último uso).
+        Args:
+            carpeta (Optional[str]): Carpeta de los textos en disco; None para usar solo memoria.
+            max_memoria (int): Documentos máximos en el nivel de memoria.
+            max_disco (int): Documentos máximos en el nivel de disco.
+            max_bytes_disco (int): Bytes máximos en el nivel de disco.
+            ttl (float): Segundos que se conserva en disco un texto que no se vuelve a usar.
+        """
+        self.carpeta = carpeta
+        self.max_memoria = max_memoria
+        self.max_disco = max_disco
+        self.max_bytes_disco = max_bytes_disco
+        self.ttl = ttl
+        self._memoria: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._escrituras = 0
+        self.aciertos = 0
+        self.fallos = 0
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+
+    @staticmethod
+    def clave(contenido: bytes, tipo: str) -> str:
+        """
+        Calcula la clave de un documento a partir de sus bytes.
+        Args:
+            contenido (bytes): Contenido del archivo.
+            tipo (str): Tipo de documento (pdf, docx...).
+        Returns:
+            str: Hash SHA-256 en hexadecimal.
+        """
+        resumen = hashlib.sha256(contenido)
+        resumen.update(f"|{tipo}|{VERSION_EXTRACCION}".encode("utf-8"))
+        return resumen.hexdigest()
+
+    def _ruta(self, clave: str) -> str:
+        return os.path.join(self.carpeta, clave[:2], clave + ".txt")
+
+    def obtener(self, clave: str) -> Optional[str]:
+        """
+        Busca el texto de un documento primero en memoria y luego en disco.
+        Args:
+            clave (str): Clave calculada con `clave()`.
+        Returns:
+            Optional[str]: Texto extraído o None si no está en la caché.
+        """
+        with self._lock:
+            texto = self._memoria.get(clave)
+            if texto is not None:
+                self._memoria.move_to_end(clave)
+                self.aciertos += 1
+                return texto
+        if self.carpeta:
+            ruta = self._ruta(clave)
+            try:
+                if time.time() - os.path.getmtime(ruta) >= self.ttl:
+                    raise FileNotFoundError(ruta)
+                with open(ruta, encoding="utf-8") as archivo:
+                    texto = archivo.read()
+                # Renovar la fecha de último uso para que la purga conserve los textos usados
+                os.utime(ruta)
+            except OSError:
+                texto = None
+        with self._lock:
+            if texto is None:
+                self.fallos += 1
+                return None
+            self._guardar_memoria(clave, texto)
+            self.aciertos += 1
+            return texto
+
+    def guardar(self, clave: str, texto: str) -> None:
+        """
+        Guarda el texto de un documento en ambos niveles.
+        Args:
+            clave (str): Clave calculada con `clave()`.
+            texto (str): Texto extraído.
+        """
+        with self._lock:
+            self._guardar_memoria(clave, texto)
+        if self.carpeta:
+            ruta = self._ruta(clave)
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            # Escritura atómica: otro proceso nunca lee un archivo a medio escribir
+            descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix=".tmp")
+            with os.fdopen(descriptor, "w", encoding="utf-8") as archivo:
+                archivo.write(texto)
+            os.replace(temporal, ruta)
+            with self._lock:
+                self._escrituras += 1
+                purgar = self._escrituras % ESCRITURAS_POR_PURGA == 0
+            if purgar:
+                self.purgar()
+
+    def purgar(self) -> int:
+        """
+        Elimina del disco los textos expirados y, si se superan `max_disco` documentos o
+        `max_bytes_disco` bytes, los de uso más antiguo. Varios procesos pueden purgar a la vez.
+        Returns:
+            int: Archivos eliminados.
+        """
+        if not self.carpeta:
+            return 0
+        limite = time.time() - self.ttl
+        vigentes = []
+        eliminados = 0
+        for subcarpeta in os.scandir(self.carpeta):
+            if not subcarpeta.is_dir():
+                continue
+            for entrada in os.scandir(subcarpeta.path):
+                try:
+                    estado = entrada.stat()
+                except OSError:
+                    continue
+                # Los .tmp de escrituras interrumpidas solo se borran al expirar
+                if estado.st_mtime < limite:
+                    eliminados += self._eliminar(entrada.path)
+                elif entrada.name.endswith(".txt"):
+                    vigentes.append((estado.st_mtime, estado.st_size, entrada.path))
+        vigentes.sort(reverse=True)
+        total_bytes = 0
+        for posicion, (_, tamano, ruta) in enumerate(vigentes):
+            total_bytes += tamano
+            if posicion >= self.max_disco or total_bytes > self.max_bytes_disco:
+                eliminados += self._eliminar(ruta)
+        return eliminados
+
+    @staticmethod
+    def _eliminar(ruta: str) -> int:
+        try:
+            os.remove(ruta)
+            return 1
+        except OSError:
+            # Otro proceso ya lo eliminó
+            return 0
+
+    def _guardar_memoria(self, clave: str, texto: str) -> None:
+        self._memoria[clave] = texto
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.max_memoria:
+            self._memoria.popitem(last=False)
+
+    def estadisticas(self) -> Dict[str, int]:
+        """
+        Devuelve los contadores de aciertos y fallos.
+        Returns:
+            Dict[str, int]: Aciertos, fallos y documentos en memoria.
+        """
+        with self._lock:
+            return {"aciertos": self.aciertos, "fallos": self.fallos, "entradas_memoria": len(self._memoria)}
+
+
+# Caché compartida por los extractores de PDF y Word (se reconfigura desde app.py)
+cache_extraccion: Optional[CacheExtraccion] = CacheExtraccion(os.environ.get("CACHE_EXTRACCION") or None)
+
+
+def configurar_cache_extraccion(carpeta: Optional[str], activa: bool = True, **opciones) -> Optional[CacheExtraccion]:
+    """
+    Reemplaza la caché compartida de extracción y purga su carpeta en disco.
+    Args:
+        carpeta (Optional[str]): Carpeta en disco; None para usar solo memoria.
+        activa (bool): False desactiva la caché por completo.
+        **opciones: Límites de `CacheExtraccion` (max_memoria, max_disco, max_bytes_disco, ttl).
+    Returns:
+        Optional[CacheExtraccion]: La nueva caché (None si se desactivó).
+    """
+    global cache_extraccion
+    cache_extraccion = CacheExtraccion(carpeta, **opciones) if activa else None
+    if cache_extraccion is not None:
+        cache_extraccion.purgar()
+    return cache_extraccion
+
+
+def extraer_con_cache(contenido: bytes, tipo: str, extraer: Callable[[bytes], Optional[str]]) -> Optional[str]:
+    """
+    Devuelve el texto del documento desde la caché compartida o lo extrae y lo guarda.
+    Los fallos de extracción (None) no se guardan.
+    Args:
+        contenido (bytes): Contenido del archivo.
+        tipo (str): Tipo de documento (pdf, docx...).
+        extraer (Callable[[bytes], Optional[str]]): Extractor a usar si no está en la caché.
+    Returns:
+        Optional[str]: Texto extraído o None si hay un error.
+    """
+    cache = cache_extraccion
+    if cache is None:
+        return extraer(contenido)
+    clave = cache.clave(contenido, tipo)
+    texto = cache.obtener(clave)
+    if texto is None:
+        texto = extraer(contenido)
+        if texto is not None:
+            cache.guardar(clave, texto)
+    return texto
@@ -0,0 +1,383 @@
+"""
+Calificación por lotes desde la línea de comandos, sin pasar por la aplicación web.
+
+Recorre una carpeta (o un manifiesto con una ruta por línea), extrae el texto de cada
+PDF, Word y fila de Excel y lo evalúa con `EvaluadorTareas`. Cada entrega terminada se
+anota en un diario SQLite: si la ejecución se interrumpe, al repetir el mismo comando
+solo se evalúan las entregas que faltan.
+
+Uso:
+    python calificar_lote.py tareas/ -c Coherencia=5 -c Claridad=5 -o notas.xlsx
+    python calificar_lote.py manifiesto.txt -c Coherencia=5 --concurrencia 8
+    python calificar_lote.py tareas/ -c Coherencia=5 --simulacion   # estima tokens y tiempo
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from cache_extraccion import configurar_cache_extraccion
+from evaluador import EvaluadorTareas, Rubrica, crear_rubrica, rubrica_a_lista
+from fragmentador import estimar_tokens
+from normalizador import normalizar_texto
+from procesadores.procesar_excel import EscritorResultados, _fila_resultado
+from procesadores.procesar_zip import EXTENSIONES_ZIP, extraer_textos
+
+# Tokens que el modelo genera por criterio (puntaje + justificación breve), para las estimaciones
+TOKENS_SALIDA_POR_CRITERIO = 60
+# Archivos leídos en memoria (en espera o en extracción) por cada proceso extractor
+ARCHIVOS_EN_VUELO_POR_PROCESO = 2
+
+
+# =====================================================
+# DIARIO DE CONTROL (SQLITE)
+# =====================================================
+class DiarioLote:
+    def __init__(self, ruta_db: str):
+        """
+        Diario de entregas ya evaluadas. Cada entrega se identifica por el hash de su
+        archivo, su posición (fila de Excel), la rúbrica, el modelo y la versión del prompt,
+        de modo que cambiar cualquiera de ellos vuelve a evaluarla.
+        Args:
+            ruta_db (str): Ruta de la base SQLite.
+        """
+        carpeta = os.path.dirname(ruta_db)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(ruta_db, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entregas ("
+            "clave TEXT PRIMARY KEY, archivo TEXT NOT NULL, posicion INTEGER NOT NULL, "
+            "fila TEXT NOT NULL, segundos REAL NOT NULL, creado REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def clave(hash_archivo: str, posicion: int, rubrica: Rubrica, modelo: str, version_prompt: str) -> str:
+        material = json.dumps([hash_archivo, posicion, rubrica_a_lista(rubrica), modelo, version_prompt],
+                              ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def hechas(self, claves: List[str]) -> Dict[str, Dict]:
+        """
+        Devuelve las filas de resultados ya guardadas para las claves indicadas.
+        Args:
+            claves (List[str]): Claves a buscar.
+        Returns:
+            Dict[str, Dict]: Fila de resultados por clave.
+        """
+        encontradas: Dict[str, Dict] = {}
+        with self._lock:
+            for inicio in range(0, len(claves), 500):
+                bloque = claves[inicio:inicio + 500]
+                consulta = f"SELECT clave, fila FROM entregas WHERE clave IN ({','.join('?' * len(bloque))})"
+                for clave, fila in self._db.execute(consulta, bloque):
+                    encontradas[clave] = json.loads(fila)
+        return encontradas
+
+    def registrar(self, clave: str, archivo: str, posicion: int, fila: Dict, segundos: float) -> None:
+        """Anota una entrega evaluada (se confirma de inmediato para sobrevivir a una interrupción)."""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entregas (clave, archivo, posicion, fila, segundos, creado) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (clave, archivo, posicion, json.dumps(fila, ensure_ascii=False), segundos, time.time())
+            )
+            self._db.commit()
+
+    def segundos_medios(self) -> Optional[float]:
+        """Duración media de las evaluaciones anotadas, para estimar el tiempo restante."""
+        with self._lock:
+            media = self._db.execute("SELECT AVG(segundos) FROM entregas").fetchone()[0]
+        return media
+
+    def cerrar(self) -> None:
+        self._db.close()
+
+
+# =====================================================
+# ENTRADAS
+# =====================================================
+def listar_archivos(entrada: str, recursivo: bool = True) -> List[str]:
+    """
+    Devuelve los PDF, Word y Excel de una carpeta o los indicados en un manifiesto
+    (una ruta por línea, relativa al manifiesto; se ignoran las líneas vacías y las que empiezan con #).
+    Args:
+        entrada (str): Carpeta o archivo de manifiesto.
+        recursivo (bool): Recorrer también las subcarpetas.
+    Returns:
+        List[str]: Rutas en orden alfabético.
+    """
+    def evaluable(ruta: str) -> bool:
+        base = os.path.basename(ruta)
+        return not base.startswith((".", "~$")) and base.lower().rsplit(".", 1)[-1] in EXTENSIONES_ZIP
+
+    if os.path.isdir(entrada):
+        rutas = []
+        for carpeta, subcarpetas, archivos in os.walk(entrada):
+            rutas.extend(os.path.join(carpeta, archivo) for archivo in archivos)
+            if not recursivo:
+                break
+        return sorted(ruta for ruta in rutas if evaluable(ruta))
+
+    base = os.path.dirname(os.path.abspath(entrada))
+    with open(entrada, encoding="utf-8") as manifiesto:
+        lineas = [linea.strip() for linea in manifiesto]
+    rutas = [os.path.join(base, linea) for linea in lineas if linea and not linea.startswith("#")]
+    return [ruta for ruta in rutas if evaluable(ruta)]
+
+
+def extraer_lote(rutas: List[str], procesos: Optional[int]) -> Iterator[Tuple[str, str, Optional[List[str]], str]]:
+    """
+    Extrae los textos de los archivos en un pool de procesos, en el orden en que terminan.
+    Solo se leen unos pocos archivos por proceso a la vez: el resto se lee a medida que
+    terminan las extracciones, para no cargar el lote completo en memoria.
+    Yields:
+        Tuple[str, str, Optional[List[str]], str]: Ruta, hash del contenido, textos (None si
+        falló la extracción) y mensaje de error.
+    """
+    num_procesos = procesos or min(len(rutas), os.cpu_count() or 1)
+    ventana = max(1, num_procesos) * ARCHIVOS_EN_VUELO_POR_PROCESO
+    with ProcessPoolExecutor(max_workers=num_procesos) as ejecutor:
+        pendientes = deque(rutas)
+        futuros: Dict[Future, Tuple[str, str]] = {}
+        while pendientes or futuros:
+            while pendientes and len(futuros) < ventana:
+                ruta = pendientes.popleft()
+                try:
+                    with open(ruta, "rb") as archivo:
+                        contenido = archivo.read()
+                except OSError as e:
+                    yield ruta, "", None, str(e)
+                    continue
+                futuros[ejecutor.submit(extraer_textos, ruta, contenido)] = (ruta, hashlib.sha256(contenido).hexdigest())
+            if not futuros:
+                continue
+            terminados, _ = wait(list(futuros), return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                ruta, hash_archivo = futuros.pop(futuro)
+                try:
+                    yield ruta, hash_archivo, futuro.result(), ""
+                except Exception as e:
+                    yield ruta, hash_archivo, None, str(e)
+
+
+# =====================================================
+# EJECUCIÓN
+# =====================================================
+def simular(args: argparse.Namespace, rutas: List[str], rubrica: Rubrica, evaluador: EvaluadorTareas,
+            diario: DiarioLote) -> None:
+    """
+    Extrae los textos y estima tokens y duración sin llamar al modelo. Informa también
+    cuántos tokens de texto ahorra la normalización (encabezados, pies, números de página).
+    """
+    sistema = (evaluador.crear_prompt_sistema_criterio() if evaluador.por_criterio
+               else evaluador.crear_prompt_sistema(rubrica))
+    tokens_sistema = estimar_tokens(sistema)
+    entregas = pendientes = tokens_entrada = tokens_salida = 0
+    tokens_originales = tokens_enviados = 0
+    for ruta, hash_archivo, textos, error in extraer_lote(rutas, args.procesos):
+        if textos is None:
+            print(f"  [sin texto] {ruta}: {error}")
+            continue
+        claves = [DiarioLote.clave(hash_archivo, i, rubrica, evaluador.modelo, evaluador.version_prompt)
+                  for i in range(len(textos))]
+        hechas = diario.hechas(claves)
+        entregas += len(textos)
+        for clave, texto in zip(claves, textos):
+            if clave in hechas:
+                continue
+            pendientes += 1
+            llamadas = len(rubrica) if evaluador.por_criterio else 1
+            # Se estima con el texto que realmente se enviaría, igual que en `preparar_texto`
+            original = estimar_tokens(texto)
+            paginado = ruta.lower().endswith(".pdf")
+            enviado = estimar_tokens(normalizar_texto(texto, paginado)) if evaluador.normalizar else original
+            tokens_originales += original
+            tokens_enviados += enviado
+            tokens_entrada += llamadas * (tokens_sistema + enviado)
+            tokens_salida += TOKENS_SALIDA_POR_CRITERIO * len(rubrica) + (0 if evaluador.por_criterio else 10)
+
+    segundos = (tokens_entrada / args.velocidad_prompt + tokens_salida / args.velocidad_generacion)
+    segundos /= max(1, args.concurrencia)
+    media = diario.segundos_medios()
+    print(f"Archivos: {len(rutas)} | entregas: {entregas} | ya evaluadas: {entregas - pendientes} | "
+          f"pendientes: {pendientes}")
+    print(f"Tokens estimados: {tokens_entrada} de entrada + {tokens_salida} generados")
+    if evaluador.normalizar and tokens_originales:
+        print(f"Texto de las entregas: {tokens_originales} tokens extraídos -> {tokens_enviados} tras normalizar "
+              f"({(1 - tokens_enviados / tokens_originales) * 100:.1f}% menos)")
+    print(f"Duración estimada: {segundos / 60:.1f} min con concurrencia {args.concurrencia}")
+    if media:
+        print(f"Según el diario ({media:.1f} s por entrega): "
+              f"{pendientes * media / max(1, args.concurrencia) / 60:.1f} min")
+
+
+def calificar(args: argparse.Namespace, rutas: List[str], rubrica: Rubrica, evaluador: EvaluadorTareas,
+              diario: DiarioLote) -> List[Dict]:
+    """
+    Evalúa todas las entregas pendientes y devuelve las filas de resultados (incluidas
+    las ya evaluadas en ejecuciones anteriores) en orden de archivo y posición.
+    """
+    filas: Dict[Tuple[str, int], Dict] = {}
+    lock = threading.Lock()
+    # El total de entregas se conoce al terminar de leer todos los archivos: mientras tanto
+    # se muestran los archivos leídos
+    contador = {"hechas": 0, "total": 0, "reutilizadas": 0, "archivos": 0}
+
+    def evaluar(clave: str, ruta: str, posicion: int, texto: str) -> None:
+        inicio = time.perf_counter()
+        try:
+            resultado = evaluador.evaluar_texto(texto, rubrica, paginado=ruta.lower().endswith(".pdf"))
+        except Exception as e:
+            resultado = {"error": str(e)}
+        fila = {"Archivo": ruta, **_fila_resultado(texto, resultado)}
+        segundos = time.perf_counter() - inicio
+        # Solo se anotan las evaluaciones correctas: las fallidas se reintentan al reanudar
+        if "error" not in resultado:
+            diario.registrar(clave, ruta, posicion, fila, segundos)
+        with lock:
+            filas[(ruta, posicion)] = fila
+            contador["hechas"] += 1
+            etiqueta = f"{ruta} fila {posicion + 1}" if ruta.lower().endswith(".xlsx") else ruta
+            if contador["archivos"] < len(rutas):
+                avance = f"{contador['hechas']} | {contador['archivos']}/{len(rutas)} archivos leídos"
+            else:
+                avance = f"{contador['hechas']}/{contador['total']}"
+            print(f"[{avance}] {etiqueta}: "
+                  f"{fila.get('Calificación Final')} ({segundos:.1f} s)")
+
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrencia)) as ejecutor:
+        evaluaciones: List[Future] = []
+        try:
+            for ruta, hash_archivo, textos, error in extraer_lote(rutas, args.procesos):
+                if textos is None:
+                    print(f"Error al extraer {ruta}: {error}")
+                    with lock:
+                        contador["archivos"] += 1
+                        filas[(ruta, 0)] = {"Archivo": ruta, "Calificación Final": None, "Error": error}
+                    continue
+                claves = [DiarioLote.clave(hash_archivo, i, rubrica, evaluador.modelo, evaluador.version_prompt)
+                          for i in range(len(textos))]
+                hechas = diario.hechas(claves)
+                with lock:
+                    contador["archivos"] += 1
+                    contador["total"] += len(textos) - len(hechas)
+                    contador["reutilizadas"] += len(hechas)
+                    for posicion, clave in enumerate(claves):
+                        if clave in hechas:
+                            filas[(ruta, posicion)] = hechas[clave]
+                for posicion, (clave, texto) in enumerate(zip(claves, textos)):
+                    if clave not in hechas:
+                        evaluaciones.append(ejecutor.submit(evaluar, clave, ruta, posicion, texto))
+            for evaluacion in evaluaciones:
+                evaluacion.result()
+        except KeyboardInterrupt:
+            ejecutor.shutdown(wait=False, cancel_futures=True)
+            print("\nInterrumpido: las entregas ya evaluadas quedaron en el diario; "
+                  "repita el mismo comando para continuar.")
+            raise
+
+    print(f"Evaluadas: {contador['hechas']} | reutilizadas del diario: {contador['reutilizadas']}")
+    return [filas[posicion] for posicion in sorted(filas)]
+
+
+def ejecutar(args: argparse.Namespace) -> int:
+    criterios_dict: Dict[str, float] = dict(args.criterio)
+    rubrica = crear_rubrica(criterios_dict)
+
+    rutas = listar_archivos(args.entrada, not args.no_recursivo)
+    if not rutas:
+        print("No se encontraron archivos PDF, Word ni Excel.")
+        return 1
+
+    configurar_cache_extraccion(args.cache_extraccion or None, activa=bool(args.cache_extraccion),
+                                max_bytes_disco=args.cache_extraccion_max_mb * 1024 * 1024,
+                                ttl=args.cache_extraccion_dias * 24 * 3600)
+    evaluador = EvaluadorTareas(args.url, args.modelo, stream=True, keep_alive=args.keep_alive,
+                                backends=args.backends, por_criterio=args.por_criterio,
+                                normalizar=not args.sin_normalizar)
+    diario = DiarioLote(args.diario)
+    try:
+        if args.simulacion:
+            simular(args, rutas, rubrica, evaluador, diario)
+            return 0
+        filas = calificar(args, rutas, rubrica, evaluador, diario)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        diario.cerrar()
+
+    columnas = (["Archivo", "Tarea", "Calificación Final"]
+                + [f"{nombre} (Puntaje)" for nombre in criterios_dict]
+                + [f"{nombre} (Justificación)" for nombre in criterios_dict]
+                + ["Error"])
+    escritor = EscritorResultados(args.salida, columnas)
+    for fila in filas:
+        escritor.escribir(fila)
+    escritor.cerrar()
+    print(f"Resultados guardados en {args.salida}")
+    return 0
+
+
+def criterio_argumento(valor: str) -> Tuple[str, float]:
+    """
+    Convierte un argumento -c "Nombre=nota" en (nombre, nota máxima).
+    Raises:
+        argparse.ArgumentTypeError: Si falta el nombre o la nota no es un número positivo.
+    """
+    nombre, _, nota = valor.rpartition("=")
+    if not nombre.strip():
+        raise argparse.ArgumentTypeError(f"criterio inválido (use Nombre=nota): {valor}")
+    try:
+        nota_maxima = float(nota)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"la nota de {nombre.strip()} no es un número: {nota}") from None
+    if not math.isfinite(nota_maxima) or nota_maxima <= 0:
+        raise argparse.ArgumentTypeError(f"la nota de {nombre.strip()} debe ser mayor que 0: {nota}")
+    return nombre.strip(), nota_maxima
+
+
+def crear_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Califica por lotes los PDF, Word y Excel de una carpeta.")
+    parser.add_argument("entrada", help="Carpeta con las tareas o manifiesto con una ruta por línea.")
+    parser.add_argument("-c", "--criterio", action="append", required=True, type=criterio_argumento,
+                        help="Criterio y nota máxima, p. ej. Coherencia=5 (repetible).")
+    parser.add_argument("-o", "--salida", default="resultados_lote.xlsx", help="Excel consolidado de resultados.")
+    parser.add_argument("--diario", default="calificar_lote.sqlite3",
+                        help="Diario SQLite de entregas evaluadas (permite reanudar).")
+    parser.add_argument("--concurrencia", type=int, default=4, help="Evaluaciones simultáneas.")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos de extracción (por defecto, uno por CPU).")
+    parser.add_argument("--url", default=os.environ.get("OLLAMA_URL", "http://localhost:11434/api/generate"))
+    parser.add_argument("--backends", nargs="+", default=None, help="Varios servidores de Ollama entre los que repartir.")
+    parser.add_argument("--modelo", default=os.environ.get("OLLAMA_MODELO", "mistral"))
+    parser.add_argument("--keep-alive", default="30m")
+    parser.add_argument("--por-criterio", action="store_true", help="Evaluar cada criterio en una llamada propia.")
+    parser.add_argument("--sin-normalizar", action="store_true",
+                        help="Enviar el texto tal como se extrajo (sin quitar encabezados, pies ni números de página).")
+    parser.add_argument("--cache-extraccion", default=os.path.join("cache", "extraccion"),
+                        help="Carpeta de la caché de texto extraído (vacío para desactivarla).")
+    parser.add_argument("--cache-extraccion-max-mb", type=int, default=1024,
+                        help="Tamaño máximo de la caché de texto extraído en disco.")
+    parser.add_argument("--cache-extraccion-dias", type=float, default=30.0,
+                        help="Días que se conserva un texto extraído que no se vuelve a usar.")
+    parser.add_argument("--no-recursivo", action="store_true", help="No recorrer subcarpetas.")
+    parser.add_argument("--simulacion", action="store_true", help="Solo estimar tokens y duración, sin llamar al modelo.")
+    parser.add_argument("--velocidad-prompt", type=float, default=500.0,
+                        help="Tokens de entrada procesados por segundo (para la simulación).")
+    parser.add_argument("--velocidad-generacion", type=float, default=25.0,
+                        help="Tokens generados por segundo (para la simulación).")
+    return parser
+
+
+if __name__ == "__main__":
+    sys.exit(ejecutar(crear_parser().parse_args()))
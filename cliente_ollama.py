@@ -0,0 +1,274 @@
+import json
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class ErrorModelo(Exception):
+    """Error al comunicarse con el servidor del modelo."""
+
+
+class CircuitoAbiertoError(ErrorModelo):
+    """El circuito está abierto: el servidor del modelo se considera caído."""
+
+
+# =====================================================
+# INTERRUPTOR DE CIRCUITO
+# =====================================================
+class InterruptorCircuito:
+    def __init__(self, umbral_fallos: int = 5, tiempo_reset: float = 30.0):
+        """
+        Interruptor de circuito para dejar de llamar a un servidor caído.
+        Tras `umbral_fallos` fallos seguidos el circuito se abre y las llamadas
+        fallan de inmediato; pasado `tiempo_reset` se deja pasar una llamada de prueba.
+        Args:
+            umbral_fallos (int): Fallos consecutivos necesarios para abrir el circuito.
+            tiempo_reset (float): Segundos que el circuito permanece abierto.
+        """
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_reset = tiempo_reset
+        self._fallos = 0
+        self._abierto_desde: Optional[float] = None
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self) -> str:
+        """Devuelve "cerrado", "abierto" o "semiabierto"."""
+        with self._lock:
+            if self._abierto_desde is None:
+                return "cerrado"
+            if time.monotonic() - self._abierto_desde >= self.tiempo_reset:
+                return "semiabierto"
+            return "abierto"
+
+    def permitir(self) -> bool:
+        """
+        Indica si se puede realizar una llamada.
+        Returns:
+            bool: False si el circuito está abierto.
+        """
+        with self._lock:
+            if self._abierto_desde is None:
+                return True
+            if time.monotonic() - self._abierto_desde < self.tiempo_reset:
+                return False
+            # Semiabierto: solo una llamada de prueba a la vez
+            if self._prueba_en_curso:
+                return False
+            self._prueba_en_curso = True
+            return True
+
+    def registrar_exito(self) -> None:
+        with self._lock:
+            self._fallos = 0
+            self._abierto_desde = None
+            self._prueba_en_curso = False
+
+    def registrar_fallo(self) -> None:
+        with self._lock:
+            self._fallos += 1
+            self._prueba_en_curso = False
+            if self._abierto_desde is not None or self._fallos >= self.umbral_fallos:
+                self._abierto_desde = time.monotonic()
+
+
+# =====================================================
+# DETECTOR DE FIN DE JSON EN STREAMING
+# =====================================================
+class DetectorJSON:
+    def __init__(self):
+        """
+        Sigue la profundidad de llaves y el estado de las cadenas de un texto
+        que llega por fragmentos, para saber cuándo se cerró el primer objeto JSON.
+        """
+        self.texto = ""
+        self.completo = False
+        self._profundidad = 0
+        self._en_cadena = False
+        self._escape = False
+
+    def alimentar(self, fragmento: str) -> bool:
+        """
+        Procesa un fragmento nuevo de la respuesta.
+        Args:
+            fragmento (str): Texto recibido del modelo.
+        Returns:
+            bool: True si ya se recibió un objeto JSON completo de primer nivel.
+        """
+        if self.completo:
+            return True
+        for i, caracter in enumerate(fragmento):
+            if self._en_cadena:
+                if self._escape:
+                    self._escape = False
+                elif caracter == "\\":
+                    self._escape = True
+                elif caracter == '"':
+                    self._en_cadena = False
+            elif caracter == '"':
+                # Las comillas antes del primer "{" no abren una cadena JSON
+                self._en_cadena = self._profundidad > 0
+            elif caracter == "{":
+                self._profundidad += 1
+            elif caracter == "}" and self._profundidad > 0:
+                self._profundidad -= 1
+                if self._profundidad == 0:
+                    self.texto += fragmento[:i + 1]
+                    self.completo = True
+                    return True
+        self.texto += fragmento
+        return False
+
+
+# =====================================================
+# CLIENTE HTTP PARA OLLAMA
+# =====================================================
+class ClienteOllama:
+    def __init__(
+        self,
+        url_api: str = "http://localhost:11434/api/generate",
+        timeout_conexion: float = 5.0,
+        timeout_lectura: float = 180.0,
+        reintentos: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        tam_pool: int = 10,
+        umbral_fallos: int = 5,
+        tiempo_reset: float = 30.0
+    ):
+        """
+        Cliente reutilizable para la API de Ollama con conexiones persistentes,
+        reintentos con retroceso exponencial e interruptor de circuito.
+        Args:
+            url_api (str): URL del endpoint /api/generate.
+            timeout_conexion (float): Segundos máximos para establecer la conexión.
+            timeout_lectura (float): Segundos máximos esperando la respuesta.
+            reintentos (int): Reintentos ante errores 5xx, timeouts o conexiones caídas.
+            backoff_base (float): Espera inicial entre reintentos (se duplica en cada intento).
+            backoff_max (float): Espera máxima entre reintentos.
+            tam_pool (int): Conexiones keep-alive que se mantienen abiertas.
+            umbral_fallos (int): Llamadas fallidas seguidas que abren el circuito.
+            tiempo_reset (float): Segundos que el circuito permanece abierto.
+        """
+        self.url_api = url_api
+        self.timeout = (timeout_conexion, timeout_lectura)
+        self.reintentos = reintentos
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.circuito = InterruptorCircuito(umbral_fallos, tiempo_reset)
+
+        self.sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=tam_pool, max_retries=0)
+        self.sesion.mount("http://", adaptador)
+        self.sesion.mount("https://", adaptador)
+
+    def _espera(self, intento: int) -> float:
+        """Retroceso exponencial con jitter para no sincronizar los reintentos."""
+        espera = min(self.backoff_max, self.backoff_base * (2 ** intento))
+        return espera * random.uniform(0.5, 1.0)
+
+    def generar(self, payload: Dict) -> Dict:
+        """
+        Envía una petición de generación a Ollama.
+        Args:
+            payload (Dict): Cuerpo JSON de la petición.
+        Returns:
+            Dict: Respuesta JSON completa de Ollama.
+        Raises:
+            CircuitoAbiertoError: Si el servidor se considera caído.
+            ErrorModelo: Si la petición falla tras agotar los reintentos.
+        """
+        def peticion() -> Dict:
+            response = self.sesion.post(self.url_api, json=payload, timeout=self.timeout)
+            self._verificar_estado(response)
+            return response.json()
+
+        return self._con_reintentos(peticion)
+
+    def generar_stream(self, payload: Dict, al_recibir: Optional[Callable[[str], None]] = None) -> Dict:
+        """
+        Envía una petición en modo streaming y deja de leer en cuanto la respuesta
+        contiene un objeto JSON completo, sin esperar al texto que el modelo añada después.
+        Args:
+            payload (Dict): Cuerpo JSON de la petición (se fuerza "stream": True).
+            al_recibir (Optional[Callable[[str], None]]): Se llama con cada fragmento recibido.
+        Returns:
+            Dict: {"response": texto hasta el cierre del JSON, "done": bool, "eval_count": int}
+            más los metadatos del último fragmento de Ollama si se llegó al final.
+        Raises:
+            CircuitoAbiertoError: Si el servidor se considera caído.
+            ErrorModelo: Si la petición falla tras agotar los reintentos.
+        """
+        payload = {**payload, "stream": True}
+
+        def peticion() -> Dict:
+            detector = DetectorJSON()
+            final: Dict = {}
+            recibidos = 0
+            with self.sesion.post(self.url_api, json=payload, timeout=self.timeout, stream=True) as response:
+                self._verificar_estado(response)
+                for linea in response.iter_lines():
+                    if not linea:
+                        continue
+                    fragmento = json.loads(linea)
+                    token = fragmento.get("response", "")
+                    recibidos += 1
+                    if al_recibir is not None and token:
+                        al_recibir(token)
+                    if fragmento.get("done"):
+                        final = fragmento
+                        detector.alimentar(token)
+                        break
+                    if detector.alimentar(token):
+                        # JSON completo: cerrar la conexión corta la generación en Ollama
+                        break
+            # Si se cortó antes del final, Ollama no envía estadísticas: se aproxima
+            # eval_count con los fragmentos recibidos (uno por token)
+            return {"eval_count": recibidos, **final, "response": detector.texto, "done": bool(final)}
+
+        return self._con_reintentos(peticion)
+
+    def _verificar_estado(self, response: requests.Response) -> None:
+        if response.status_code >= 500:
+            raise ErrorModelo(f"Error {response.status_code} del servidor del modelo")
+        response.raise_for_status()
+
+    def _con_reintentos(self, peticion: Callable[[], Dict]) -> Dict:
+        """
+        Ejecuta la petición aplicando el interruptor de circuito y los reintentos.
+        """
+        if not self.circuito.permitir():
+            raise CircuitoAbiertoError(f"Servidor del modelo no disponible: {self.url_api}")
+
+        ultimo_error: Optional[Exception] = None
+        for intento in range(self.reintentos + 1):
+            try:
+                datos = peticion()
+                self.circuito.registrar_exito()
+                return datos
+            except (requests.Timeout, requests.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                    ErrorModelo) as e:
+                # Errores transitorios (incluido un stream cortado a mitad): se reintentan con retroceso exponencial
+                ultimo_error = e
+                if intento < self.reintentos:
+                    time.sleep(self._espera(intento))
+            except requests.HTTPError as e:
+                # Errores 4xx: el servidor responde, pero reintentar no ayuda
+                self.circuito.registrar_exito()
+                raise ErrorModelo(f"Respuesta inválida del modelo: {e}") from e
+            except (requests.RequestException, ValueError) as e:
+                # Respuesta no JSON u otro fallo de la petición: no se reintenta ni cuenta como éxito
+                self.circuito.registrar_fallo()
+                raise ErrorModelo(f"Respuesta inválida del modelo: {e}") from e
+
+        self.circuito.registrar_fallo()
+        raise ErrorModelo(f"El modelo no respondió tras {self.reintentos + 1} intentos: {ultimo_error}")
+
+    def cerrar(self) -> None:
+        """Cierra las conexiones abiertas del pool."""
+        self.sesion.close()
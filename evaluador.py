@@ -1,52 +1,144 @@
-import requests
 import json
-import pandas as pd
-from typing import Dict, List, Optional, Union
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+from cliente_ollama import ClienteOllama, ErrorModelo
+from pool_ollama import PoolOllama
+from planificador import PlanificadorModelo
+from cache_evaluaciones import CacheEvaluaciones
+from fragmentador import estimar_tokens, fragmentar_texto
+from metricas import en_contexto_actual, medir_etapa, registrar_respuesta_ollama, registrar_tokens_texto
+from normalizador import normalizar_texto
+from reparar_json import reparar_json
+
+class Criterio(NamedTuple):
+    """Criterio de la rúbrica (inmutable)."""
+    nombre: str
+    notaMax: float
+
+
+# Una rúbrica es una tupla de criterios: inmutable y segura de compartir entre hilos
+Rubrica = Tuple[Criterio, ...]
+
+# Error de las entregas con texto que la normalización dejó vacío (no se envían al modelo)
+TEXTO_VACIADO = "El texto quedó vacío al normalizarlo; no se evaluó."
+
+
+def crear_rubrica(criterios_dict: Dict[str, float]) -> Rubrica:
+    """
+    Crea una rúbrica inmutable a partir de {"Coherencia": 5, "Claridad": 7}.
+    Args:
+        criterios_dict (Dict[str, float]): Diccionario con los criterios y sus notas máximas.
+    Returns:
+        Rubrica: Tupla de criterios.
+    """
+    return tuple(Criterio(nombre, float(peso)) for nombre, peso in criterios_dict.items())
+
+
+def rubrica_a_lista(rubrica: Rubrica) -> List[Dict[str, float]]:
+    """Convierte la rúbrica a la lista de diccionarios que se envía al modelo."""
+    return [criterio._asdict() for criterio in rubrica]
+
 
 class EvaluadorTareas:
-    def __init__(self, url_api: str = "http://localhost:11434/api/generate", modelo: str = "mistral"):
+    # Cambiar al modificar crear_prompt para invalidar las evaluaciones en caché
+    VERSION_PROMPT = "4"
+    # Por encima de esta fracción de fragmentos con error no se da nota al documento
+    MAX_FRACCION_FRAGMENTOS_FALLIDOS = 0.25
+
+    def __init__(self, url_api: str = "http://localhost:11434/api/generate", modelo: str = "mistral",
+                 cliente: Optional[Union[ClienteOllama, PoolOllama, PlanificadorModelo]] = None,
+                 cache: Optional[CacheEvaluaciones] = None,
+                 stream: bool = False, max_tokens_texto: Optional[int] = 3000,
+                 concurrencia_fragmentos: int = 4, keep_alive: Optional[str] = None,
+                 reutilizar_contexto: bool = False, usar_esquema: bool = True,
+                 reintentos_criterios: int = 1, backends: Optional[List[str]] = None,
+                 max_concurrencia_backend: Optional[int] = None, por_criterio: bool = False,
+                 concurrencia_criterios: int = 8, normalizar: bool = True):
         """
         Inicializa el evaluador con la URL de la API de Ollama y el modelo a usar.
         Args:
             url_api (str): URL de la API de Ollama.
             modelo (str): Nombre del modelo (ej: "mistral").
+            cliente (Optional[Union[ClienteOllama, PoolOllama, PlanificadorModelo]]): Cliente HTTP (o pool
+                de servidores, o el planificador que los envuelve) compartido; si no se indica se crea uno.
+            cache (Optional[CacheEvaluaciones]): Caché de evaluaciones; None para desactivarla.
+            stream (bool): Leer la respuesta en streaming y cortar al cerrarse el JSON.
+            max_tokens_texto (Optional[int]): Tokens máximos del texto por prompt; los textos más
+                largos se evalúan por fragmentos y se combinan. None para no fragmentar.
+            concurrencia_fragmentos (int): Fragmentos evaluados en paralelo.
+            keep_alive (Optional[str]): Tiempo que Ollama mantiene el modelo cargado (ej: "30m").
+            reutilizar_contexto (bool): Procesar la rúbrica una vez y reenviar el `context`
+                devuelto por Ollama en cada evaluación en lugar del prompt de sistema.
+            usar_esquema (bool): Restringir la salida con el esquema JSON de la rúbrica (`format` de Ollama).
+            reintentos_criterios (int): Veces que se vuelven a pedir solo los criterios que
+                faltan o son inválidos en la respuesta.
+            backends (Optional[List[str]]): URLs de varios servidores de Ollama; si se indican
+                (y no se pasa `cliente`) las peticiones se reparten entre ellos.
+            max_concurrencia_backend (Optional[int]): Peticiones simultáneas máximas por servidor del pool.
+            por_criterio (bool): Evaluar cada criterio en su propia llamada al modelo, en paralelo,
+                y calcular la nota final localmente (útil con rúbricas de muchos criterios).
+            concurrencia_criterios (int): Criterios evaluados en paralelo en ese modo.
+            normalizar (bool): Quitar encabezados y pies repetidos, números de página, cortes con
+                guion y espacios sobrantes del texto antes de armar el prompt.
         """
         self.url_api = url_api
         self.modelo = modelo
-        self.rubrica = []  # Lista de criterios dinámicos
+        if cliente is None and backends:
+            cliente = PoolOllama(backends, max_concurrencia_por_backend=max_concurrencia_backend)
+        self.cliente = cliente or ClienteOllama(url_api)
+        self.cache = cache
+        self.stream = stream
+        self.max_tokens_texto = max_tokens_texto
+        self.concurrencia_fragmentos = concurrencia_fragmentos
+        self.keep_alive = keep_alive
+        self.reutilizar_contexto = reutilizar_contexto
+        self.usar_esquema = usar_esquema
+        self.reintentos_criterios = reintentos_criterios
+        self.por_criterio = por_criterio
+        self.concurrencia_criterios = concurrencia_criterios
+        self.normalizar = normalizar
+        self._contextos: Dict[str, List[int]] = {}
+        self._lock_contextos = threading.Lock()
+        # Rúbrica por defecto; en servidores con varios hilos se pasa la rúbrica en cada llamada
+        self.rubrica: Rubrica = ()
 
     # =====================================================
     # ACTUALIZAR RÚBRICA (recibe {"Coherencia": 5, "Claridad": 7})
     # =====================================================
     def actualizar_rubrica(self, criterios_dict: Dict[str, float]) -> None:
         """
-        Actualiza la rúbrica con los criterios y sus notas máximas.
+        Actualiza la rúbrica por defecto con los criterios y sus notas máximas.
+        No es seguro si el evaluador se comparte entre hilos: en ese caso
+        se debe pasar `rubrica=crear_rubrica(...)` a cada método de evaluación.
         Args:
             criterios_dict (Dict[str, float]): Diccionario con los criterios y sus notas máximas.
         """
-        self.rubrica = [
-            {"nombre": nombre, "notaMax": float(peso)}
-            for nombre, peso in criterios_dict.items()
-        ]
+        self.rubrica = crear_rubrica(criterios_dict)
+
+    @property
+    def version_prompt(self) -> str:
+        """Versión de las plantillas usada en la clave de la caché (distinta en el modo por criterio)."""
+        return f"{self.VERSION_PROMPT}-criterio" if self.por_criterio else self.VERSION_PROMPT
 
     # =====================================================
     # GENERAR PROMPT DINÁMICO
     # =====================================================
-    def crear_prompt(self, texto: str, criterios: List[Dict[str, float]]) -> str:
+    def crear_prompt_sistema(self, rubrica: Rubrica) -> str:
         """
-        Crea un prompt dinámico para evaluar el texto según los criterios.
+        Crea la parte fija del prompt (instrucciones y rúbrica). Se envía como "system"
+        y es idéntica para todas las tareas evaluadas con la misma rúbrica, de modo que
+        Ollama puede reutilizar el prefijo ya procesado.
         Args:
-            texto (str): Texto a evaluar.
-            criterios (List[Dict[str, float]]): Lista de criterios con sus notas máximas.
+            rubrica (Rubrica): Criterios con sus notas máximas.
         Returns:
-            str: Prompt formateado para el modelo.
+            str: Prompt de sistema para el modelo.
         """
-        criterios_json = json.dumps(criterios, indent=2)
+        criterios_json = json.dumps(rubrica_a_lista(rubrica), indent=2, ensure_ascii=False)
         prompt = f"""
         Eres un evaluador académico experto.
-        Evalúa el siguiente texto según los criterios definidos por el usuario.
-        TEXTO A EVALUAR:
-        \"\"\"{texto}\"\"\"
+        Evalúa el texto que te envíe el usuario según los criterios definidos por el usuario.
         CRITERIOS (cada criterio tiene una nota máxima):
         {criterios_json}
         Reglas estrictas:
@@ -70,14 +162,30 @@ class EvaluadorTareas:
         """
         return prompt
 
+    def crear_prompt(self, texto: str) -> str:
+        """
+        Crea la parte variable del prompt: el texto a evaluar, siempre al final.
+        Args:
+            texto (str): Texto a evaluar.
+        Returns:
+            str: Prompt de usuario para el modelo.
+        """
+        return f"""TEXTO A EVALUAR:
+        \"\"\"{texto}\"\"\"
+        """
+
     # =====================================================
     # LLAMAR A OLLAMA / MISTRAL
     # =====================================================
-    def llamar_mistral(self, prompt: str) -> Optional[str]:
+    def llamar_mistral(self, prompt: str, al_recibir_token: Optional[Callable[[str], None]] = None,
+                       sistema: Optional[str] = None, formato: Optional[Dict] = None) -> Optional[str]:
         """
         Llama a la API de Ollama para generar una respuesta.
         Args:
             prompt (str): Prompt a enviar al modelo.
+            al_recibir_token (Optional[Callable[[str], None]]): En modo streaming, se llama con cada fragmento.
+            sistema (Optional[str]): Prompt de sistema (prefijo compartido entre tareas).
+            formato (Optional[Dict]): Esquema JSON al que Ollama debe ajustar la respuesta.
         Returns:
             Optional[str]: Respuesta del modelo o None si hay error.
         """
@@ -88,13 +196,83 @@ class EvaluadorTareas:
                 "stream": False,
                 "temperature": 0.2
             }
-            response = requests.post(self.url_api, json=payload, timeout=180)
-            response.raise_for_status()
-            return response.json().get("response", "")
-        except Exception as e:
+            if self.keep_alive is not None:
+                payload["keep_alive"] = self.keep_alive
+            if formato is not None:
+                payload["format"] = formato
+            if sistema is not None:
+                contexto = self._obtener_contexto(sistema) if self.reutilizar_contexto else None
+                if contexto is not None:
+                    # El contexto ya contiene el prompt de sistema procesado
+                    payload["context"] = contexto
+                else:
+                    payload["system"] = sistema
+            with medir_etapa("llamada_modelo"):
+                if self.stream:
+                    datos = self.cliente.generar_stream(payload, al_recibir_token)
+                else:
+                    datos = self.cliente.generar(payload)
+            registrar_respuesta_ollama(datos)
+            return datos.get("response", "")
+        except ErrorModelo as e:
             print("Error al llamar al modelo:", e)
             return None
 
+    def _obtener_contexto(self, sistema: str) -> Optional[List[int]]:
+        """
+        Devuelve el `context` de Ollama con el prompt de sistema ya procesado,
+        generándolo una sola vez por rúbrica.
+        Args:
+            sistema (str): Prompt de sistema.
+        Returns:
+            Optional[List[int]]: Tokens de contexto o None si no se pudo obtener.
+        """
+        with self._lock_contextos:
+            if sistema in self._contextos:
+                return self._contextos[sistema]
+        payload = {
+            "model": self.modelo,
+            "system": sistema,
+            "prompt": "Responde solo: listo.",
+            "stream": False,
+            "options": {"num_predict": 1}
+        }
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        try:
+            contexto = self.cliente.generar(payload).get("context")
+        except ErrorModelo as e:
+            print("Error al preparar el contexto del modelo:", e)
+            return None
+        with self._lock_contextos:
+            if len(self._contextos) >= 32:
+                self._contextos.clear()
+            self._contextos[sistema] = contexto
+        return contexto
+
+    def precalentar(self) -> float:
+        """
+        Carga el modelo en cada servidor antes de la primera evaluación: una petición
+        sin prompt (Ollama solo carga el modelo y lo mantiene `keep_alive`) seguida de
+        una generación de un token, para que la primera tarea no pague la carga.
+        Returns:
+            float: Segundos que tardó.
+        Raises:
+            ErrorModelo: Si algún servidor no responde.
+        """
+        inicio = time.perf_counter()
+        # Directamente al cliente, sin esperar turno en el planificador: aún no hay tareas
+        destino = self.cliente.cliente if isinstance(self.cliente, PlanificadorModelo) else self.cliente
+        clientes = [backend.cliente for backend in destino.backends] if isinstance(destino, PoolOllama) else [destino]
+        payload = {"model": self.modelo, "stream": False}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        for cliente in clientes:
+            with medir_etapa("precalentar_modelo", "arranque"):
+                cliente.generar(payload)
+                cliente.generar({**payload, "prompt": "Responde solo: listo.", "options": {"num_predict": 1}})
+        return time.perf_counter() - inicio
+
     # =====================================================
     # EXTRAER JSON DEL MODELO
     # =====================================================
@@ -106,45 +284,516 @@ class EvaluadorTareas:
         Returns:
             Optional[Dict]: Diccionario con los resultados o None si hay error.
         """
-        try:
-            inicio = texto.find("{")
-            fin = texto.rfind("}") + 1
-            return json.loads(texto[inicio:fin])
-        except:
-            return None
+        datos = reparar_json(texto)
+        return datos if isinstance(datos, dict) else None
+
+    # =====================================================
+    # ESQUEMA Y VALIDACIÓN DE LA RESPUESTA
+    # =====================================================
+    def construir_esquema(self, rubrica: Rubrica) -> Dict:
+        """
+        Construye el esquema JSON de la respuesta esperada para la rúbrica.
+        Args:
+            rubrica (Rubrica): Criterios con sus notas máximas.
+        Returns:
+            Dict: Esquema para el campo `format` de Ollama.
+        """
+        return {
+            "type": "object",
+            "properties": {
+                "criterios": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "nombre": {"type": "string", "enum": [c.nombre for c in rubrica]},
+                            "notaMax": {"type": "number"},
+                            "puntaje": {"type": "number"},
+                            "justificacion": {"type": "string"}
+                        },
+                        "required": ["nombre", "notaMax", "puntaje", "justificacion"]
+                    },
+                    "minItems": len(rubrica),
+                    "maxItems": len(rubrica)
+                },
+                "notaFinal": {"type": "number"}
+            },
+            "required": ["criterios", "notaFinal"]
+        }
+
+    def validar_criterios(self, datos: Optional[Dict], rubrica: Rubrica) -> Tuple[Dict[str, Dict], List[Criterio]]:
+        """
+        Separa los criterios de la respuesta en válidos y pendientes (faltantes o con un
+        puntaje que no es numérico o está fuera del rango 0..notaMax).
+        Args:
+            datos (Optional[Dict]): Respuesta del modelo ya decodificada.
+            rubrica (Rubrica): Rúbrica aplicada.
+        Returns:
+            Tuple[Dict[str, Dict], List[Criterio]]: Criterios válidos por nombre y criterios pendientes.
+        """
+        recibidos = datos.get("criterios") if isinstance(datos, dict) else None
+        por_nombre = {}
+        if isinstance(recibidos, list):
+            por_nombre = {str(c.get("nombre", "")).strip().lower(): c for c in recibidos if isinstance(c, dict)}
+
+        validos: Dict[str, Dict] = {}
+        pendientes: List[Criterio] = []
+        for criterio in rubrica:
+            c = por_nombre.get(criterio.nombre.strip().lower())
+            puntaje = c.get("puntaje") if c else None
+            if isinstance(puntaje, str):
+                try:
+                    puntaje = float(puntaje.replace(",", ".").split("/")[0])
+                except ValueError:
+                    puntaje = None
+            if isinstance(puntaje, bool) or not isinstance(puntaje, (int, float)) or not 0 <= puntaje <= criterio.notaMax:
+                pendientes.append(criterio)
+                continue
+            validos[criterio.nombre] = {
+                "nombre": criterio.nombre,
+                "notaMax": criterio.notaMax,
+                "puntaje": puntaje,
+                "justificacion": str(c.get("justificacion", ""))
+            }
+        return validos, pendientes
 
     # =====================================================
     # EVALUAR TEXTO (PDF / WORD / TEXTO PLANO)
     # =====================================================
-    def evaluar_texto(self, texto: str) -> Dict:
+    def evaluar_texto(self, texto: str, rubrica: Optional[Rubrica] = None,
+                      al_recibir_token: Optional[Callable[[str], None]] = None,
+                      fragmentar: bool = True, paginado: bool = False) -> Dict:
         """
         Evalúa un texto único (ej: PDF, WORD).
         Args:
             texto (str): Texto a evaluar.
+            rubrica (Optional[Rubrica]): Rúbrica a aplicar; por defecto la de `actualizar_rubrica`.
+            al_recibir_token (Optional[Callable[[str], None]]): En modo streaming, se llama con cada fragmento.
+            fragmentar (bool): Evaluar por fragmentos si el texto supera `max_tokens_texto`.
+            paginado (bool): El texto es de un PDF (páginas separadas por "\f"): se quitan sus
+                encabezados, pies y números de página.
         Returns:
-            Dict: Resultados de la evaluación.
+            Dict: Resultados de la evaluación, con "tokens_texto" ({"original", "enviado"}).
+        """
+        rubrica = self.rubrica if rubrica is None else rubrica
+        original = texto
+        texto, tokens = self.preparar_texto(texto, paginado)
+        if self._vaciado(original, texto):
+            return {"error": TEXTO_VACIADO, "tokens_texto": tokens}
+        datos = self._evaluar_preparado(texto, rubrica, al_recibir_token, fragmentar)
+        # Después de guardarlo en la caché: la caché ya serializó el resultado
+        datos["tokens_texto"] = tokens
+        return datos
+
+    def preparar_texto(self, texto: str, paginado: bool = False) -> Tuple[str, Dict[str, int]]:
+        """
+        Normaliza el texto antes de armar el prompt y registra los tokens estimados
+        antes y después.
+        Args:
+            texto (str): Texto extraído.
+            paginado (bool): El texto es de un PDF (ver `normalizar_texto`).
+        Returns:
+            Tuple[str, Dict[str, int]]: Texto a enviar y {"original": tokens, "enviado": tokens}.
         """
-        prompt = self.crear_prompt(texto, self.rubrica)
-        raw = self.llamar_mistral(prompt)
-        datos = self.extraer_json(raw)
-        if not datos:
+        original = estimar_tokens(texto)
+        if self.normalizar:
+            with medir_etapa("normalizar_texto"):
+                texto = normalizar_texto(texto, paginado)
+        tokens = {"original": original, "enviado": estimar_tokens(texto)}
+        registrar_tokens_texto(tokens["original"], tokens["enviado"])
+        return texto, tokens
+
+    @staticmethod
+    def _vaciado(original: str, texto: str) -> bool:
+        """Indica si la normalización dejó vacío un texto que tenía contenido."""
+        return not texto.strip() and bool(original.strip())
+
+    def _evaluar_preparado(self, texto: str, rubrica: Rubrica,
+                           al_recibir_token: Optional[Callable[[str], None]], fragmentar: bool) -> Dict:
+        """Evalúa un texto ya normalizado (desde la caché si está)."""
+        clave = None
+        if self.cache is not None:
+            clave = self.cache.clave(texto, rubrica_a_lista(rubrica), self.modelo, self.version_prompt)
+            datos = self.cache.obtener(clave)
+            if datos is not None:
+                return datos
+
+        if fragmentar and self.max_tokens_texto and estimar_tokens(texto) > self.max_tokens_texto:
+            datos = self.evaluar_por_fragmentos(texto, rubrica)
+            # Con fragmentos fallidos no se guarda en caché: al repetir se pueden evaluar todos
+            if "error" in datos or datos.get("fragmentos_fallidos"):
+                return datos
+        else:
+            if self.por_criterio:
+                datos = self.evaluar_por_criterio(texto, rubrica, al_recibir_token)
+            else:
+                datos = self._evaluar_directo(texto, rubrica, al_recibir_token)
+            if "error" in datos:
+                return datos
+        if clave is not None:
+            self.cache.guardar(clave, datos)
+        return datos
+
+    def _evaluar_directo(self, texto: str, rubrica: Rubrica,
+                         al_recibir_token: Optional[Callable[[str], None]] = None) -> Dict:
+        """
+        Evalúa el texto en una sola llamada y vuelve a pedir únicamente los criterios
+        que falten o sean inválidos, en lugar de repetir la evaluación completa.
+        """
+        with medir_etapa("crear_prompt"):
+            prompt = self.crear_prompt(texto)
+            sistema = self.crear_prompt_sistema(rubrica)
+        formato = self.construir_esquema(rubrica) if self.usar_esquema else None
+        raw = self.llamar_mistral(prompt, al_recibir_token, sistema=sistema, formato=formato)
+        with medir_etapa("extraer_json"):
+            datos = self.extraer_json(raw)
+        validos, pendientes = self.validar_criterios(datos, rubrica)
+
+        reintentos = 0
+        while pendientes and reintentos < self.reintentos_criterios:
+            reintentos += 1
+            subrubrica = tuple(pendientes)
+            formato = self.construir_esquema(subrubrica) if self.usar_esquema else None
+            raw_parcial = self.llamar_mistral(prompt, sistema=self.crear_prompt_sistema(subrubrica), formato=formato)
+            with medir_etapa("extraer_json"):
+                nuevos, pendientes = self.validar_criterios(self.extraer_json(raw_parcial), subrubrica)
+            validos.update(nuevos)
+
+        if pendientes:
             return {
                 "error": "JSON inválido",
+                "criterios_faltantes": [c.nombre for c in pendientes],
                 "respuesta": raw
             }
-        datos["Calificación Final"] = datos["notaFinal"]
-        return datos
+
+        criterios = [validos[c.nombre] for c in rubrica]
+        nota_final = datos.get("notaFinal") if datos and not reintentos else None
+        if isinstance(nota_final, bool) or not isinstance(nota_final, (int, float)):
+            # Si se combinaron varias respuestas, la nota se calcula localmente
+            nota_final = self.calcular_nota_final(criterios)
+        return {"criterios": criterios, "notaFinal": nota_final, "Calificación Final": nota_final}
+
+    # =====================================================
+    # EVALUAR CADA CRITERIO EN UNA LLAMADA PROPIA
+    # =====================================================
+    def crear_prompt_sistema_criterio(self) -> str:
+        """
+        Instrucciones del modo por criterio. No dependen del criterio, de modo que el
+        prefijo (instrucciones + documento) es el mismo en todas las llamadas de un texto.
+        Returns:
+            str: Prompt de sistema para el modelo.
+        """
+        return """
+        Eres un evaluador académico experto.
+        Evaluarás el texto del usuario según UN SOLO criterio, indicado al final del mensaje.
+        Reglas estrictas:
+        - Asigna un puntaje entre 0 y la nota máxima del criterio.
+        - Explica brevemente por qué asignaste ese puntaje.
+        - NO incluyas nada fuera del JSON.
+        FORMATO EXACTO DE RESPUESTA:
+        {"puntaje": 0, "justificacion": "Explicación breve"}
+        Responde únicamente con el JSON.
+        """
+
+    def crear_prompt_criterio(self, texto: str, criterio: Criterio) -> str:
+        """
+        Crea el prompt de un criterio: primero el texto (prefijo compartido) y al final el criterio.
+        Args:
+            texto (str): Texto a evaluar.
+            criterio (Criterio): Criterio a evaluar.
+        Returns:
+            str: Prompt de usuario para el modelo.
+        """
+        return f"""{self.crear_prompt(texto)}
+
+        CRITERIO: {criterio.nombre} (nota máxima: {criterio.notaMax})
+        """
+
+    def construir_esquema_criterio(self, criterio: Criterio) -> Dict:
+        """
+        Esquema JSON de la respuesta de un solo criterio.
+        Args:
+            criterio (Criterio): Criterio evaluado.
+        Returns:
+            Dict: Esquema para el campo `format` de Ollama.
+        """
+        return {
+            "type": "object",
+            "properties": {
+                "puntaje": {"type": "number", "minimum": 0, "maximum": criterio.notaMax},
+                "justificacion": {"type": "string"}
+            },
+            "required": ["puntaje", "justificacion"]
+        }
+
+    def evaluar_criterio(self, texto: str, criterio: Criterio,
+                         al_recibir_token: Optional[Callable[[str], None]] = None) -> Optional[Dict]:
+        """
+        Evalúa un único criterio, reintentándolo si la respuesta no es válida.
+        Args:
+            texto (str): Texto a evaluar.
+            criterio (Criterio): Criterio a evaluar.
+            al_recibir_token (Optional[Callable[[str], None]]): Se llama con cada fragmento generado.
+        Returns:
+            Optional[Dict]: Criterio evaluado o None si el modelo no dio una respuesta válida.
+        """
+        prompt = self.crear_prompt_criterio(texto, criterio)
+        sistema = self.crear_prompt_sistema_criterio()
+        formato = self.construir_esquema_criterio(criterio) if self.usar_esquema else None
+        for _ in range(self.reintentos_criterios + 1):
+            raw = self.llamar_mistral(prompt, al_recibir_token, sistema=sistema, formato=formato)
+            with medir_etapa("extraer_json"):
+                datos = self.extraer_json(raw)
+            if datos is not None:
+                validos, _ = self.validar_criterios({"criterios": [{**datos, "nombre": criterio.nombre}]},
+                                                    (criterio,))
+                if validos:
+                    return validos[criterio.nombre]
+        return None
+
+    def evaluar_por_criterio(self, texto: str, rubrica: Rubrica,
+                             al_recibir_token: Optional[Callable[[str], None]] = None) -> Dict:
+        """
+        Evalúa todos los criterios en llamadas concurrentes (la latencia se acerca a la del
+        criterio más lento) y calcula la nota final localmente.
+        Args:
+            texto (str): Texto a evaluar.
+            rubrica (Rubrica): Rúbrica a aplicar.
+            al_recibir_token (Optional[Callable[[str], None]]): Se llama con cada fragmento generado.
+        Returns:
+            Dict: Resultado con "criterios", "notaFinal" y "Calificación Final", o un error.
+        """
+        with ThreadPoolExecutor(max_workers=max(1, min(len(rubrica), self.concurrencia_criterios))) as ejecutor:
+            evaluar = en_contexto_actual(lambda c: self.evaluar_criterio(texto, c, al_recibir_token))
+            criterios = list(ejecutor.map(evaluar, rubrica))
+
+        faltantes = [c.nombre for c, resultado in zip(rubrica, criterios) if resultado is None]
+        if faltantes:
+            return {"error": "JSON inválido", "criterios_faltantes": faltantes}
+        nota_final = self.calcular_nota_final(criterios)
+        return {"criterios": criterios, "notaFinal": nota_final, "Calificación Final": nota_final}
+
+    # =====================================================
+    # EVALUAR VARIAS TAREAS CORTAS EN UN SOLO PROMPT
+    # =====================================================
+    def crear_prompt_sistema_lote(self, rubrica: Rubrica) -> str:
+        """
+        Crea el prompt de sistema para evaluar varias tareas en una sola llamada.
+        Args:
+            rubrica (Rubrica): Criterios con sus notas máximas.
+        Returns:
+            str: Prompt de sistema para el modelo.
+        """
+        criterios_json = json.dumps(rubrica_a_lista(rubrica), indent=2, ensure_ascii=False)
+        prompt = f"""
+        Eres un evaluador académico experto.
+        El usuario te enviará VARIAS tareas independientes, cada una precedida por [ID: ...].
+        Evalúa cada tarea por separado según los criterios definidos por el usuario.
+        CRITERIOS (cada criterio tiene una nota máxima):
+        {criterios_json}
+        Reglas estrictas:
+        - Evalúa cada criterio con un puntaje entre 0 y su "notaMax".
+        - Explica brevemente por qué asignaste ese puntaje.
+        - Calcula "notaFinal" como el promedio de (puntaje / notaMax) * 10.
+        - Incluye un elemento por cada ID recibido, copiando el ID exactamente.
+        - NO incluyas nada fuera del JSON.
+        FORMATO EXACTO DE RESPUESTA:
+        {{
+          "resultados": [
+            {{
+              "id": "ID de la tarea",
+              "criterios": [
+                {{
+                  "nombre": "NombreCriterio",
+                  "notaMax": 0,
+                  "puntaje": 0,
+                  "justificacion": "Explicación breve"
+                }}
+              ],
+              "notaFinal": 0
+            }}
+          ]
+        }}
+        Responde únicamente con el JSON.
+        """
+        return prompt
+
+    def evaluar_lote(self, textos: List[str], rubrica: Optional[Rubrica] = None) -> List[Dict]:
+        """
+        Evalúa varias tareas cortas en una sola llamada al modelo. Las tareas que
+        falten o lleguen mal formadas en la respuesta se evalúan individualmente.
+        Args:
+            textos (List[str]): Textos a evaluar.
+            rubrica (Optional[Rubrica]): Rúbrica a aplicar; por defecto la de `actualizar_rubrica`.
+        Returns:
+            List[Dict]: Resultados en el mismo orden que `textos`.
+        """
+        rubrica = self.rubrica if rubrica is None else rubrica
+        preparados = [self.preparar_texto(texto) for texto in textos]
+        # Un texto que la normalización dejó vacío no se envía al modelo
+        resultados: List[Optional[Dict]] = [{"error": TEXTO_VACIADO} if self._vaciado(original, texto) else None
+                                            for original, (texto, _) in zip(textos, preparados)]
+        textos = [texto for texto, _ in preparados]
+        claves: List[Optional[str]] = [None] * len(textos)
+
+        # Las tareas ya evaluadas se toman de la caché
+        if self.cache is not None:
+            for i, texto in enumerate(textos):
+                if resultados[i] is None:
+                    claves[i] = self.cache.clave(texto, rubrica_a_lista(rubrica), self.modelo, self.version_prompt)
+                    resultados[i] = self.cache.obtener(claves[i])
+
+        pendientes = [i for i, r in enumerate(resultados) if r is None]
+        if len(pendientes) > 1:
+            prompt = "\n".join(f"[ID: t{i}]\n\"\"\"{textos[i]}\"\"\"" for i in pendientes)
+            raw = self.llamar_mistral(prompt, sistema=self.crear_prompt_sistema_lote(rubrica))
+            datos = self.extraer_json(raw) or {}
+            elementos = datos.get("resultados") if isinstance(datos.get("resultados"), list) else []
+            por_id = {str(e.get("id")): e for e in elementos if isinstance(e, dict)}
+            for i in pendientes:
+                resultado = self._validar_resultado(por_id.get(f"t{i}"), rubrica)
+                if resultado is not None:
+                    resultados[i] = resultado
+                    if claves[i] is not None:
+                        self.cache.guardar(claves[i], resultado)
+
+        # Respaldo: evaluación individual de las tareas que faltan
+        for i, resultado in enumerate(resultados):
+            if resultado is None:
+                resultados[i] = self._evaluar_preparado(textos[i], rubrica, None, True)
+        for resultado, (_, tokens) in zip(resultados, preparados):
+            resultado["tokens_texto"] = tokens
+        return resultados
+
+    def _validar_resultado(self, datos: Optional[Dict], rubrica: Rubrica) -> Optional[Dict]:
+        """
+        Comprueba que un resultado tenga un puntaje numérico para cada criterio de la rúbrica.
+        Args:
+            datos (Optional[Dict]): Resultado devuelto por el modelo.
+            rubrica (Rubrica): Rúbrica aplicada.
+        Returns:
+            Optional[Dict]: Resultado con "Calificación Final" o None si no es válido.
+        """
+        validos, pendientes = self.validar_criterios(datos, rubrica)
+        if pendientes:
+            return None
+        criterios = [validos[c.nombre] for c in rubrica]
+        nota_final = datos.get("notaFinal")
+        if isinstance(nota_final, bool) or not isinstance(nota_final, (int, float)):
+            nota_final = self.calcular_nota_final(criterios)
+        return {"criterios": criterios, "notaFinal": nota_final, "Calificación Final": nota_final}
+
+    # =====================================================
+    # EVALUAR DOCUMENTOS LARGOS POR FRAGMENTOS (MAP-REDUCE)
+    # =====================================================
+    def evaluar_por_fragmentos(self, texto: str, rubrica: Optional[Rubrica] = None) -> Dict:
+        """
+        Divide un texto largo en fragmentos que caben en el contexto del modelo,
+        los evalúa en paralelo y combina los puntajes.
+        Args:
+            texto (str): Texto a evaluar.
+            rubrica (Optional[Rubrica]): Rúbrica a aplicar; por defecto la de `actualizar_rubrica`.
+        Returns:
+            Dict: Resultados combinados de la evaluación.
+        """
+        rubrica = self.rubrica if rubrica is None else rubrica
+        fragmentos = fragmentar_texto(texto, self.max_tokens_texto)
+        total = len(fragmentos)
+        textos = [f"[Fragmento {i} de {total} del documento]\n{fragmento}"
+                  for i, fragmento in enumerate(fragmentos, start=1)]
+
+        with ThreadPoolExecutor(max_workers=max(1, self.concurrencia_fragmentos)) as ejecutor:
+            evaluar = en_contexto_actual(lambda t: self._evaluar_preparado(t, rubrica, None, False))
+            evaluaciones = list(ejecutor.map(evaluar, textos))
+
+        pesos = [estimar_tokens(fragmento) for fragmento in fragmentos]
+        return self.combinar_evaluaciones(evaluaciones, pesos, rubrica)
+
+    def combinar_evaluaciones(self, evaluaciones: List[Dict], pesos: List[float], rubrica: Rubrica) -> Dict:
+        """
+        Paso de reducción: promedia cada criterio ponderando por el tamaño del fragmento
+        y recalcula la nota final. Los fragmentos con error se descartan y se cuentan en
+        "fragmentos_fallidos"; si fallan más de `MAX_FRACCION_FRAGMENTOS_FALLIDOS` de ellos,
+        se devuelve un error en lugar de una nota calculada con una parte del documento.
+        Args:
+            evaluaciones (List[Dict]): Evaluación de cada fragmento.
+            pesos (List[float]): Peso de cada fragmento (tokens).
+            rubrica (Rubrica): Rúbrica aplicada.
+        Returns:
+            Dict: Evaluación combinada.
+        """
+        validas = [(e, p) for e, p in zip(evaluaciones, pesos) if "error" not in e and e.get("criterios")]
+        fallidos = len(evaluaciones) - len(validas)
+        if not validas:
+            return {
+                "error": "JSON inválido",
+                "respuesta": [e.get("respuesta") for e in evaluaciones],
+                "fragmentos": len(evaluaciones),
+                "fragmentos_fallidos": fallidos
+            }
+        if fallidos > self.MAX_FRACCION_FRAGMENTOS_FALLIDOS * len(evaluaciones):
+            return {
+                "error": f"No se pudieron evaluar {fallidos} de {len(evaluaciones)} fragmentos del documento",
+                "respuesta": [e.get("respuesta") for e in evaluaciones if "error" in e or not e.get("criterios")],
+                "fragmentos": len(evaluaciones),
+                "fragmentos_fallidos": fallidos
+            }
+
+        criterios = []
+        for criterio in rubrica:
+            suma = peso_total = 0.0
+            justificaciones = []
+            for i, (evaluacion, peso) in enumerate(validas, start=1):
+                for c in evaluacion["criterios"]:
+                    if c.get("nombre") == criterio.nombre:
+                        try:
+                            suma += float(c.get("puntaje", 0)) * peso
+                        except (TypeError, ValueError):
+                            continue
+                        peso_total += peso
+                        if c.get("justificacion"):
+                            justificaciones.append(f"Fragmento {i}: {c['justificacion']}")
+                        break
+            criterios.append({
+                "nombre": criterio.nombre,
+                "notaMax": criterio.notaMax,
+                "puntaje": round(min(max(suma / peso_total, 0), criterio.notaMax), 2) if peso_total else 0,
+                "justificacion": " | ".join(justificaciones)
+            })
+
+        nota_final = self.calcular_nota_final(criterios)
+        return {
+            "criterios": criterios,
+            "notaFinal": nota_final,
+            "Calificación Final": nota_final,
+            "fragmentos": len(evaluaciones),
+            "fragmentos_fallidos": fallidos
+        }
+
+    @staticmethod
+    def calcular_nota_final(criterios: List[Dict]) -> float:
+        """
+        Calcula la nota final como el promedio de (puntaje / notaMax) * 10.
+        Args:
+            criterios (List[Dict]): Criterios con "puntaje" y "notaMax".
+        Returns:
+            float: Nota final sobre 10, redondeada a dos decimales.
+        """
+        notas = [float(c["puntaje"]) / float(c["notaMax"]) * 10 for c in criterios if float(c["notaMax"]) > 0]
+        return round(sum(notas) / len(notas), 2) if notas else 0
 
     # =====================================================
     # EVALUAR TEXTO CON TEXTO BASE (para Excel)
     # =====================================================
-    def evaluar_con_texto_base(self, texto_base: str, autor: str, resumen: str) -> Dict:
+    def evaluar_con_texto_base(self, texto_base: str, autor: str, resumen: str,
+                               rubrica: Optional[Rubrica] = None) -> Dict:
         """
         Evalúa un resumen en comparación con un texto base (ej: Excel).
         Args:
             texto_base (str): Texto original.
             autor (str): Autor del resumen.
             resumen (str): Resumen a evaluar.
+            rubrica (Optional[Rubrica]): Rúbrica a aplicar; por defecto la de `actualizar_rubrica`.
         Returns:
             Dict: Resultados de la evaluación.
         """
@@ -155,17 +804,11 @@ class EvaluadorTareas:
         RESUMEN PROPUESTO:
         \"\"\"{resumen}\"\"\"
         """
-        prompt = self.crear_prompt(texto_total, self.rubrica)
-        raw = self.llamar_mistral(prompt)
-        datos = self.extraer_json(raw)
-        if not datos:
-            return {
-                "error": "JSON inválido",
-                "respuesta": raw
-            }
+        datos = self.evaluar_texto(texto_total, rubrica)
+        if "error" in datos:
+            return datos
         datos["Autor"] = autor
         datos["Resumen"] = resumen
-        datos["Calificación Final"] = datos["notaFinal"]
         return datos
 
     # =====================================================
@@ -180,6 +823,9 @@ class EvaluadorTareas:
         Returns:
             str: Ruta del archivo Excel generado.
         """
+        # pandas solo se necesita aquí: se importa al generar el primer Excel, no al arrancar
+        import pandas as pd
+
         # Crear DataFrame con los criterios
         criterios_df = pd.DataFrame(resultados["criterios"])
         criterios_df["Criterio"] = criterios_df["nombre"]
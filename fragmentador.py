@@ -0,0 +1,69 @@
+import math
+from typing import List
+
+# Aproximación para texto en español con los tokenizadores de Mistral/Llama
+CARACTERES_POR_TOKEN = 4
+
+# Separadores de mayor a menor: página (los PDF separan páginas con "\f"),
+# párrafo, línea, oración y palabra
+SEPARADORES = ["\f", "\n\n", "\n", ". ", " "]
+
+
+def estimar_tokens(texto: str) -> int:
+    """
+    Estima el número de tokens de un texto sin cargar el tokenizador del modelo.
+    Args:
+        texto (str): Texto a medir.
+    Returns:
+        int: Tokens aproximados.
+    """
+    return math.ceil(len(texto) / CARACTERES_POR_TOKEN)
+
+
+def fragmentar_texto(texto: str, max_tokens: int) -> List[str]:
+    """
+    Divide un texto en fragmentos de como máximo `max_tokens` tokens, cortando
+    preferentemente en saltos de página, luego de párrafo, línea, oración y palabra.
+    Args:
+        texto (str): Texto a dividir.
+        max_tokens (int): Presupuesto de tokens por fragmento.
+    Returns:
+        List[str]: Fragmentos en el orden original.
+    """
+    fragmentos = [f.strip() for f in _dividir(texto, max_tokens, 0)]
+    return [f for f in fragmentos if f]
+
+
+def _dividir(texto: str, max_tokens: int, nivel: int) -> List[str]:
+    if estimar_tokens(texto) <= max_tokens:
+        return [texto]
+    if nivel >= len(SEPARADORES):
+        # Sin separadores útiles: corte duro por número de caracteres
+        paso = max_tokens * CARACTERES_POR_TOKEN
+        return [texto[i:i + paso] for i in range(0, len(texto), paso)]
+
+    separador = SEPARADORES[nivel]
+    partes = texto.split(separador)
+    if len(partes) == 1:
+        return _dividir(texto, max_tokens, nivel + 1)
+
+    # Agrupar partes consecutivas mientras quepan en el presupuesto
+    fragmentos: List[str] = []
+    actual: List[str] = []
+    tamano_actual = 0
+    for parte in partes:
+        tamano = estimar_tokens(parte + separador)
+        if tamano > max_tokens:
+            if actual:
+                fragmentos.append(separador.join(actual))
+                actual, tamano_actual = [], 0
+            fragmentos.extend(_dividir(parte, max_tokens, nivel + 1))
+            continue
+        if actual and tamano_actual + tamano > max_tokens:
+            fragmentos.append(separador.join(actual))
+            actual, tamano_actual = [], 0
+        actual.append(parte)
+        tamano_actual += tamano
+    if actual:
+        fragmentos.append(separador.join(actual))
+    return fragmentos
@@ -0,0 +1,237 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Límites (en segundos) pensados para etapas que van de milisegundos a varios minutos
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BUCKETS_TOKENS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+# Tipo de archivo de la evaluación en curso (pdf, docx, xlsx, texto...)
+_tipo_actual: contextvars.ContextVar = contextvars.ContextVar("tipo_archivo", default="desconocido")
+
+
+def _formatear_etiquetas(etiquetas: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    partes = [f'{k}="{v}"' for k, v in etiquetas]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _formatear_numero(valor: float) -> str:
+    return repr(float(valor)) if valor != int(valor) else str(int(valor))
+
+
+# =====================================================
+# TIPOS DE MÉTRICA
+# =====================================================
+class Contador:
+    def __init__(self, nombre: str, ayuda: str):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self._valores: Dict[Tuple[Tuple[str, str], ...], float] = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, valor: float = 1, **etiquetas: str) -> None:
+        clave = tuple(sorted(etiquetas.items()))
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def exportar(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        with self._lock:
+            for clave, valor in sorted(self._valores.items()):
+                lineas.append(f"{self.nombre}{_formatear_etiquetas(clave)} {_formatear_numero(valor)}")
+        return lineas
+
+
+class Medidor(Contador):
+    def fijar(self, valor: float, **etiquetas: str) -> None:
+        clave = tuple(sorted(etiquetas.items()))
+        with self._lock:
+            self._valores[clave] = valor
+
+    def exportar(self) -> List[str]:
+        lineas = super().exportar()
+        lineas[1] = f"# TYPE {self.nombre} gauge"
+        return lineas
+
+
+class Histograma:
+    def __init__(self, nombre: str, ayuda: str, buckets: Sequence[float] = BUCKETS_SEGUNDOS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.buckets = tuple(sorted(buckets))
+        # Por combinación de etiquetas: [conteos por bucket..., suma, total]
+        self._series: Dict[Tuple[Tuple[str, str], ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, **etiquetas: str) -> None:
+        clave = tuple(sorted(etiquetas.items()))
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.setdefault(clave, [0] * len(self.buckets) + [0.0, 0])
+            if indice < len(self.buckets):
+                serie[indice] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def exportar(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            for clave, serie in sorted(self._series.items()):
+                acumulado = 0
+                for limite, conteo in zip(self.buckets, serie):
+                    acumulado += conteo
+                    etiquetas = _formatear_etiquetas(clave, f'le="{_formatear_numero(limite)}"')
+                    lineas.append(f"{self.nombre}_bucket{etiquetas} {int(acumulado)}")
+                infinito = _formatear_etiquetas(clave, 'le="+Inf"')
+                lineas.append(f"{self.nombre}_bucket{infinito} {int(serie[-1])}")
+                lineas.append(f"{self.nombre}_sum{_formatear_etiquetas(clave)} {_formatear_numero(serie[-2])}")
+                lineas.append(f"{self.nombre}_count{_formatear_etiquetas(clave)} {int(serie[-1])}")
+        return lineas
+
+
+# =====================================================
+# REGISTRO
+# =====================================================
+class RegistroMetricas:
+    def __init__(self):
+        """Conjunto de métricas del proceso, exportables en formato de texto de Prometheus."""
+        self._metricas: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _obtener(self, clase, nombre: str, *args):
+        with self._lock:
+            if nombre not in self._metricas:
+                self._metricas[nombre] = clase(nombre, *args)
+            return self._metricas[nombre]
+
+    def contador(self, nombre: str, ayuda: str) -> Contador:
+        return self._obtener(Contador, nombre, ayuda)
+
+    def medidor(self, nombre: str, ayuda: str) -> Medidor:
+        return self._obtener(Medidor, nombre, ayuda)
+
+    def histograma(self, nombre: str, ayuda: str, buckets: Sequence[float] = BUCKETS_SEGUNDOS) -> Histograma:
+        return self._obtener(Histograma, nombre, ayuda, buckets)
+
+    def exportar(self) -> str:
+        """
+        Devuelve todas las métricas en el formato de exposición de Prometheus.
+        Returns:
+            str: Texto para el endpoint /metrics.
+        """
+        with self._lock:
+            metricas = list(self._metricas.values())
+        lineas: List[str] = []
+        for metrica in metricas:
+            lineas.extend(metrica.exportar())
+        return "\n".join(lineas) + "\n"
+
+
+registro = RegistroMetricas()
+
+ETAPAS = registro.histograma(
+    "calificador_etapa_segundos", "Duración de cada etapa de la evaluación por tipo de archivo."
+)
+OLLAMA_TOKENS_PROMPT = registro.histograma(
+    "ollama_prompt_eval_tokens", "Tokens del prompt evaluados por Ollama (prompt_eval_count).", BUCKETS_TOKENS
+)
+OLLAMA_TOKENS_GENERADOS = registro.histograma(
+    "ollama_eval_tokens", "Tokens generados por Ollama (eval_count).", BUCKETS_TOKENS
+)
+OLLAMA_DURACION_PROMPT = registro.histograma(
+    "ollama_prompt_eval_segundos", "Tiempo de Ollama evaluando el prompt (prompt_eval_duration)."
+)
+OLLAMA_DURACION_GENERACION = registro.histograma(
+    "ollama_eval_segundos", "Tiempo de Ollama generando la respuesta (eval_duration)."
+)
+OLLAMA_TOKENS_TOTALES = registro.contador(
+    "ollama_tokens_total", "Tokens procesados por Ollama, por fase (prompt o generacion)."
+)
+DUPLICADOS = registro.contador(
+    "calificador_duplicados_total", "Entregas idénticas (exacto) o casi idénticas (similar) a otra ya indexada."
+)
+TOKENS_TEXTO = registro.histograma(
+    "calificador_tokens_texto", "Tokens estimados del texto de cada entrega, antes y después de normalizarlo.",
+    BUCKETS_TOKENS
+)
+TOKENS_TEXTO_TOTALES = registro.contador(
+    "calificador_tokens_texto_total", "Tokens estimados del texto de las entregas, por etapa (original o enviado)."
+)
+
+
+# =====================================================
+# AYUDAS PARA INSTRUMENTAR
+# =====================================================
+@contextmanager
+def tipo_archivo(tipo: str) -> Iterator[None]:
+    """
+    Fija el tipo de archivo de las métricas registradas dentro del bloque.
+    Args:
+        tipo (str): Tipo de archivo (pdf, docx, xlsx, texto...).
+    """
+    token = _tipo_actual.set(tipo)
+    try:
+        yield
+    finally:
+        _tipo_actual.reset(token)
+
+
+@contextmanager
+def medir_etapa(etapa: str, tipo: Optional[str] = None) -> Iterator[None]:
+    """
+    Mide la duración del bloque en el histograma de etapas.
+    Args:
+        etapa (str): Nombre de la etapa (extraccion, llamada_modelo, escribir_excel...).
+        tipo (Optional[str]): Tipo de archivo; por defecto el fijado con `tipo_archivo`.
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        ETAPAS.observar(time.perf_counter() - inicio, etapa=etapa, tipo=tipo or _tipo_actual.get())
+
+
+def registrar_respuesta_ollama(datos: Dict) -> None:
+    """
+    Registra las estadísticas que Ollama devuelve al final de cada generación.
+    Args:
+        datos (Dict): Respuesta (o último fragmento del stream) de /api/generate.
+    """
+    tipo = _tipo_actual.get()
+    if "prompt_eval_count" in datos:
+        OLLAMA_TOKENS_PROMPT.observar(datos["prompt_eval_count"], tipo=tipo)
+        OLLAMA_TOKENS_TOTALES.incrementar(datos["prompt_eval_count"], fase="prompt")
+    if "eval_count" in datos:
+        OLLAMA_TOKENS_GENERADOS.observar(datos["eval_count"], tipo=tipo)
+        OLLAMA_TOKENS_TOTALES.incrementar(datos["eval_count"], fase="generacion")
+    if "prompt_eval_duration" in datos:
+        OLLAMA_DURACION_PROMPT.observar(datos["prompt_eval_duration"] / 1e9, tipo=tipo)
+    if "eval_duration" in datos:
+        OLLAMA_DURACION_GENERACION.observar(datos["eval_duration"] / 1e9, tipo=tipo)
+
+
+def registrar_tokens_texto(original: int, enviado: int) -> None:
+    """
+    Registra los tokens estimados de una entrega antes y después de normalizar su texto.
+    Args:
+        original (int): Tokens del texto extraído.
+        enviado (int): Tokens del texto que se envía al modelo.
+    """
+    tipo = _tipo_actual.get()
+    for etapa, tokens in (("original", original), ("enviado", enviado)):
+        TOKENS_TEXTO.observar(tokens, tipo=tipo, etapa=etapa)
+        TOKENS_TEXTO_TOTALES.incrementar(tokens, etapa=etapa)
+
+
+def en_contexto_actual(funcion):
+    """
+    Envuelve `funcion` para que se ejecute con una copia del contexto actual
+    (tipo de archivo, etc.) al enviarla a un pool de hilos.
+    """
+    contexto = contextvars.copy_context()
+    return lambda *args, **kwargs: contexto.copy().run(funcion, *args, **kwargs)
@@ -0,0 +1,111 @@
+import math
+import re
+from collections import Counter
+from typing import Iterable, List, Tuple
+
+# Los PDF separan sus páginas con "\f" (ver procesar_pdf.SEPARADOR_PAGINAS)
+SEPARADOR_PAGINAS = "\f"
+# Páginas mínimas para buscar encabezados y pies repetidos (con menos no hay repetición fiable)
+MIN_PAGINAS_MARGENES = 3
+# Líneas no vacías del principio y del final de cada página donde se buscan encabezados y pies
+LINEAS_MARGEN = 3
+# Una línea de margen se descarta si se repite, idéntica y en la misma zona, en esta fracción
+# de las páginas y al menos en MIN_PAGINAS_MARGENES de ellas
+FRACCION_REPETIDA = 0.5
+# Valores que pandas u openpyxl escriben en celdas vacías
+MARCADORES_VACIOS = {"", "nan", "none", "null", "nat", "<na>"}
+
+# Solo números de página con su rótulo ("Página 3", "Pág. 3 de 4", "Page 3 of 10"): un número
+# suelto puede ser contenido (una respuesta, un dato de una tabla)
+_NUMERO_PAGINA = re.compile(
+    r"^(?:p[aá]g(?:ina)?\.?|page)\s*\d{1,4}(?:\s*(?:de|of|/)\s*\d{1,4})?$", re.IGNORECASE
+)
+# Palabra cortada con guion al final de la línea y continuada en minúscula en la siguiente
+_GUION_CORTE = re.compile(r"([^\W\d_])-[ \t]*\n\s*([a-záéíóúüñ])")
+_INVISIBLES = re.compile("[\u00ad\u200b\u200c\u200d\ufeff]")
+_ESPACIOS = re.compile(r"[^\S\n]+")
+_LINEAS_VACIAS = re.compile(r"\n{3,}")
+
+
+def es_celda_vacia(valor) -> bool:
+    """Indica si una celda de Excel está vacía o contiene un marcador como "nan" o "None"."""
+    if valor is None:
+        return True
+    if isinstance(valor, float) and math.isnan(valor):
+        return True
+    return str(valor).strip().lower() in MARCADORES_VACIOS
+
+
+def unir_celdas(valores: Iterable) -> str:
+    """
+    Une las celdas de una fila (o de una hoja) en un texto, sin las vacías.
+    Args:
+        valores (Iterable): Valores de las celdas.
+    Returns:
+        str: Celdas no vacías separadas por un espacio.
+    """
+    return " ".join(str(valor).strip() for valor in valores if not es_celda_vacia(valor))
+
+
+def _clave_linea(linea: str) -> str:
+    # Solo se ignoran las diferencias de espacios: "Pregunta 1" y "Pregunta 2" son líneas distintas
+    return " ".join(linea.split())
+
+
+def _margenes(lineas: List[str]) -> List[Tuple[str, int]]:
+    """Zona ("arriba" o "abajo") e índice de las primeras y últimas `LINEAS_MARGEN` líneas no vacías."""
+    no_vacias = [i for i, linea in enumerate(lineas) if linea.strip()]
+    arriba = [("arriba", i) for i in no_vacias[:LINEAS_MARGEN]]
+    return arriba + [("abajo", i) for i in no_vacias[LINEAS_MARGEN:][-LINEAS_MARGEN:]]
+
+
+def _quitar_margenes_repetidos(paginas: List[List[str]]) -> List[List[str]]:
+    """
+    Elimina de los márgenes de cada página los encabezados y pies repetidos idénticos en
+    muchas páginas y las líneas que solo contienen un número de página con su rótulo.
+    """
+    margenes = [_margenes(lineas) for lineas in paginas]
+    apariciones = Counter()
+    for lineas, indices in zip(paginas, margenes):
+        apariciones.update({(zona, _clave_linea(lineas[i])) for zona, i in indices})
+    minimo = max(MIN_PAGINAS_MARGENES, math.ceil(FRACCION_REPETIDA * len(paginas)))
+    repetidas = {clave for clave, veces in apariciones.items() if veces >= minimo}
+
+    limpias = []
+    for lineas, indices in zip(paginas, margenes):
+        descartar = {i for zona, i in indices
+                     if (zona, _clave_linea(lineas[i])) in repetidas or _NUMERO_PAGINA.match(lineas[i].strip())}
+        limpias.append([linea for i, linea in enumerate(lineas) if i not in descartar])
+    return limpias
+
+
+def _limpiar(texto: str) -> str:
+    """Une las palabras cortadas con guion y normaliza los espacios y las líneas vacías."""
+    texto = _GUION_CORTE.sub(r"\1\2", texto)
+    texto = "\n".join(_ESPACIOS.sub(" ", linea).strip() for linea in texto.split("\n"))
+    return _LINEAS_VACIAS.sub("\n\n", texto).strip()
+
+
+def normalizar_texto(texto: str, paginado: bool = False) -> str:
+    """
+    Reduce el texto extraído a lo que el modelo necesita leer: une las palabras cortadas
+    con guion al final de línea y normaliza los espacios y las líneas vacías. En los PDF
+    de `MIN_PAGINAS_MARGENES` páginas o más quita además los encabezados y pies de página
+    repetidos y los números de página rotulados. El texto escrito a mano, las celdas de
+    Excel y los documentos cortos nunca pierden líneas.
+    Args:
+        texto (str): Texto extraído.
+        paginado (bool): El texto viene de un PDF, con las páginas separadas por "\\f".
+    Returns:
+        str: Texto normalizado (con las páginas de un PDF separadas por "\\n\\f", como en
+        `procesar_pdf`, para que el fragmentador siga cortando por página).
+    """
+    texto = _INVISIBLES.sub("", texto.replace("\r\n", "\n").replace("\r", "\n"))
+    if not paginado:
+        return _limpiar(texto)
+    paginas = [pagina.split("\n") for pagina in texto.split(SEPARADOR_PAGINAS)]
+    if len(paginas) >= MIN_PAGINAS_MARGENES:
+        paginas = _quitar_margenes_repetidos(paginas)
+    limpias = (_limpiar("\n".join(lineas)) for lineas in paginas)
+    return ("\n" + SEPARADOR_PAGINAS).join(pagina for pagina in limpias if pagina)
+
@@ -0,0 +1,192 @@
+import contextvars
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Iterator, Optional
+
+from metricas import registro
+
+# Clases de prioridad: un texto o documento suelto va antes que las filas de un Excel o ZIP
+INTERACTIVA = "interactiva"
+LOTE = "lote"
+PRIORIDADES = (INTERACTIVA, LOTE)
+
+# Usuario y prioridad de la evaluación en curso (se copian a los hilos con `en_contexto_actual`)
+_usuario_actual: contextvars.ContextVar = contextvars.ContextVar("usuario", default="anonimo")
+_prioridad_actual: contextvars.ContextVar = contextvars.ContextVar("prioridad", default=LOTE)
+
+ESPERA_MODELO = registro.histograma(
+    "calificador_espera_modelo_segundos", "Tiempo en cola antes de cada llamada al modelo."
+)
+RECHAZOS = registro.contador(
+    "calificador_trabajos_rechazados_total", "Trabajos rechazados con 429 por cola llena."
+)
+
+
+@contextmanager
+def identidad(usuario: str, prioridad: str) -> Iterator[None]:
+    """
+    Fija el usuario y la prioridad de las llamadas al modelo hechas dentro del bloque.
+    Args:
+        usuario (str): Identificador del usuario (IP o cabecera X-Usuario de un proxy de confianza).
+        prioridad (str): INTERACTIVA o LOTE.
+    """
+    marca_usuario = _usuario_actual.set(usuario)
+    marca_prioridad = _prioridad_actual.set(prioridad)
+    try:
+        yield
+    finally:
+        _prioridad_actual.reset(marca_prioridad)
+        _usuario_actual.reset(marca_usuario)
+
+
+class ColaLlena(Exception):
+    def __init__(self, mensaje: str, reintentar_en: int):
+        """
+        El planificador no admite más trabajos por ahora.
+        Args:
+            mensaje (str): Motivo del rechazo.
+            reintentar_en (int): Segundos sugeridos antes de reintentar (cabecera Retry-After).
+        """
+        super().__init__(mensaje)
+        self.reintentar_en = reintentar_en
+
+
+class PlanificadorModelo:
+    def __init__(
+        self,
+        cliente,
+        max_en_vuelo: int = 4,
+        max_trabajos: int = 20,
+        max_trabajos_usuario: int = 3
+    ):
+        """
+        Controla el acceso al modelo delante de `EvaluadorTareas`. Ofrece la misma interfaz
+        que `ClienteOllama` (`generar` y `generar_stream`), pero cada llamada espera turno:
+        como mucho `max_en_vuelo` llamadas a la vez, primero las interactivas y, dentro
+        de cada prioridad, por turnos entre usuarios (un Excel de 500 filas no bloquea
+        al resto). Además limita los trabajos admitidos en total y por usuario.
+        Args:
+            cliente: `ClienteOllama` o `PoolOllama` que hace las llamadas.
+            max_en_vuelo (int): Llamadas simultáneas al modelo (ajustar a OLLAMA_NUM_PARALLEL por servidor).
+            max_trabajos (int): Trabajos admitidos a la vez (en cola o en proceso).
+            max_trabajos_usuario (int): Trabajos admitidos a la vez por usuario.
+        """
+        self.cliente = cliente
+        self.max_en_vuelo = max(1, max_en_vuelo)
+        self.max_trabajos = max_trabajos
+        self.max_trabajos_usuario = max_trabajos_usuario
+        self._condicion = threading.Condition()
+        self._en_vuelo = 0
+        # Por prioridad, los usuarios en espera en orden de turno y sus llamadas en orden de llegada
+        self._colas: Dict[str, "OrderedDict[str, Deque[object]]"] = {p: OrderedDict() for p in PRIORIDADES}
+        self._lock_trabajos = threading.Lock()
+        self._trabajos: Dict[str, int] = {}
+        self._duracion_media = 10.0
+
+    @property
+    def circuito(self):
+        """Interruptor del cliente (compatibilidad con `ClienteOllama.circuito`)."""
+        return self.cliente.circuito
+
+    # =====================================================
+    # ADMISIÓN DE TRABAJOS
+    # =====================================================
+    def admitir(self, usuario: str) -> None:
+        """
+        Reserva un hueco para un trabajo nuevo del usuario.
+        Args:
+            usuario (str): Identificador del usuario.
+        Raises:
+            ColaLlena: Si se alcanzó el límite total o el del usuario.
+        """
+        with self._lock_trabajos:
+            if self._trabajos.get(usuario, 0) >= self.max_trabajos_usuario:
+                motivo = f"Ya hay {self.max_trabajos_usuario} evaluaciones suyas en curso."
+            elif sum(self._trabajos.values()) >= self.max_trabajos:
+                motivo = "El servidor está atendiendo demasiadas evaluaciones."
+            else:
+                self._trabajos[usuario] = self._trabajos.get(usuario, 0) + 1
+                return
+            # Se sugiere reintentar cuando, en promedio, debería terminar un trabajo
+            reintentar_en = max(1, math.ceil(self._duracion_media))
+        RECHAZOS.incrementar()
+        raise ColaLlena(motivo, reintentar_en)
+
+    def liberar(self, usuario: str, duracion: Optional[float] = None) -> None:
+        """
+        Libera el hueco de un trabajo admitido con `admitir`.
+        Args:
+            usuario (str): Identificador del usuario.
+            duracion (Optional[float]): Segundos que tardó el trabajo (para estimar Retry-After).
+        """
+        with self._lock_trabajos:
+            restantes = self._trabajos.get(usuario, 0) - 1
+            if restantes > 0:
+                self._trabajos[usuario] = restantes
+            else:
+                self._trabajos.pop(usuario, None)
+            if duracion is not None:
+                self._duracion_media = 0.8 * self._duracion_media + 0.2 * duracion
+
+    # =====================================================
+    # TURNOS DE LLAMADA AL MODELO
+    # =====================================================
+    def _siguiente(self) -> Optional[object]:
+        """Ticket al que le toca: el primero del primer usuario de la prioridad más alta con espera."""
+        for prioridad in PRIORIDADES:
+            for tickets in self._colas[prioridad].values():
+                return tickets[0]
+        return None
+
+    @contextmanager
+    def turno(self) -> Iterator[None]:
+        """Espera a que la llamada actual pueda enviarse al modelo y ocupa un hueco mientras dura."""
+        usuario, prioridad = _usuario_actual.get(), _prioridad_actual.get()
+        ticket = object()
+        inicio = time.perf_counter()
+        with self._condicion:
+            cola = self._colas[prioridad]
+            cola.setdefault(usuario, deque()).append(ticket)
+            while self._en_vuelo >= self.max_en_vuelo or self._siguiente() is not ticket:
+                self._condicion.wait()
+            # El usuario atendido pasa al final del turno de su prioridad
+            tickets = cola.pop(usuario)
+            tickets.popleft()
+            if tickets:
+                cola[usuario] = tickets
+            self._en_vuelo += 1
+            # Si quedan huecos libres, el siguiente ticket puede pasar ya
+            self._condicion.notify_all()
+        ESPERA_MODELO.observar(time.perf_counter() - inicio, prioridad=prioridad)
+        try:
+            yield
+        finally:
+            with self._condicion:
+                self._en_vuelo -= 1
+                self._condicion.notify_all()
+
+    def generar(self, payload: Dict) -> Dict:
+        """Igual que `ClienteOllama.generar`, cuando le toca el turno."""
+        with self.turno():
+            return self.cliente.generar(payload)
+
+    def generar_stream(self, payload: Dict, al_recibir: Optional[Callable[[str], None]] = None) -> Dict:
+        """Igual que `ClienteOllama.generar_stream`, cuando le toca el turno."""
+        with self.turno():
+            return self.cliente.generar_stream(payload, al_recibir)
+
+    def estado(self) -> Dict:
+        """
+        Devuelve la ocupación del planificador.
+        Returns:
+            Dict: Llamadas en vuelo, llamadas en espera por prioridad y trabajos admitidos.
+        """
+        with self._condicion:
+            espera = {p: sum(len(t) for t in self._colas[p].values()) for p in PRIORIDADES}
+            en_vuelo = self._en_vuelo
+        with self._lock_trabajos:
+            trabajos = sum(self._trabajos.values())
+        return {"en_vuelo": en_vuelo, "en_espera": espera, "trabajos": trabajos}
@@ -0,0 +1,197 @@
+import threading
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+from cliente_ollama import CircuitoAbiertoError, ClienteOllama, ErrorModelo
+
+
+# =====================================================
+# BACKEND
+# =====================================================
+class Backend:
+    def __init__(self, url_api: str, cliente: ClienteOllama, max_concurrencia: Optional[int] = None):
+        """
+        Un servidor de Ollama del pool con su contador de peticiones en vuelo.
+        Args:
+            url_api (str): URL del endpoint /api/generate.
+            cliente (ClienteOllama): Cliente con sus propias conexiones e interruptor de circuito.
+            max_concurrencia (Optional[int]): Peticiones simultáneas máximas (None = sin límite).
+        """
+        self.url_api = url_api
+        self.cliente = cliente
+        self.max_concurrencia = max_concurrencia
+        self.en_vuelo = 0
+        self.atendidas = 0
+        self.sano = True
+
+    @property
+    def url_salud(self) -> str:
+        """URL de /api/tags del mismo servidor, usada para comprobar que responde."""
+        base = self.url_api.split("/api/", 1)[0]
+        return base.rstrip("/") + "/api/tags"
+
+    def disponible(self) -> bool:
+        return (self.sano and self.cliente.circuito.estado != "abierto"
+                and (self.max_concurrencia is None or self.en_vuelo < self.max_concurrencia))
+
+
+# =====================================================
+# POOL DE SERVIDORES
+# =====================================================
+class PoolOllama:
+    def __init__(
+        self,
+        urls: List[str],
+        max_concurrencia_por_backend: Optional[int] = None,
+        intervalo_salud: float = 10.0,
+        timeout_salud: float = 2.0,
+        **opciones_cliente
+    ):
+        """
+        Reparte las peticiones entre varios servidores de Ollama eligiendo el que tiene
+        menos peticiones en vuelo. Un hilo comprueba periódicamente la salud de cada
+        servidor: los que no responden dejan de recibir peticiones nuevas (las que ya
+        tienen terminan) hasta que vuelven a responder. Ofrece la misma interfaz que
+        `ClienteOllama` (`generar` y `generar_stream`).
+        Args:
+            urls (List[str]): URLs del endpoint /api/generate de cada servidor.
+            max_concurrencia_por_backend (Optional[int]): Peticiones simultáneas máximas por
+                servidor; si todos están llenos se espera a que alguno se libere.
+            intervalo_salud (float): Segundos entre comprobaciones de salud (0 para desactivarlas).
+            timeout_salud (float): Segundos máximos de cada comprobación.
+            **opciones_cliente: Parámetros de `ClienteOllama` para cada servidor.
+        """
+        if not urls:
+            raise ValueError("El pool necesita al menos un servidor.")
+        self.backends = [
+            Backend(url, ClienteOllama(url, **opciones_cliente), max_concurrencia_por_backend) for url in urls
+        ]
+        self.url_api = urls[0]
+        self.intervalo_salud = intervalo_salud
+        self.timeout_salud = timeout_salud
+        self._condicion = threading.Condition()
+        self._detenido = threading.Event()
+        self._hilo_salud: Optional[threading.Thread] = None
+        if intervalo_salud > 0:
+            self._hilo_salud = threading.Thread(target=self._bucle_salud, name="salud-ollama", daemon=True)
+            self._hilo_salud.start()
+
+    @property
+    def circuito(self):
+        """Interruptor del primer servidor sano (compatibilidad con `ClienteOllama.circuito`)."""
+        for backend in self.backends:
+            if backend.sano:
+                return backend.cliente.circuito
+        return self.backends[0].cliente.circuito
+
+    # =====================================================
+    # SELECCIÓN DE SERVIDOR
+    # =====================================================
+    def _elegir(self, excluidos: List[Backend]) -> Backend:
+        """
+        Reserva el servidor disponible con menos peticiones en vuelo (a igualdad,
+        el que menos ha atendido). Si todos están en su límite de concurrencia, espera.
+        Raises:
+            CircuitoAbiertoError: Si no queda ningún servidor sano.
+        """
+        with self._condicion:
+            while True:
+                candidatos = [b for b in self.backends if b not in excluidos and b.sano
+                              and b.cliente.circuito.estado != "abierto"]
+                if not candidatos:
+                    raise CircuitoAbiertoError("Ningún servidor del modelo está disponible.")
+                libres = [b for b in candidatos if b.disponible()]
+                if libres:
+                    backend = min(libres, key=lambda b: (b.en_vuelo, b.atendidas))
+                    backend.en_vuelo += 1
+                    backend.atendidas += 1
+                    return backend
+                self._condicion.wait(timeout=1.0)
+
+    def _liberar(self, backend: Backend) -> None:
+        with self._condicion:
+            backend.en_vuelo -= 1
+            self._condicion.notify()
+
+    def _despachar(self, llamada: Callable[[ClienteOllama], Dict]) -> Dict:
+        """
+        Ejecuta la llamada en el servidor elegido. Si ese servidor falla (tras sus propios
+        reintentos) se marca como no sano y se intenta con el siguiente.
+        """
+        excluidos: List[Backend] = []
+        ultimo_error: Optional[ErrorModelo] = None
+        while len(excluidos) < len(self.backends):
+            try:
+                backend = self._elegir(excluidos)
+            except CircuitoAbiertoError:
+                if ultimo_error is not None:
+                    raise ultimo_error
+                raise
+            try:
+                return llamada(backend.cliente)
+            except ErrorModelo as e:
+                ultimo_error = e
+                excluidos.append(backend)
+                if isinstance(e.__cause__, (requests.HTTPError, ValueError)):
+                    # Petición inválida: otro servidor respondería lo mismo
+                    raise
+                if self._hilo_salud is not None:
+                    # Caído o saturado: se drena hasta que la comprobación de salud lo recupere
+                    self._marcar(backend, False)
+            finally:
+                self._liberar(backend)
+        raise ultimo_error
+
+    def generar(self, payload: Dict) -> Dict:
+        """Igual que `ClienteOllama.generar`, en el servidor con menos carga."""
+        return self._despachar(lambda cliente: cliente.generar(payload))
+
+    def generar_stream(self, payload: Dict, al_recibir: Optional[Callable[[str], None]] = None) -> Dict:
+        """Igual que `ClienteOllama.generar_stream`, en el servidor con menos carga."""
+        return self._despachar(lambda cliente: cliente.generar_stream(payload, al_recibir))
+
+    # =====================================================
+    # COMPROBACIONES DE SALUD
+    # =====================================================
+    def _marcar(self, backend: Backend, sano: bool) -> None:
+        with self._condicion:
+            if backend.sano != sano:
+                print(f"Servidor del modelo {'recuperado' if sano else 'drenado'}: {backend.url_api}")
+            backend.sano = sano
+            self._condicion.notify_all()
+
+    def verificar_salud(self) -> None:
+        """Consulta /api/tags en cada servidor y marca cuáles pueden recibir peticiones."""
+        for backend in self.backends:
+            try:
+                respuesta = backend.cliente.sesion.get(backend.url_salud, timeout=self.timeout_salud)
+                sano = respuesta.status_code < 500
+            except requests.RequestException:
+                sano = False
+            self._marcar(backend, sano)
+
+    def _bucle_salud(self) -> None:
+        while not self._detenido.wait(self.intervalo_salud):
+            self.verificar_salud()
+
+    def estado(self) -> List[Dict]:
+        """
+        Devuelve el estado de cada servidor.
+        Returns:
+            List[Dict]: URL, si está sano, estado del circuito, peticiones en vuelo y atendidas.
+        """
+        with self._condicion:
+            return [{
+                "url": b.url_api,
+                "sano": b.sano,
+                "circuito": b.cliente.circuito.estado,
+                "en_vuelo": b.en_vuelo,
+                "atendidas": b.atendidas
+            } for b in self.backends]
+
+    def cerrar(self) -> None:
+        """Detiene las comprobaciones de salud y cierra las conexiones de todos los servidores."""
+        self._detenido.set()
+        for backend in self.backends:
+            backend.cliente.cerrar()
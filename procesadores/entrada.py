@@ -0,0 +1,46 @@
+import io
+import os
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, Union
+
+# Un archivo a procesar puede llegar como ruta, como bytes o como objeto tipo archivo
+Entrada = Union[str, os.PathLike, bytes, bytearray, BinaryIO]
+
+
+@contextmanager
+def abrir_entrada(origen: Entrada) -> Iterator[BinaryIO]:
+    """
+    Abre la entrada como un flujo binario posicionado al inicio.
+    Las rutas se abren y cierran aquí; los objetos tipo archivo los cierra quien los creó.
+
+    Args:
+        origen (Entrada): Ruta, bytes u objeto tipo archivo.
+
+    Yields:
+        BinaryIO: Flujo binario listo para leer.
+    """
+    if isinstance(origen, (str, os.PathLike)):
+        with open(origen, "rb") as archivo:
+            yield archivo
+    elif isinstance(origen, (bytes, bytearray)):
+        yield io.BytesIO(origen)
+    else:
+        origen.seek(0)
+        yield origen
+
+
+def leer_bytes(origen: Entrada) -> bytes:
+    """
+    Devuelve el contenido completo de la entrada.
+
+    Args:
+        origen (Entrada): Ruta, bytes u objeto tipo archivo.
+
+    Returns:
+        bytes: Contenido del archivo.
+    """
+    if isinstance(origen, (bytes, bytearray)):
+        return bytes(origen)
+    with abrir_entrada(origen) as flujo:
+        return flujo.read()
+
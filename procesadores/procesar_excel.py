@@ -1,89 +1,372 @@
 # procesar_excel.py
 import pandas as pd
 import os
+import csv
 import time
-from typing import Tuple, Dict, List
-from evaluador import EvaluadorTareas
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Tuple, Dict, List, Optional
+from openpyxl import Workbook, load_workbook
+from almacen_resultados import AlmacenResultados
+from evaluador import EvaluadorTareas, Rubrica, crear_rubrica
+from fragmentador import estimar_tokens
+from normalizador import unir_celdas
+from similitud import IndiceSimilitud
+from metricas import DUPLICADOS, en_contexto_actual, medir_etapa
+from procesadores.entrada import Entrada, abrir_entrada
 
-def extraer_texto_excel(ruta_archivo: str) -> str:
+def extraer_texto_excel(ruta_archivo: Entrada) -> str:
     """
     Extrae TODO el texto de un archivo Excel, concatenando todas las celdas.
 
     Args:
-        ruta_archivo (str): Ruta del archivo Excel.
+        ruta_archivo (Entrada): Ruta, bytes u objeto tipo archivo del Excel.
 
     Returns:
         str: Texto concatenado de todas las celdas.
     """
     try:
-        df = pd.read_excel(ruta_archivo)
-        texto_completo = " ".join(df.fillna("").astype(str).values.flatten())
+        with abrir_entrada(ruta_archivo) as archivo:
+            df = pd.read_excel(archivo)
+        # Sin las celdas vacías ni los "nan" de pandas, que solo ocupan tokens en el prompt
+        texto_completo = unir_celdas(df.values.flatten())
         return texto_completo
     except Exception as e:
         print(f"Error al leer el archivo Excel: {e}")
         return ""
 
+def _fila_resultado(texto_tarea: str, resultado: Dict) -> Dict:
+    """
+    Convierte el resultado de una evaluación en una fila del Excel de resultados.
+
+    Args:
+        texto_tarea (str): Texto de la fila.
+        resultado (Dict): Resultado devuelto por el evaluador.
+
+    Returns:
+        Dict: Fila de resultados (con la columna "Error" si la evaluación falló).
+    """
+    fila = {"Tarea": texto_tarea[:50] + "..." if len(texto_tarea) > 50 else texto_tarea}  # Mostrar solo un fragmento
+    if "tokens_texto" in resultado:
+        # No son columnas del Excel: quedan en el almacén de resultados
+        fila["Tokens originales"] = resultado["tokens_texto"]["original"]
+        fila["Tokens enviados"] = resultado["tokens_texto"]["enviado"]
+    try:
+        if "error" in resultado:
+            raise ValueError(resultado["error"])
+        fila.update({
+            "Calificación Final": resultado["Calificación Final"],
+            **{f"{criterio['nombre']} (Puntaje)": criterio["puntaje"] for criterio in resultado["criterios"]},
+            **{f"{criterio['nombre']} (Justificación)": criterio["justificacion"] for criterio in resultado["criterios"]}
+        })
+    except Exception as e:
+        print(f"Error al evaluar la fila: {e}")
+        fila.update({"Calificación Final": None, "Error": str(e)})
+    return fila
+
+def _evaluar_filas(textos: List[str], evaluador: EvaluadorTareas, rubrica: Rubrica) -> List[Dict]:
+    """
+    Evalúa una fila, o un lote de filas cortas en un solo prompt.
+    Un fallo en una fila no afecta a las demás.
+
+    Args:
+        textos (List[str]): Textos de las filas.
+        evaluador (EvaluadorTareas): Instancia del evaluador.
+        rubrica (Rubrica): Rúbrica a aplicar.
+
+    Returns:
+        List[Dict]: Filas de resultados en el mismo orden.
+    """
+    try:
+        if len(textos) == 1:
+            resultados = [evaluador.evaluar_texto(textos[0], rubrica)]
+        else:
+            resultados = evaluador.evaluar_lote(textos, rubrica)
+    except Exception as e:
+        resultados = [{"error": str(e)}] * len(textos)
+    return [_fila_resultado(texto, resultado) for texto, resultado in zip(textos, resultados)]
+
+def agrupar_filas(textos: Iterable[str], presupuesto_tokens: Optional[int], max_filas: int) -> Iterator[List[str]]:
+    """
+    Agrupa filas cortas consecutivas en lotes que caben en el presupuesto de tokens.
+    Las filas que ocupan más de la mitad del presupuesto se evalúan solas.
+
+    Args:
+        textos (Iterable[str]): Textos de las filas.
+        presupuesto_tokens (Optional[int]): Tokens máximos por lote; None o 0 desactiva los lotes.
+        max_filas (int): Filas máximas por lote.
+
+    Yields:
+        List[str]: Lote de filas (una sola fila si no se agrupa).
+    """
+    lote: List[str] = []
+    tokens_lote = 0
+    for texto in textos:
+        tokens = estimar_tokens(texto)
+        if not presupuesto_tokens or max_filas <= 1 or tokens > presupuesto_tokens // 2:
+            if lote:
+                yield lote
+                lote, tokens_lote = [], 0
+            yield [texto]
+            continue
+        if lote and (tokens_lote + tokens > presupuesto_tokens or len(lote) >= max_filas):
+            yield lote
+            lote, tokens_lote = [], 0
+        lote.append(texto)
+        tokens_lote += tokens
+    if lote:
+        yield lote
+
+def iterar_filas_excel(ruta_archivo: Entrada) -> Iterator[str]:
+    """
+    Lee la primera hoja del Excel en modo solo lectura y devuelve cada fila como texto,
+    sin cargar el libro completo en memoria. Se omite la fila de encabezados y las filas vacías.
+
+    Args:
+        ruta_archivo (Entrada): Ruta, bytes u objeto tipo archivo del Excel.
+
+    Yields:
+        str: Texto de la fila (celdas no vacías separadas por espacios).
+    """
+    with abrir_entrada(ruta_archivo) as archivo:
+        libro = load_workbook(archivo, read_only=True, data_only=True)
+        try:
+            hoja = libro.worksheets[0]
+            for valores in hoja.iter_rows(min_row=2, values_only=True):
+                texto = unir_celdas(valores)
+                if texto:
+                    yield texto
+        finally:
+            libro.close()
+
+def contar_filas_excel(ruta_archivo: Entrada) -> int:
+    """
+    Devuelve el número aproximado de filas de datos según las dimensiones de la hoja.
+
+    Args:
+        ruta_archivo (Entrada): Ruta, bytes u objeto tipo archivo del Excel.
+
+    Returns:
+        int: Filas de datos (sin encabezado); 0 si la hoja no declara sus dimensiones.
+    """
+    with abrir_entrada(ruta_archivo) as archivo:
+        libro = load_workbook(archivo, read_only=True)
+        try:
+            return max(0, (libro.worksheets[0].max_row or 1) - 1)
+        finally:
+            libro.close()
+
+class EscritorResultados:
+    def __init__(self, ruta_resultado: str, columnas: List[str]):
+        """
+        Escribe los resultados fila a fila. El Excel se genera en modo write-only
+        (memoria constante) y, mientras tanto, cada fila se agrega y se vuelca a un
+        CSV parcial, de modo que si el proceso se interrumpe los resultados ya
+        obtenidos no se pierden.
+
+        Args:
+            ruta_resultado (str): Ruta del Excel de resultados.
+            columnas (List[str]): Encabezados de las columnas.
+        """
+        self.ruta_resultado = ruta_resultado
+        self.ruta_parcial = ruta_resultado + ".parcial.csv"
+        self.columnas = columnas
+        self.filas = 0
+
+        self._libro = Workbook(write_only=True)
+        self._hoja = self._libro.create_sheet()
+        self._hoja.append(columnas)
+
+        self._archivo_parcial = open(self.ruta_parcial, "w", newline="", encoding="utf-8")
+        self._csv = csv.writer(self._archivo_parcial)
+        self._csv.writerow(columnas)
+        self._archivo_parcial.flush()
+
+    def escribir(self, fila: Dict) -> None:
+        """
+        Agrega una fila de resultados.
+
+        Args:
+            fila (Dict): Valores indexados por nombre de columna.
+        """
+        valores = [fila.get(columna) for columna in self.columnas]
+        self._hoja.append(valores)
+        self._csv.writerow(["" if valor is None else valor for valor in valores])
+        self._archivo_parcial.flush()
+        self.filas += 1
+
+    def cerrar(self) -> None:
+        """Guarda el Excel final y elimina el CSV parcial."""
+        self._archivo_parcial.close()
+        self._libro.save(self.ruta_resultado)
+        os.remove(self.ruta_parcial)
+
+    def abortar(self) -> None:
+        """Cierra el CSV parcial conservándolo con las filas ya evaluadas."""
+        self._archivo_parcial.close()
+
 def procesar_excel(
-    ruta_archivo: str,
+    ruta_archivo: Entrada,
     criterios_dict: Dict[str, float],
     evaluador: EvaluadorTareas,
-    carpeta_resultados: str
+    carpeta_resultados: str,
+    max_concurrencia: int = 1,
+    progreso: Optional[Callable[[int, int, float], None]] = None,
+    devolver_resultados: bool = True,
+    vista_previa: int = 0,
+    presupuesto_lote_tokens: Optional[int] = None,
+    max_filas_lote: int = 8,
+    indice_similitud: Optional[IndiceSimilitud] = None,
+    origen: str = "",
+    almacen: Optional[AlmacenResultados] = None,
+    trabajo_id: Optional[str] = None
 ) -> Tuple[pd.DataFrame, str]:
     """
-    Procesa un archivo Excel, extrae TODO el texto y lo evalúa como una sola tarea.
-    Si el Excel tiene múltiples filas, cada fila se evalúa como una tarea independiente.
+    Procesa un archivo Excel en streaming: cada fila se evalúa como una tarea
+    independiente y se escribe en el archivo de resultados en cuanto termina,
+    conservando el orden original de las filas.
 
     Args:
-        ruta_archivo (str): Ruta del archivo Excel.
+        ruta_archivo (Entrada): Ruta, bytes u objeto tipo archivo del Excel.
         criterios_dict (Dict[str, float]): Criterios de evaluación.
         evaluador (EvaluadorTareas): Instancia del evaluador.
         carpeta_resultados (str): Carpeta para guardar el Excel de resultados.
+        max_concurrencia (int): Número máximo de filas evaluadas en paralelo por el modelo.
+        progreso (Optional[Callable[[int, int, float], None]]): Se llama al terminar cada fila
+            con (filas hechas, total de filas, segundos que tardó la fila).
+        devolver_resultados (bool): Si es False no se acumulan las filas en memoria y se
+            devuelve un DataFrame vacío (los errores se reconocen por el nombre "error_...").
+        vista_previa (int): Con `devolver_resultados` en False, primeras filas que se devuelven
+            igualmente para mostrarlas (el resto solo queda en el archivo o el almacén).
+        presupuesto_lote_tokens (Optional[int]): Si se indica, las filas cortas consecutivas se
+            evalúan juntas en un solo prompt de hasta estos tokens.
+        max_filas_lote (int): Filas máximas por prompt en el modo por lotes.
+        indice_similitud (Optional[IndiceSimilitud]): Si se indica, antes de evaluar se buscan
+            duplicados entre las filas y con entregas anteriores: las filas idénticas a una
+            anterior reutilizan su calificación sin llamar al modelo y las muy parecidas se
+            marcan en la columna "Revisión de plagio".
+        origen (str): Nombre del archivo, para identificar sus filas en el índice de similitud.
+        almacen (Optional[AlmacenResultados]): Si se indica, las filas se guardan en el almacén
+            de resultados en lugar de generar un Excel (se exporta al descargarlo).
+        trabajo_id (Optional[str]): Identificador del trabajo en el almacén (por defecto, uno nuevo).
 
     Returns:
-        Tuple[pd.DataFrame, str]: DataFrame con resultados y nombre del archivo generado.
+        Tuple[pd.DataFrame, str]: DataFrame con resultados y nombre del archivo generado
+        (o el identificador del trabajo si se usa el almacén).
     """
+    escritor = None
     try:
-        # Leer el archivo Excel
-        df = pd.read_excel(ruta_archivo)
+        # La rúbrica se pasa en cada llamada: el evaluador puede compartirse entre hilos
+        rubrica = crear_rubrica(criterios_dict)
 
-        # Si el Excel está vacío
-        if df.empty:
-            raise ValueError("El archivo Excel está vacío.")
-
-        # Actualizar la rúbrica del evaluador
-        evaluador.actualizar_rubrica(criterios_dict)
+        columnas = (["Tarea", "Calificación Final"]
+                    + [f"{nombre} (Puntaje)" for nombre in criterios_dict]
+                    + [f"{nombre} (Justificación)" for nombre in criterios_dict]
+                    + ["Error"]
+                    + (["Revisión de plagio"] if indice_similitud is not None else []))
+        if almacen is not None:
+            nombre_archivo = trabajo_id or uuid.uuid4().hex
+            escritor = almacen.escritor(nombre_archivo, criterios_dict, "xlsx", origen)
+        else:
+            # Nombre único: dos evaluaciones en el mismo segundo no se sobrescriben
+            nombre_archivo = f"rubrica_excel_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.xlsx"
+            escritor = EscritorResultados(os.path.join(carpeta_resultados, nombre_archivo), columnas)
 
-        # Lista para almacenar los resultados
+        analisis: Optional[List[Dict]] = None
+        if indice_similitud is None:
+            total = contar_filas_excel(ruta_archivo)
+            filas_a_evaluar: Iterable[str] = iterar_filas_excel(ruta_archivo)
+        else:
+            # El índice necesita todas las filas antes de evaluar: solo se envían
+            # al modelo las que no repiten el texto de una fila anterior
+            with medir_etapa("indice_similitud", "xlsx"):
+                textos = list(iterar_filas_excel(ruta_archivo))
+                analisis = indice_similitud.analizar(textos, origen, nombre_archivo)
+                indice_similitud.guardar()
+            total = len(textos)
+            filas_a_evaluar = (texto for texto, a in zip(textos, analisis) if a["duplicado_de"] is None)
+            originales_necesarias = {a["duplicado_de"] for a in analisis if a["duplicado_de"] is not None}
+            originales: Dict[int, Dict] = {}
+            siguiente = 0
+        hechos = 0
+        lock_progreso = threading.Lock()
         resultados = []
 
-        # Evaluar CADA FILA como una tarea independiente
-        for _, fila in df.iterrows():
-            # Convertir toda la fila a texto
-            texto_tarea = " ".join(fila.fillna("").astype(str).values)
+        def evaluar(textos: List[str]) -> List[Dict]:
+            nonlocal hechos
+            inicio = time.perf_counter()
+            filas = _evaluar_filas(textos, evaluador, rubrica)
+            if progreso is not None:
+                latencia = (time.perf_counter() - inicio) / len(textos)
+                with lock_progreso:
+                    for _ in textos:
+                        hechos += 1
+                        progreso(hechos, max(total, hechos), latencia)
+            return filas
 
-            # Evaluar el texto
-            resultado = evaluador.evaluar_texto(texto_tarea)
+        def escribir(fila: Dict) -> None:
+            with medir_etapa("escribir_excel", "xlsx"):
+                escritor.escribir(fila)
+            if devolver_resultados or len(resultados) < vista_previa:
+                resultados.append(fila)
 
-            # Agregar los resultados
-            resultados.append({
-                "Tarea": texto_tarea[:50] + "..." if len(texto_tarea) > 50 else texto_tarea,  # Mostrar solo un fragmento
-                "Calificación Final": resultado["Calificación Final"],
-                **{f"{criterio['nombre']} (Puntaje)": criterio["puntaje"] for criterio in resultado["criterios"]},
-                **{f"{criterio['nombre']} (Justificación)": criterio["justificacion"] for criterio in resultado["criterios"]}
-            })
+        def escribir_duplicados() -> None:
+            # Filas idénticas a una anterior (ya escrita): se copia su calificación
+            nonlocal siguiente, hechos
+            while siguiente < total and analisis[siguiente]["duplicado_de"] is not None:
+                original = analisis[siguiente]["duplicado_de"]
+                DUPLICADOS.incrementar(tipo="exacto")
+                escribir({**originales[original], "Revisión de plagio": f"Duplicado exacto de la fila {original + 1}"})
+                siguiente += 1
+                if progreso is not None:
+                    with lock_progreso:
+                        hechos += 1
+                        progreso(hechos, max(total, hechos), 0.0)
 
-        # Crear DataFrame con los resultados
-        df_resultados = pd.DataFrame(resultados)
+        def guardar(filas: List[Dict]) -> None:
+            nonlocal siguiente
+            for fila in filas:
+                if analisis is None:
+                    escribir(fila)
+                    continue
+                escribir_duplicados()
+                a = analisis[siguiente]
+                if a["similar_a"] is not None:
+                    DUPLICADOS.incrementar(tipo="exacto" if a["similitud"] >= 1 else "similar")
+                    fila["Revisión de plagio"] = (f"Idéntica a {a['similar_a']}" if a["similitud"] >= 1
+                                                  else f"Similar a {a['similar_a']} ({a['similitud']:.0%})")
+                if siguiente in originales_necesarias:
+                    originales[siguiente] = fila
+                escribir(fila)
+                siguiente += 1
 
-        # Generar nombre del archivo de resultados
-        nombre_archivo = f"rubrica_excel_{int(time.time())}.xlsx"
-        ruta_resultado = os.path.join(carpeta_resultados, nombre_archivo)
+        # Ventana acotada de filas en vuelo: se leen a medida que se liberan
+        # huecos y se escriben en orden en cuanto termina la más antigua
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrencia)) as ejecutor:
+            pendientes = deque()
+            lotes = agrupar_filas(filas_a_evaluar, presupuesto_lote_tokens, max_filas_lote)
+            for lote in lotes:
+                pendientes.append(ejecutor.submit(en_contexto_actual(evaluar), lote))
+                if len(pendientes) >= 2 * max(1, max_concurrencia):
+                    guardar(pendientes.popleft().result())
+            while pendientes:
+                guardar(pendientes.popleft().result())
+        if analisis is not None:
+            escribir_duplicados()
+
+        # Si el Excel está vacío
+        if escritor.filas == 0:
+            raise ValueError("El archivo Excel está vacío.")
 
-        # Guardar resultados en Excel
-        df_resultados.to_excel(ruta_resultado, index=False)
+        with medir_etapa("escribir_excel", "xlsx"):
+            escritor.cerrar()
 
-        return df_resultados, nombre_archivo
+        return pd.DataFrame(resultados), nombre_archivo
 
     except Exception as e:
         print(f"Error al procesar el archivo Excel: {e}")
+        if escritor is not None:
+            escritor.abortar()
         return pd.DataFrame(), f"error_{int(time.time())}.txt"
@@ -1,36 +1,70 @@
+import io
+import os
 import PyPDF2
-from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+from cache_extraccion import extraer_con_cache
+from metricas import medir_etapa
+from procesadores.entrada import Entrada, leer_bytes
+
+# A partir de cuántas páginas se reparte la extracción entre varios procesos
+PAGINAS_PARALELO = 40
+# Separador entre páginas (el fragmentador corta preferentemente en "\f")
+SEPARADOR_PAGINAS = "\n\f"
+
+
+def _extraer_paginas(contenido: bytes, inicio: int, fin: int) -> List[str]:
+    """Extrae el texto de las páginas [inicio, fin) en un proceso aparte (las páginas vacías devuelven "")."""
+    lector = PyPDF2.PdfReader(io.BytesIO(contenido))
+    return [lector.pages[i].extract_text() or "" for i in range(inicio, fin)]
+
+
+def _extraer_pdf(contenido: bytes, paralelo: bool = True) -> str:
+    lector = PyPDF2.PdfReader(io.BytesIO(contenido))
+    total = len(lector.pages)
+    procesos = min(os.cpu_count() or 1, total // (PAGINAS_PARALELO // 2) or 1)
+    if not paralelo or total < PAGINAS_PARALELO or procesos < 2:
+        paginas = [pagina.extract_text() or "" for pagina in lector.pages]
+    else:
+        # Rangos contiguos de páginas, uno por proceso; el orden se conserva con map
+        paso = -(-total // procesos)
+        rangos = [(i, min(i + paso, total)) for i in range(0, total, paso)]
+        with ProcessPoolExecutor(max_workers=len(rangos)) as ejecutor:
+            bloques = ejecutor.map(_extraer_paginas, [contenido] * len(rangos), *zip(*rangos))
+            paginas = [pagina for bloque in bloques for pagina in bloque]
+    # Unión en tiempo lineal en lugar de concatenar página a página
+    return SEPARADOR_PAGINAS.join(paginas).strip()
 
 
 #1. Primero extraemos el texto del PDF.
-def extraer_texto_pdf(ruta_archivo: str) -> Optional[str]:
+def extraer_texto_pdf(ruta_archivo: Entrada, paralelo: bool = True) -> Optional[str]:
     """
-    Extrae el texto de un archivo PDF.
+    Extrae el texto de un archivo PDF. Los PDF largos se reparten por páginas entre
+    varios procesos y el texto se guarda en la caché de extracción por hash del contenido.
 
     Args:
-        ruta_archivo (str): Ruta del archivo PDF.
+        ruta_archivo (Entrada): Ruta, bytes u objeto tipo archivo del PDF.
+        paralelo (bool): Permitir la extracción en varios procesos (False si ya se
+            ejecuta dentro de un pool de procesos).
 
     Returns:
         Optional[str]: Texto extraído del PDF o None si hay un error.
     """
     try:
-        texto = ""
-        with open(ruta_archivo, "rb") as archivo:
-            lector = PyPDF2.PdfReader(archivo)
-            for pagina in lector.pages:
-                texto += pagina.extract_text() + "\n"  # Añadir salto de línea entre páginas
-        return texto.strip()  # Eliminar espacios en blanco al inicio y final
+        with medir_etapa("extraccion", "pdf"):
+            contenido = leer_bytes(ruta_archivo)
+            return extraer_con_cache(contenido, "pdf", lambda datos: _extraer_pdf(datos, paralelo))
     except Exception as e:
         print(f"Error al extraer texto del PDF: {e}")
         return None
 
 #2. Luego procesamos el PDF usando la función anterior, ya con el texto extraído.
-def procesar_pdf(ruta_archivo: str) -> str:
+def procesar_pdf(ruta_archivo: Entrada) -> str:
     """
     Procesa un archivo PDF y devuelve el texto extraído.
 
     Args:
-        ruta_archivo (str): Ruta del archivo PDF.
+        ruta_archivo (Entrada): Ruta, bytes u objeto tipo archivo del PDF.
 
     Returns:
         str: Texto extraído del PDF.
@@ -1,30 +1,37 @@
+import io
 from docx import Document
 from typing import Optional
+from cache_extraccion import extraer_con_cache
+from metricas import medir_etapa
+from procesadores.entrada import Entrada, leer_bytes
 
-def extraer_texto_word(ruta_archivo: str) -> Optional[str]:
+def _extraer_word(contenido: bytes) -> str:
+    doc = Document(io.BytesIO(contenido))
+    return "\n".join([parrafo.text for parrafo in doc.paragraphs]).strip()
+
+def extraer_texto_word(ruta_archivo: Entrada) -> Optional[str]:
     """
-    Extrae el texto de un archivo Word (.docx).
+    Extrae el texto de un archivo Word (.docx), usando la caché de extracción por hash del contenido.
 
     Args:
-        ruta_archivo (str): Ruta del archivo Word.
+        ruta_archivo (Entrada): Ruta, bytes u objeto tipo archivo del Word.
 
     Returns:
         Optional[str]: Texto extraído del archivo Word o None si hay un error.
     """
     try:
-        doc = Document(ruta_archivo)
-        texto = "\n".join([parrafo.text for parrafo in doc.paragraphs])
-        return texto.strip()  # Eliminar espacios en blanco al inicio y final
+        with medir_etapa("extraccion", "docx"):
+            return extraer_con_cache(leer_bytes(ruta_archivo), "docx", _extraer_word)
     except Exception as e:
         print(f"Error al extraer texto del archivo Word: {e}")
         return None
 
-def procesar_word(ruta_archivo: str) -> str:
+def procesar_word(ruta_archivo: Entrada) -> str:
     """
     Procesa un archivo Word y devuelve el texto extraído.
 
     Args:
-        ruta_archivo (str): Ruta del archivo Word.
+        ruta_archivo (Entrada): Ruta, bytes u objeto tipo archivo del Word.
 
     Returns:
         str: Texto extraído del archivo Word.
@@ -0,0 +1,249 @@
+# procesar_zip.py
+import pandas as pd
+import os
+import time
+import threading
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+from almacen_resultados import AlmacenResultados
+from evaluador import EvaluadorTareas, crear_rubrica
+from metricas import en_contexto_actual, medir_etapa, tipo_archivo
+from procesadores.entrada import Entrada, abrir_entrada
+from procesadores.procesar_excel import EscritorResultados, _fila_resultado, iterar_filas_excel
+from procesadores.procesar_pdf import extraer_texto_pdf
+from procesadores.procesar_word import extraer_texto_word
+
+EXTENSIONES_ZIP = ("pdf", "docx", "xlsx")
+# Tamaño descomprimido máximo de cada archivo y del ZIP completo (protege de las "bombas ZIP")
+MAX_BYTES_ARCHIVO_ZIP = 50 * 1024 * 1024
+MAX_BYTES_TOTAL_ZIP = 200 * 1024 * 1024
+# Archivos leídos del ZIP en espera o en extracción por cada proceso extractor
+ARCHIVOS_EN_VUELO_POR_PROCESO = 2
+
+def extraer_textos(nombre: str, contenido: bytes) -> List[str]:
+    """
+    Extrae los textos a evaluar de un archivo (del ZIP o de un lote). Se ejecuta en un
+    proceso aparte, por eso recibe bytes y está definida a nivel de módulo (debe poder serializarse).
+
+    Args:
+        nombre (str): Nombre del archivo (se usa su extensión).
+        contenido (bytes): Contenido del archivo.
+
+    Returns:
+        List[str]: Un texto por documento (PDF/Word) o uno por fila (Excel).
+
+    Raises:
+        ValueError: Si no se pudo extraer texto.
+    """
+    extension = nombre.lower().rsplit(".", 1)[-1]
+    if extension == "xlsx":
+        return list(iterar_filas_excel(contenido))
+    # Ya se ejecuta en un proceso del pool: sin repartir además las páginas del PDF
+    texto = extraer_texto_pdf(contenido, paralelo=False) if extension == "pdf" else extraer_texto_word(contenido)
+    if not texto:
+        raise ValueError("No se pudo extraer texto del archivo.")
+    return [texto]
+
+def listar_archivos_zip(zip_archivo: zipfile.ZipFile) -> List[str]:
+    """
+    Devuelve los archivos evaluables del ZIP en orden alfabético, ignorando carpetas
+    y los metadatos que agrega macOS.
+
+    Args:
+        zip_archivo (zipfile.ZipFile): ZIP abierto.
+
+    Returns:
+        List[str]: Nombres de los archivos PDF, Word y Excel.
+    """
+    nombres = []
+    for info in zip_archivo.infolist():
+        nombre = info.filename
+        base = os.path.basename(nombre)
+        if info.is_dir() or nombre.startswith("__MACOSX/") or base.startswith((".", "~$")):
+            continue
+        if base.lower().rsplit(".", 1)[-1] in EXTENSIONES_ZIP:
+            nombres.append(nombre)
+    return sorted(nombres)
+
+def leer_archivo_zip(zip_archivo: zipfile.ZipFile, nombre: str, max_bytes: int) -> bytes:
+    """
+    Lee un archivo del ZIP sin descomprimir más de `max_bytes` (el tamaño declarado
+    en el ZIP puede ser falso, por eso se limita también la lectura).
+
+    Args:
+        zip_archivo (zipfile.ZipFile): ZIP abierto.
+        nombre (str): Nombre del archivo dentro del ZIP.
+        max_bytes (int): Tamaño descomprimido máximo.
+
+    Returns:
+        bytes: Contenido del archivo.
+
+    Raises:
+        ValueError: Si el archivo supera el tamaño máximo.
+    """
+    error = f"El archivo supera el tamaño máximo de {max_bytes // (1024 * 1024)} MB descomprimido."
+    if zip_archivo.getinfo(nombre).file_size > max_bytes:
+        raise ValueError(error)
+    with zip_archivo.open(nombre) as miembro:
+        contenido = miembro.read(max_bytes + 1)
+    if len(contenido) > max_bytes:
+        raise ValueError(error)
+    return contenido
+
+def procesar_zip(
+    ruta_archivo: Entrada,
+    criterios_dict: Dict[str, float],
+    evaluador: EvaluadorTareas,
+    carpeta_resultados: str,
+    max_concurrencia: int = 1,
+    procesos: Optional[int] = None,
+    progreso: Optional[Callable[[int, int, float], None]] = None,
+    almacen: Optional[AlmacenResultados] = None,
+    trabajo_id: Optional[str] = None,
+    origen: str = "",
+    max_bytes_archivo: int = MAX_BYTES_ARCHIVO_ZIP,
+    max_bytes_total: int = MAX_BYTES_TOTAL_ZIP
+) -> Tuple[pd.DataFrame, str]:
+    """
+    Evalúa todos los PDF, Word y Excel de un ZIP y genera un único Excel de resultados.
+    La extracción (CPU) se reparte en un pool de procesos y, a medida que termina cada
+    archivo, sus textos se envían al pool de hilos que llama al modelo, de modo que la
+    extracción de unos archivos se solapa con la evaluación de otros. Los archivos se
+    descomprimen a medida que hay procesos libres, no todos al principio.
+
+    Args:
+        ruta_archivo (Entrada): Ruta, bytes u objeto tipo archivo del ZIP.
+        criterios_dict (Dict[str, float]): Criterios de evaluación.
+        evaluador (EvaluadorTareas): Instancia del evaluador.
+        carpeta_resultados (str): Carpeta para guardar el Excel de resultados.
+        max_concurrencia (int): Número máximo de textos evaluados en paralelo por el modelo.
+        procesos (Optional[int]): Procesos de extracción (por defecto, uno por CPU).
+        progreso (Optional[Callable[[int, int, float], None]]): Se llama al terminar cada texto
+            con (textos hechos, total conocido hasta el momento, segundos que tardó).
+        almacen (Optional[AlmacenResultados]): Si se indica, las filas se guardan en el almacén
+            de resultados en lugar de generar un Excel (se exporta al descargarlo).
+        trabajo_id (Optional[str]): Identificador del trabajo en el almacén (por defecto, uno nuevo).
+        origen (str): Nombre del ZIP subido (se guarda con el trabajo).
+        max_bytes_archivo (int): Tamaño descomprimido máximo de cada archivo (los mayores
+            quedan como fila con error).
+        max_bytes_total (int): Tamaño descomprimido máximo de todo el ZIP (si se supera,
+            no se evalúa).
+
+    Returns:
+        Tuple[pd.DataFrame, str]: DataFrame con resultados y nombre del archivo generado
+        (o el identificador del trabajo si se usa el almacén).
+    """
+    escritor = None
+    try:
+        rubrica = crear_rubrica(criterios_dict)
+
+        columnas = (["Archivo", "Tarea", "Calificación Final"]
+                    + [f"{nombre} (Puntaje)" for nombre in criterios_dict]
+                    + [f"{nombre} (Justificación)" for nombre in criterios_dict]
+                    + ["Error"])
+
+        # Filas por archivo (en el orden del ZIP) y textos pendientes de evaluar
+        filas_por_archivo: Dict[int, List[Optional[Dict]]] = {}
+        total = hechos = 0
+        lock_progreso = threading.Lock()
+
+        def evaluar(indice: int, posicion: int, nombre: str, texto: str) -> None:
+            nonlocal hechos
+            inicio = time.perf_counter()
+            extension = nombre.lower().rsplit(".", 1)[-1]
+            with tipo_archivo(extension):
+                try:
+                    resultado = evaluador.evaluar_texto(texto, rubrica, paginado=extension == "pdf")
+                except Exception as e:
+                    resultado = {"error": str(e)}
+            fila = {"Archivo": nombre, **_fila_resultado(texto, resultado)}
+            filas_por_archivo[indice][posicion] = fila
+            if progreso is not None:
+                with lock_progreso:
+                    hechos += 1
+                    progreso(hechos, total, time.perf_counter() - inicio)
+
+        def registrar_extraccion(indice: int, nombre: str, textos: List[str], error: Optional[Exception]) -> None:
+            nonlocal total, hechos
+            if error is not None:
+                print(f"Error al extraer {nombre}: {error}")
+                filas_por_archivo[indice] = [{"Archivo": nombre, "Calificación Final": None, "Error": str(error)}]
+            else:
+                filas_por_archivo[indice] = [None] * len(textos)
+            with lock_progreso:
+                # Un Excel aporta tantas tareas como filas; un archivo sin texto cuenta como hecho
+                total += max(len(textos), 1) - 1
+                if not textos:
+                    hechos += 1
+                    if progreso is not None:
+                        progreso(hechos, total, 0.0)
+            for posicion, texto in enumerate(textos):
+                evaluaciones.append(evaluadores.submit(en_contexto_actual(evaluar), indice, posicion,
+                                                       nombre, texto))
+
+        with abrir_entrada(ruta_archivo) as flujo, zipfile.ZipFile(flujo) as zip_archivo:
+            nombres = listar_archivos_zip(zip_archivo)
+            if not nombres:
+                raise ValueError("El ZIP no contiene archivos PDF, Word ni Excel.")
+            if sum(zip_archivo.getinfo(nombre).file_size for nombre in nombres) > max_bytes_total:
+                raise ValueError(f"El contenido del ZIP supera el tamaño máximo de "
+                                 f"{max_bytes_total // (1024 * 1024)} MB descomprimido.")
+            total = len(nombres)
+
+            num_procesos = procesos or min(len(nombres), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=num_procesos) as extractores, \
+                    ThreadPoolExecutor(max_workers=max(1, max_concurrencia)) as evaluadores:
+                evaluaciones: List[Future] = []
+                # Solo unos pocos archivos descomprimidos a la vez; se leen más a medida que terminan
+                pendientes = deque(enumerate(nombres))
+                extracciones: Dict[Future, Tuple[int, str]] = {}
+                ventana = max(1, num_procesos) * ARCHIVOS_EN_VUELO_POR_PROCESO
+                while pendientes or extracciones:
+                    while pendientes and len(extracciones) < ventana:
+                        indice, nombre = pendientes.popleft()
+                        try:
+                            contenido = leer_archivo_zip(zip_archivo, nombre, max_bytes_archivo)
+                        except Exception as e:
+                            registrar_extraccion(indice, nombre, [], e)
+                            continue
+                        extracciones[extractores.submit(extraer_textos, nombre, contenido)] = (indice, nombre)
+                    if not extracciones:
+                        continue
+                    terminadas, _ = wait(list(extracciones), return_when=FIRST_COMPLETED)
+                    for extraccion in terminadas:
+                        indice, nombre = extracciones.pop(extraccion)
+                        try:
+                            textos, error = extraccion.result(), None
+                        except Exception as e:
+                            textos, error = [], e
+                        registrar_extraccion(indice, nombre, textos, error)
+                for evaluacion in evaluaciones:
+                    evaluacion.result()
+
+        # Un único Excel con todos los archivos, en el orden del ZIP
+        if almacen is not None:
+            nombre_archivo = trabajo_id or uuid.uuid4().hex
+            escritor = almacen.escritor(nombre_archivo, criterios_dict, "zip", origen)
+        else:
+            nombre_archivo = f"rubrica_zip_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.xlsx"
+            escritor = EscritorResultados(os.path.join(carpeta_resultados, nombre_archivo), columnas)
+        resultados = []
+        with medir_etapa("escribir_excel", "zip"):
+            for indice in sorted(filas_por_archivo):
+                for fila in filas_por_archivo[indice]:
+                    escritor.escribir(fila)
+                    resultados.append(fila)
+            if escritor.filas == 0:
+                raise ValueError("Los archivos del ZIP no contienen tareas.")
+            escritor.cerrar()
+
+        return pd.DataFrame(resultados), nombre_archivo
+
+    except Exception as e:
+        print(f"Error al procesar el archivo ZIP: {e}")
+        if escritor is not None:
+            escritor.abortar()
+        return pd.DataFrame(), f"error_{int(time.time())}.txt"
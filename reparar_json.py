@@ -0,0 +1,123 @@
+import json
+import re
+from typing import Any, Callable, List, Optional, Tuple
+
+from cliente_ollama import DetectorJSON
+
+_VALLAS = re.compile(r"```(?:json)?", re.IGNORECASE)
+_COMAS_FINALES = re.compile(r",\s*([}\]])")
+# Comillas tipográficas que el modelo usa a veces como delimitadores, con su cierre
+_COMILLAS_TIPOGRAFICAS = {"“": "”", "«": "»"}
+_LITERALES_PYTHON = re.compile(r"\b(True|False|None)\b")
+_CLAVES_SIN_COMILLAS = re.compile(r"([{,]\s*)([A-Za-z_áéíóúñÁÉÍÓÚÑ][\wáéíóúñÁÉÍÓÚÑ]*)(\s*:)")
+
+
+def _segmentos(texto: str) -> List[Tuple[bool, str]]:
+    """
+    Divide el texto en tramos fuera y dentro de cadenas JSON (las comillas quedan en el
+    tramo de la cadena), siguiendo el estado de cadena y de escape igual que `DetectorJSON`.
+    Las comillas tipográficas que abren o cierran una cadena se cambian por comillas rectas;
+    dentro de una cadena se conservan tal cual.
+    """
+    segmentos: List[Tuple[bool, str]] = []
+    actual: List[str] = []
+    en_cadena = escape = False
+    cierres = '"'
+    for caracter in texto:
+        if en_cadena:
+            if escape:
+                escape = False
+            elif caracter == "\\":
+                escape = True
+            elif caracter in cierres:
+                actual.append('"')
+                segmentos.append((True, "".join(actual)))
+                actual, en_cadena = [], False
+                continue
+            actual.append(caracter)
+        elif caracter == '"' or caracter in _COMILLAS_TIPOGRAFICAS:
+            segmentos.append((False, "".join(actual)))
+            actual, en_cadena = ['"'], True
+            cierres = '"' if caracter == '"' else '"' + _COMILLAS_TIPOGRAFICAS[caracter]
+        else:
+            actual.append(caracter)
+    segmentos.append((en_cadena, "".join(actual)))
+    return segmentos
+
+
+def _fuera_de_cadenas(texto: str, transformar: Callable[[str], str]) -> str:
+    """Aplica `transformar` solo al texto que queda fuera de las cadenas JSON."""
+    return "".join(tramo if es_cadena else transformar(tramo) for es_cadena, tramo in _segmentos(texto))
+
+
+def _reparar_fuera_de_cadenas(tramo: str) -> str:
+    tramo = _COMAS_FINALES.sub(r"\1", tramo)
+    tramo = _LITERALES_PYTHON.sub(lambda m: {"True": "true", "False": "false", "None": "null"}[m.group(1)], tramo)
+    return _CLAVES_SIN_COMILLAS.sub(r'\1"\2"\3', tramo)
+
+
+def _cerrar_truncado(texto: str) -> str:
+    """Cierra cadenas, listas y objetos que quedaron abiertos en una respuesta cortada."""
+    pila = []
+    en_cadena = escape = False
+    for caracter in texto:
+        if en_cadena:
+            if escape:
+                escape = False
+            elif caracter == "\\":
+                escape = True
+            elif caracter == '"':
+                en_cadena = False
+        elif caracter == '"':
+            en_cadena = True
+        elif caracter in "{[":
+            pila.append("}" if caracter == "{" else "]")
+        elif caracter in "}]" and pila:
+            pila.pop()
+    if en_cadena:
+        texto += '"'
+    texto = re.sub(r"[,:]\s*$", "", texto.rstrip())
+    return texto + "".join(reversed(pila))
+
+
+def reparar_json(texto: Optional[str]) -> Optional[Any]:
+    """
+    Intenta recuperar el primer objeto JSON de una respuesta del modelo aunque venga
+    rodeada de texto, entre vallas de código, con comas finales, comillas tipográficas,
+    literales de Python, claves sin comillas o cortada antes de terminar.
+    Args:
+        texto (Optional[str]): Respuesta del modelo.
+    Returns:
+        Optional[Any]: Objeto decodificado o None si no se pudo reparar.
+    """
+    if not texto:
+        return None
+    inicio = texto.find("{")
+    if inicio == -1:
+        return None
+
+    detector = DetectorJSON()
+    detector.alimentar(texto[inicio:])
+    candidato = detector.texto if detector.completo else texto[inicio:]
+
+    try:
+        return json.loads(candidato)
+    except ValueError:
+        pass
+
+    # Las reparaciones solo tocan lo que está fuera de las cadenas: una justificación con
+    # «comillas», "None" o "nota:" no debe cambiar
+    candidato = _fuera_de_cadenas(candidato, lambda tramo: _VALLAS.sub("", tramo))
+    if not detector.completo:
+        candidato = _cerrar_truncado(candidato)
+    candidato = _fuera_de_cadenas(candidato, _reparar_fuera_de_cadenas)
+    try:
+        return json.loads(candidato)
+    except ValueError:
+        pass
+
+    # Último recurso: comillas simples como delimitadores de cadena
+    try:
+        return json.loads(_fuera_de_cadenas(candidato, lambda tramo: tramo.replace("'", '"')))
+    except ValueError:
+        return None
@@ -0,0 +1,310 @@
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Elementos máximos de la matriz (permutaciones x shingles) calculada de una vez
+_BLOQUE_ELEMENTOS = 4_000_000
+_NO_ALFANUMERICO = re.compile(r"[^a-z0-9\s]")
+
+
+def normalizar_para_similitud(texto: str) -> str:
+    """Minúsculas, sin tildes ni signos de puntuación y con los espacios colapsados."""
+    texto = unicodedata.normalize("NFKD", texto.lower()).encode("ascii", "ignore").decode("ascii")
+    return " ".join(_NO_ALFANUMERICO.sub(" ", texto).split())
+
+
+def clave_exacta(texto: str) -> str:
+    """Hash del texto con los espacios normalizados (la misma normalización que la caché de evaluaciones)."""
+    return hashlib.sha256(" ".join(texto.split()).encode("utf-8")).hexdigest()
+
+
+class IndiceSimilitud:
+    def __init__(
+        self,
+        ruta: Optional[str] = os.path.join("cache", "similitud.npz"),
+        num_permutaciones: int = 64,
+        bandas: int = 16,
+        tam_shingle: int = 5,
+        umbral: float = 0.8,
+        max_entradas: int = 100_000,
+        max_por_cubeta: int = 32,
+        semilla: int = 1
+    ):
+        """
+        Índice de entregas duplicadas y casi duplicadas basado en firmas MinHash de
+        shingles de caracteres y LSH por bandas. Las firmas se calculan con NumPy para
+        todas las filas a la vez y el índice se guarda en disco para comparar con
+        entregas de evaluaciones anteriores. Cada entrega guarda su archivo, fila y trabajo
+        de origen: al volver a subir el mismo archivo sus filas no coinciden consigo mismas.
+        Args:
+            ruta (Optional[str]): Archivo .npz donde se guarda el índice; None para usar solo memoria.
+            num_permutaciones (int): Longitud de cada firma MinHash.
+            bandas (int): Bandas LSH (debe dividir a `num_permutaciones`).
+            tam_shingle (int): Caracteres de cada shingle.
+            umbral (float): Similitud de Jaccard estimada a partir de la cual se marca una entrega.
+            max_entradas (int): Entregas máximas guardadas (se descartan las más antiguas).
+            max_por_cubeta (int): Entregas más recientes de cada cubeta que se comparan con cada
+                texto; acota el coste cuando miles de entregas casi iguales comparten cubetas.
+            semilla (int): Semilla de las funciones hash (fija para que las firmas guardadas sigan valiendo).
+        """
+        if num_permutaciones % bandas:
+            raise ValueError("El número de bandas debe dividir al número de permutaciones.")
+        self.ruta = ruta
+        self.num_permutaciones = num_permutaciones
+        self.bandas = bandas
+        self.filas_banda = num_permutaciones // bandas
+        self.tam_shingle = tam_shingle
+        self.umbral = umbral
+        self.max_entradas = max_entradas
+        self.max_por_cubeta = max_por_cubeta
+
+        # Hash universal multiplicar-desplazar: ((a * x + b) mod 2^64) >> 32, con a impar
+        generador = np.random.default_rng(semilla)
+        self._a = generador.integers(1, 2 ** 63, num_permutaciones, dtype=np.uint64) | np.uint64(1)
+        self._b = generador.integers(0, 2 ** 63, num_permutaciones, dtype=np.uint64)
+        self._potencias = np.uint64(31) ** np.arange(tam_shingle - 1, -1, -1, dtype=np.uint64)
+        # Multiplicadores para resumir cada banda de la firma en un solo entero
+        self._mezcla_bandas = generador.integers(1, 2 ** 63, self.filas_banda, dtype=np.uint64) | np.uint64(1)
+
+        self._lock = threading.Lock()
+        self._firmas = np.empty((0, num_permutaciones), dtype=np.uint32)
+        self._claves: List[str] = []
+        self._etiquetas: List[str] = []
+        # Entrega de la que viene cada firma: archivo, fila (desde 1) y trabajo
+        self._origenes: List[str] = []
+        self._filas: List[int] = []
+        self._trabajos: List[str] = []
+        self._por_clave: Dict[str, List[int]] = {}
+        self._cubetas: List[Dict[int, List[int]]] = []
+        if ruta and os.path.exists(ruta):
+            self._cargar()
+        else:
+            self._reconstruir_cubetas()
+
+    # =====================================================
+    # FIRMAS MINHASH
+    # =====================================================
+    def _shingles(self, textos: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Hashes (uint64) de los shingles de caracteres de todos los textos normalizados,
+        calculados sobre un único arreglo de bytes, y cuántos corresponden a cada texto.
+        """
+        k = self.tam_shingle
+        normalizados = [normalizar_para_similitud(texto).encode("ascii").ljust(k) for texto in textos]
+        longitudes = np.array([len(n) for n in normalizados], dtype=np.int64)
+        datos = np.frombuffer(b"".join(normalizados), dtype=np.uint8)
+        ventanas = np.lib.stride_tricks.sliding_window_view(datos, k).astype(np.uint64) @ self._potencias
+        # Solo las ventanas que no cruzan de un texto al siguiente
+        conteos = longitudes - k + 1
+        inicios = np.concatenate(([0], np.cumsum(longitudes)[:-1]))
+        desplazamientos = np.concatenate(([0], np.cumsum(conteos)[:-1]))
+        posiciones = np.arange(conteos.sum()) + np.repeat(inicios - desplazamientos, conteos)
+        return ventanas[posiciones], conteos
+
+    def firmas(self, textos: List[str]) -> np.ndarray:
+        """
+        Calcula las firmas MinHash de varios textos.
+        Args:
+            textos (List[str]): Textos a firmar.
+        Returns:
+            np.ndarray: Matriz (len(textos), num_permutaciones) de uint32.
+        """
+        firmas = np.empty((len(textos), self.num_permutaciones), dtype=np.uint32)
+        if not textos:
+            return firmas
+        shingles, conteos = self._shingles(textos)
+        limites = np.concatenate(([0], np.cumsum(conteos)))
+        # Los shingles de varios textos se procesan juntos en bloques y el mínimo
+        # por texto se obtiene con reduceat sobre los inicios de cada texto
+        max_shingles = max(1, _BLOQUE_ELEMENTOS // self.num_permutaciones)
+        inicio = 0
+        while inicio < len(textos):
+            fin = max(inicio + 1, int(np.searchsorted(limites, limites[inicio] + max_shingles, side="right")) - 1)
+            fin = min(fin, len(textos))
+            bloque = shingles[limites[inicio]:limites[fin]]
+            valores = ((self._a[:, None] * bloque[None, :] + self._b[:, None]) >> np.uint64(32)).astype(np.uint32)
+            firmas[inicio:fin] = np.minimum.reduceat(valores, limites[inicio:fin] - limites[inicio], axis=1).T
+            inicio = fin
+        return firmas
+
+    def _claves_bandas(self, firmas: np.ndarray) -> List[List[int]]:
+        """Resume cada banda de cada firma en un entero (las colisiones se descartan al comparar firmas)."""
+        bandas = firmas.reshape(len(firmas), self.bandas, self.filas_banda).astype(np.uint64)
+        return (bandas * self._mezcla_bandas).sum(axis=2, dtype=np.uint64).tolist()
+
+    # =====================================================
+    # CONSULTA
+    # =====================================================
+    def _misma_entrega(self, indice: int, origen: str, fila: int, trabajo: str, base: int) -> bool:
+        """
+        Indica si la entrega indexada es la misma que la fila analizada: la misma fila del
+        mismo archivo (el archivo se subió otra vez) o una entrega que este mismo trabajo
+        indexó en un análisis anterior (trabajo reintentado).
+        """
+        if origen and self._origenes[indice] == origen and self._filas[indice] == fila:
+            return True
+        return bool(trabajo) and indice < base and self._trabajos[indice] == trabajo
+
+    def _excluidas(self, origen: str, trabajo: str, base: int, total: int) -> Tuple[np.ndarray, Dict[int, List[int]]]:
+        """
+        Las entregas que `_misma_entrega` descartaría para las filas de un lote, calculadas una
+        vez por lote: máscara (de `total` posiciones) de las que indexó este mismo trabajo y, por
+        número de fila, las de la misma fila del mismo archivo. Las filas del lote que se van
+        indexando nunca se descartan: son filas anteriores a la analizada.
+        """
+        del_trabajo = np.zeros(total, dtype=bool)
+        if trabajo:
+            del_trabajo[:base] = np.fromiter((t == trabajo for t in self._trabajos[:base]), dtype=bool, count=base)
+        misma_fila: Dict[int, List[int]] = defaultdict(list)
+        if origen:
+            for j in range(base):
+                if self._origenes[j] == origen:
+                    misma_fila[self._filas[j]].append(j)
+        return del_trabajo, misma_fila
+
+    def analizar(self, textos: List[str], origen: str = "", trabajo: str = "") -> List[Dict]:
+        """
+        Busca, para cada texto, duplicados exactos y casi duplicados entre las filas
+        anteriores del mismo lote y entre las entregas ya indexadas, y agrega el lote al índice.
+        Solo se informan coincidencias con otras entregas, nunca con la misma fila subida antes.
+        Args:
+            textos (List[str]): Textos en su orden original.
+            origen (str): Nombre del archivo, para identificar las filas en evaluaciones futuras.
+            trabajo (str): Identificador del trabajo que analiza el lote.
+        Returns:
+            List[Dict]: Por texto, "duplicado_de" (índice de la fila anterior idéntica del lote o None),
+            "similar_a" (etiqueta de la entrega más parecida o None) y "similitud" (0..1).
+        """
+        firmas = self.firmas(textos)
+        claves_bandas = self._claves_bandas(firmas)
+        claves = [clave_exacta(texto) for texto in textos]
+        etiquetas = [f"{origen} fila {i + 1}".strip() for i in range(len(textos))]
+        resultados = []
+        with self._lock:
+            base = len(self._claves)
+            # Firmas indexadas seguidas de las del lote; `posiciones[j]` es la fila de la
+            # entrega j en esta matriz (las del lote se indexan a medida que se analizan)
+            comparables = np.concatenate([self._firmas, firmas])
+            posiciones = np.arange(base + len(textos))
+            agregadas: List[int] = []
+            del_trabajo, misma_fila = self._excluidas(origen, trabajo, base, base + len(textos))
+            primera_fila: Dict[str, int] = {}
+            for i, (firma, clave, bandas) in enumerate(zip(firmas, claves, claves_bandas)):
+                resultado = {"duplicado_de": primera_fila.get(clave), "similar_a": None, "similitud": 0.0}
+                anterior = next((j for j in self._por_clave.get(clave, ())
+                                 if not self._misma_entrega(j, origen, i + 1, trabajo, base)), None)
+                if anterior is not None:
+                    resultado.update(similar_a=self._etiquetas[anterior], similitud=1.0)
+                else:
+                    candidatos = set()
+                    for cubeta, clave_banda in zip(self._cubetas, bandas):
+                        candidatos.update(cubeta.get(clave_banda, ())[-self.max_por_cubeta:])
+                    candidatos.difference_update(misma_fila.get(i + 1, ()))
+                    indices = np.fromiter(candidatos, dtype=np.int64, count=len(candidatos))
+                    indices = indices[~del_trabajo[indices]]
+                    if len(indices):
+                        similitudes = (comparables[posiciones[indices]] == firma).mean(axis=1)
+                        mejor = int(similitudes.argmax())
+                        if similitudes[mejor] >= self.umbral:
+                            resultado.update(similar_a=self._etiquetas[indices[mejor]],
+                                             similitud=float(similitudes[mejor]))
+                resultados.append(resultado)
+                primera_fila.setdefault(clave, i)
+                # Se agrega enseguida para que las filas siguientes del lote se comparen con esta
+                if self._agregar(clave, bandas, etiquetas[i], origen, i + 1, trabajo):
+                    posiciones[base + len(agregadas)] = base + i
+                    agregadas.append(i)
+            if agregadas:
+                self._firmas = np.concatenate([self._firmas, firmas[agregadas]])
+            if len(self._claves) > self.max_entradas:
+                self._recortar()
+        return resultados
+
+    # =====================================================
+    # ALTA, RECORTE Y PERSISTENCIA
+    # =====================================================
+    def _agregar(self, clave: str, bandas: List[int], etiqueta: str, origen: str, fila: int, trabajo: str) -> bool:
+        """
+        Agrega una entrega a las cubetas; devuelve False si su texto ya estaba indexado
+        para la misma fila del mismo archivo o para otra fila del mismo trabajo.
+        """
+        for j in self._por_clave.get(clave, ()):
+            if (self._origenes[j] == origen and self._filas[j] == fila) or (trabajo and self._trabajos[j] == trabajo):
+                return False
+        indice = len(self._claves)
+        self._claves.append(clave)
+        self._etiquetas.append(etiqueta)
+        self._origenes.append(origen)
+        self._filas.append(fila)
+        self._trabajos.append(trabajo)
+        self._por_clave.setdefault(clave, []).append(indice)
+        for cubeta, clave_banda in zip(self._cubetas, bandas):
+            cubeta[clave_banda].append(indice)
+        return True
+
+    def _recortar(self) -> None:
+        sobrantes = len(self._claves) - self.max_entradas
+        self._firmas = self._firmas[sobrantes:]
+        self._claves = self._claves[sobrantes:]
+        self._etiquetas = self._etiquetas[sobrantes:]
+        self._origenes = self._origenes[sobrantes:]
+        self._filas = self._filas[sobrantes:]
+        self._trabajos = self._trabajos[sobrantes:]
+        self._reconstruir_cubetas()
+
+    def _reconstruir_cubetas(self) -> None:
+        self._por_clave = {}
+        for i, clave in enumerate(self._claves):
+            self._por_clave.setdefault(clave, []).append(i)
+        self._cubetas = [defaultdict(list) for _ in range(self.bandas)]
+        for indice, bandas in enumerate(self._claves_bandas(self._firmas)):
+            for cubeta, clave_banda in zip(self._cubetas, bandas):
+                cubeta[clave_banda].append(indice)
+
+    def _cargar(self) -> None:
+        try:
+            with np.load(self.ruta, allow_pickle=False) as datos:
+                if datos["firmas"].shape[1] != self.num_permutaciones:
+                    raise ValueError("el índice se creó con otro número de permutaciones")
+                self._firmas = datos["firmas"].astype(np.uint32)
+                self._claves = datos["claves"].tolist()
+                self._etiquetas = datos["etiquetas"].tolist()
+                if "origenes" in datos:
+                    self._origenes = datos["origenes"].tolist()
+                    self._filas = datos["filas"].tolist()
+                    self._trabajos = datos["trabajos"].tolist()
+                else:
+                    # Índices guardados antes de registrar el origen: se deduce de la etiqueta "<archivo> fila N"
+                    partes = [etiqueta.rpartition("fila ") for etiqueta in self._etiquetas]
+                    self._origenes = [antes.strip() for antes, _, _ in partes]
+                    self._filas = [int(numero) if numero.isdigit() else 0 for _, _, numero in partes]
+                    self._trabajos = [""] * len(self._etiquetas)
+        except Exception as e:
+            print(f"No se pudo cargar el índice de similitud ({self.ruta}): {e}")
+            self._firmas = np.empty((0, self.num_permutaciones), dtype=np.uint32)
+            self._claves, self._etiquetas = [], []
+            self._origenes, self._filas, self._trabajos = [], [], []
+        self._reconstruir_cubetas()
+
+    def guardar(self) -> None:
+        """Guarda el índice en disco (escritura atómica)."""
+        if not self.ruta:
+            return
+        with self._lock:
+            carpeta = os.path.dirname(self.ruta)
+            if carpeta:
+                os.makedirs(carpeta, exist_ok=True)
+            temporal = self.ruta + ".tmp.npz"
+            np.savez(temporal, firmas=self._firmas, claves=np.array(self._claves, dtype=str),
+                     etiquetas=np.array(self._etiquetas, dtype=str), origenes=np.array(self._origenes, dtype=str),
+                     filas=np.array(self._filas, dtype=np.int64), trabajos=np.array(self._trabajos, dtype=str))
+            os.replace(temporal, self.ruta)
+
+    def __len__(self) -> int:
+        return len(self._claves)
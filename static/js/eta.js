@@ -1,8 +1,8 @@
-function iniciarProgreso() {
+function iniciarProgreso(jobId) {
     const barra = document.getElementById("barra_progreso");
     const eta = document.getElementById("eta");
 
-    const evento = new EventSource("/progreso");
+    const evento = new EventSource("/progreso/" + jobId);
 
     evento.onmessage = function(e) {
         const data = JSON.parse(e.data);
@@ -10,10 +10,17 @@ function iniciarProgreso() {
         barra.style.width = data.progreso + "%";
         barra.innerText = data.progreso + "%";
 
-        eta.innerText = data.eta;
+        if (data.total > 1) {
+            eta.innerText = data.hechos + " de " + data.total + " — " + data.eta;
+        } else if (data.tokens > 0 && data.progreso < 100) {
+            eta.innerText = "Generando respuesta (" + data.tokens + " fragmentos recibidos)";
+        } else {
+            eta.innerText = data.eta;
+        }
 
-        if (data.progreso >= 100) {
+        if (data.estado === "completado" || data.estado === "error") {
             evento.close();
+            window.location.href = "/resultado/" + jobId;
         }
     }
 }
@@ -0,0 +1,55 @@
+import os
+import time
+
+import cache_extraccion
+from cache_extraccion import CacheExtraccion
+
+
+def _archivos(carpeta):
+    return sorted(nombre for _, _, nombres in os.walk(carpeta) for nombre in nombres)
+
+
+def _envejecer(cache, clave, segundos):
+    instante = time.time() - segundos
+    os.utime(cache._ruta(clave), (instante, instante))
+
+
+def test_texto_expirado_no_se_devuelve_y_se_purga(tmp_path):
+    cache = CacheExtraccion(str(tmp_path), max_memoria=0, ttl=60)
+    clave = cache.clave(b"documento", "pdf")
+    cache.guardar(clave, "texto")
+    assert cache.obtener(clave) == "texto"
+    _envejecer(cache, clave, 120)
+    assert cache.obtener(clave) is None
+    assert cache.purgar() == 1
+    assert _archivos(tmp_path) == []
+
+
+def test_limite_de_entradas_conserva_las_usadas_hace_menos(tmp_path):
+    cache = CacheExtraccion(str(tmp_path), max_memoria=0, max_disco=2)
+    claves = [cache.clave(str(i).encode(), "pdf") for i in range(3)]
+    for antiguedad, clave in zip((30, 20, 10), claves):
+        cache.guardar(clave, "texto")
+        _envejecer(cache, clave, antiguedad)
+    # Leer la más antigua renueva su fecha de uso
+    assert cache.obtener(claves[0]) == "texto"
+    assert cache.purgar() == 1
+    assert _archivos(tmp_path) == sorted(clave + ".txt" for clave in (claves[0], claves[2]))
+
+
+def test_limite_de_bytes(tmp_path):
+    cache = CacheExtraccion(str(tmp_path), max_memoria=0, max_bytes_disco=250)
+    for i in range(3):
+        clave = cache.clave(str(i).encode(), "pdf")
+        cache.guardar(clave, "x" * 100)
+        _envejecer(cache, clave, 30 - i)
+    assert cache.purgar() == 1
+    assert len(_archivos(tmp_path)) == 2
+
+
+def test_la_escritura_purga_periodicamente(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_extraccion, "ESCRITURAS_POR_PURGA", 5)
+    cache = CacheExtraccion(str(tmp_path), max_memoria=0, max_disco=3)
+    for i in range(5):
+        cache.guardar(cache.clave(str(i).encode(), "pdf"), "texto")
+    assert len(_archivos(tmp_path)) == 3
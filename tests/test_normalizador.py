@@ -0,0 +1,108 @@
+from evaluador import TEXTO_VACIADO, EvaluadorTareas, crear_rubrica
+from fragmentador import fragmentar_texto
+from normalizador import normalizar_texto, unir_celdas
+
+
+def _pdf(paginas):
+    # Mismo separador que procesar_pdf.SEPARADOR_PAGINAS
+    return "\n\f".join(paginas)
+
+
+def _pagina(numero, total, cuerpo):
+    return (f"Universidad Nacional - Informe de laboratorio\n{cuerpo}\n"
+            f"Colegio San Martín\nPágina {numero} de {total}")
+
+
+# =====================================================
+# TEXTO SIN PÁGINAS (TEXTO MANUAL Y CELDAS DE EXCEL)
+# =====================================================
+def test_numero_suelto_se_conserva():
+    assert normalizar_texto("42") == "42"
+    assert normalizar_texto("3 / 4") == "3 / 4"
+
+
+def test_respuesta_numerica_al_final_se_conserva():
+    assert normalizar_texto("La respuesta es:\n12") == "La respuesta es:\n12"
+
+
+def test_rotulo_de_pagina_no_se_quita_sin_paginas():
+    assert normalizar_texto("Página 3 de 4") == "Página 3 de 4"
+
+
+def test_celdas_vacias_se_omiten():
+    assert unir_celdas(["Ana", None, float("nan"), "nan", " 42 "]) == "Ana 42"
+
+
+# =====================================================
+# PDF
+# =====================================================
+def test_pdf_de_una_pagina_no_pierde_lineas():
+    texto = "Página 1 de 1\nLa respuesta es:\n12"
+    assert normalizar_texto(texto, paginado=True) == texto
+
+
+def test_pdf_de_dos_paginas_no_pierde_lineas():
+    paginas = [_pagina(1, 2, "Primera parte."), _pagina(2, 2, "Segunda parte.")]
+    normalizado = normalizar_texto(_pdf(paginas), paginado=True)
+    assert normalizado.count("Universidad Nacional") == 2
+    assert "Página 2 de 2" in normalizado
+
+
+def test_encabezados_distintos_por_pagina_se_conservan():
+    paginas = [f"Pregunta {i}\nRespuesta de la pregunta {i}." for i in range(1, 5)]
+    normalizado = normalizar_texto(_pdf(paginas), paginado=True)
+    for i in range(1, 5):
+        assert f"Pregunta {i}" in normalizado
+        assert f"Respuesta de la pregunta {i}." in normalizado
+
+
+def test_pdf_realista_conserva_primera_y_ultima_linea_del_cuerpo():
+    cuerpos = [f"Inicio del cuerpo {i}.\nDesarrollo del tema {i}.\nCierre del cuerpo {i}." for i in range(1, 5)]
+    paginas = [_pagina(i, 4, cuerpo) for i, cuerpo in enumerate(cuerpos, start=1)]
+    normalizado = normalizar_texto(_pdf(paginas), paginado=True)
+    for i in range(1, 5):
+        assert f"Inicio del cuerpo {i}." in normalizado
+        assert f"Cierre del cuerpo {i}." in normalizado
+    assert "Universidad Nacional" not in normalizado
+    assert "Colegio San Martín" not in normalizado
+    assert "Página" not in normalizado
+
+
+def test_numero_sin_rotulo_en_el_margen_se_conserva():
+    paginas = [f"Ejercicio {i}\nResultado:\n{i * 7}" for i in range(1, 5)]
+    normalizado = normalizar_texto(_pdf(paginas), paginado=True)
+    for i in range(1, 5):
+        assert str(i * 7) in normalizado.split("\n")
+
+
+def test_palabra_cortada_con_guion_se_une():
+    assert normalizar_texto("La foto-\nsíntesis ocurre") == "La fotosíntesis ocurre"
+
+
+def test_saltos_de_pagina_se_conservan_para_el_fragmentador():
+    cuerpos = [" ".join(f"palabra{i}_{j}" for j in range(200)) for i in range(1, 5)]
+    paginas = [_pagina(i, 4, cuerpo) for i, cuerpo in enumerate(cuerpos, start=1)]
+    normalizado = normalizar_texto(_pdf(paginas), paginado=True)
+    assert normalizado.count("\f") == 3
+    fragmentos = fragmentar_texto(normalizado, 1000)
+    # Cada fragmento contiene una sola página
+    assert len(fragmentos) == 4
+    for i, fragmento in enumerate(fragmentos, start=1):
+        assert f"palabra{i}_0" in fragmento and f"palabra{i}_199" in fragmento
+
+
+# =====================================================
+# EVALUADOR
+# =====================================================
+def test_texto_manual_numerico_se_envia_completo():
+    texto, tokens = EvaluadorTareas(cache=None).preparar_texto("42")
+    assert texto == "42"
+    assert tokens["enviado"] == tokens["original"] > 0
+
+
+def test_texto_vaciado_no_se_evalua():
+    evaluador = EvaluadorTareas(url_api="http://127.0.0.1:9/api/generate", cache=None)
+    rubrica = crear_rubrica({"Claridad": 10})
+    resultado = evaluador.evaluar_texto("\u200b\u200b", rubrica)
+    assert resultado["error"] == TEXTO_VACIADO
+    assert evaluador.evaluar_lote(["\ufeff", "\u00ad"], rubrica)[0]["error"] == TEXTO_VACIADO
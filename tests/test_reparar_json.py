@@ -0,0 +1,40 @@
+from reparar_json import reparar_json
+
+
+def test_json_valido_no_cambia():
+    assert reparar_json('{"nota": 5}') == {"nota": 5}
+
+
+def test_comas_finales_y_vallas():
+    texto = '```json\n{"criterios": [{"nombre": "A", "puntaje": 4},],}\n```'
+    assert reparar_json(texto) == {"criterios": [{"nombre": "A", "puntaje": 4}]}
+
+
+def test_comillas_tipograficas_dentro_de_una_cadena_se_conservan():
+    texto = '{"criterios":[{"nombre":"A","puntaje":4,"justificacion":"cita «texto» del autor"},]}'
+    resultado = reparar_json(texto)
+    assert resultado["criterios"][0]["justificacion"] == "cita «texto» del autor"
+
+
+def test_comillas_tipograficas_como_delimitadores():
+    assert reparar_json("{“nombre”: «Claridad», \"puntaje\": 3,}") == {"nombre": "Claridad", "puntaje": 3}
+
+
+def test_literales_y_claves_dentro_de_una_cadena_se_conservan():
+    justificacion = "None of it, nota: buena, True"
+    resultado = reparar_json('{"justificacion": "' + justificacion + '", "aprobado": True, puntaje: 3,}')
+    assert resultado == {"justificacion": justificacion, "aprobado": True, "puntaje": 3}
+
+
+def test_respuesta_cortada_se_cierra():
+    resultado = reparar_json('Respuesta: {"criterios": [{"nombre": "A", "justificacion": "sin termin')
+    assert resultado == {"criterios": [{"nombre": "A", "justificacion": "sin termin"}]}
+
+
+def test_comillas_simples_como_ultimo_recurso():
+    assert reparar_json("{'nombre': 'A', 'puntaje': 2}") == {"nombre": "A", "puntaje": 2}
+
+
+def test_sin_objeto_devuelve_none():
+    assert reparar_json("sin json") is None
+    assert reparar_json(None) is None
@@ -0,0 +1,43 @@
+import random
+
+from similitud import IndiceSimilitud
+
+_BASE = ("La fotosíntesis es el proceso mediante el cual las plantas convierten la luz solar en energía "
+         "química almacenada en glucosa, liberando oxígeno como subproducto del proceso en las hojas verdes.")
+
+
+def _parafrasis(cantidad, semilla=1):
+    aleatorio = random.Random(semilla)
+    textos = []
+    for _ in range(cantidad):
+        palabras = _BASE.split()
+        palabras[aleatorio.randrange(len(palabras))] = aleatorio.choice(["planta", "luz", "clorofila"])
+        textos.append(" ".join(palabras))
+    return textos
+
+
+def test_casi_duplicado_del_mismo_lote():
+    textos = ["Un texto completamente distinto sobre la historia de Roma y sus emperadores.", _BASE,
+              _BASE.replace("glucosa", "azúcar")]
+    resultados = IndiceSimilitud(None).analizar(textos, "a.xlsx")
+    assert resultados[1]["similar_a"] is None
+    assert resultados[2]["similar_a"] == "a.xlsx fila 2"
+    assert resultados[2]["similitud"] >= 0.8
+
+
+def test_archivo_subido_otra_vez_no_coincide_consigo_mismo():
+    indice = IndiceSimilitud(None)
+    textos = ["Primera respuesta sobre la célula animal y sus orgánulos.",
+              "Segunda respuesta sobre la revolución industrial en Inglaterra."]
+    indice.analizar(textos, "a.xlsx", "t1")
+    assert all(r["similar_a"] is None for r in indice.analizar(textos, "a.xlsx", "t2"))
+    assert [r["similar_a"] for r in indice.analizar(textos, "b.xlsx", "t3")] == ["a.xlsx fila 1", "a.xlsx fila 2"]
+
+
+def test_miles_de_filas_parecidas():
+    indice = IndiceSimilitud(None, max_por_cubeta=8)
+    textos = _parafrasis(2000)
+    resultados = indice.analizar(textos, "a.xlsx", "t1")
+    assert sum(r["similar_a"] is not None for r in resultados[1:]) >= 1990
+    # Un trabajo reintentado no coincide con lo que él mismo indexó
+    assert not any((r["similar_a"] or "").startswith("a.xlsx") for r in indice.analizar(textos, "b.xlsx", "t1"))
@@ -0,0 +1,29 @@
+import time
+
+import pytest
+
+from trabajos import GestorTrabajos, ProcesoNoUnico
+
+
+def _esperar(gestor, trabajo):
+    while gestor.obtener(trabajo.id).estado not in ("completado", "error"):
+        time.sleep(0.01)
+    return gestor.obtener(trabajo.id)
+
+
+def test_error_devuelto_marca_el_trabajo_como_fallido():
+    gestor = GestorTrabajos(1)
+    assert _esperar(gestor, gestor.encolar(lambda trabajo: {"resultado": 1})).estado == "completado"
+    fallido = _esperar(gestor, gestor.encolar(lambda trabajo: {"error": "archivo dañado"}))
+    assert fallido.estado == "error" and fallido.error == "archivo dañado"
+
+
+def test_un_segundo_gestor_con_el_mismo_bloqueo_no_encola(tmp_path):
+    bloqueo = str(tmp_path / "trabajos.lock")
+    primero = GestorTrabajos(1, archivo_bloqueo=bloqueo)
+    segundo = GestorTrabajos(1, archivo_bloqueo=bloqueo)
+    # Crear el gestor no toma el bloqueo: lo toma el primer trabajo
+    _esperar(primero, primero.encolar(lambda trabajo: {}))
+    with pytest.raises(ProcesoNoUnico):
+        segundo.encolar(lambda trabajo: {})
+    _esperar(primero, primero.encolar(lambda trabajo: {}))
@@ -0,0 +1,215 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+
+class ProcesoNoUnico(RuntimeError):
+    """Otro proceso ya atiende trabajos: el registro de trabajos es de un único proceso."""
+
+
+def formatear_eta(segundos: Optional[float]) -> str:
+    """
+    Convierte segundos restantes a un texto legible.
+    Args:
+        segundos (Optional[float]): Segundos restantes o None si aún no se conocen.
+    Returns:
+        str: Texto del tipo "~2 min 5 s".
+    """
+    if segundos is None:
+        return "Calculando..."
+    segundos = int(round(segundos))
+    if segundos < 60:
+        return f"~{segundos} s"
+    return f"~{segundos // 60} min {segundos % 60} s"
+
+
+# =====================================================
+# TRABAJO DE EVALUACIÓN
+# =====================================================
+class Trabajo:
+    def __init__(self, paralelismo: int = 1):
+        """
+        Estado de un trabajo de evaluación en segundo plano.
+        Args:
+            paralelismo (int): Filas que se evalúan a la vez (para estimar el ETA).
+        """
+        self.id = uuid.uuid4().hex
+        self.estado = "pendiente"  # pendiente | en_proceso | completado | error
+        self.paralelismo = max(1, paralelismo)
+        self.total = 0
+        self.hechos = 0
+        self.creado = time.time()
+        self.finalizado: Optional[float] = None
+        self.resultado: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.tokens = 0
+        self._latencia_total = 0.0
+        self._lock = threading.Lock()
+
+    def registrar_avance(self, hechos: int, total: int, latencia: float) -> None:
+        """
+        Registra que una fila terminó de evaluarse.
+        Args:
+            hechos (int): Filas completadas hasta el momento.
+            total (int): Total de filas del trabajo.
+            latencia (float): Segundos que tardó el modelo en la última fila.
+        """
+        with self._lock:
+            self.hechos = hechos
+            self.total = total
+            self._latencia_total += latencia
+
+    def registrar_token(self, fragmento: str) -> None:
+        """Cuenta los fragmentos recibidos del modelo mientras se genera la respuesta."""
+        with self._lock:
+            self.tokens += 1
+
+    def eta(self) -> Optional[float]:
+        """
+        Estima los segundos restantes a partir de la latencia media por fila.
+        Returns:
+            Optional[float]: Segundos restantes o None si aún no hay datos.
+        """
+        with self._lock:
+            if self.hechos == 0:
+                return None
+            latencia_media = self._latencia_total / self.hechos
+            restantes = max(0, self.total - self.hechos)
+            return restantes * latencia_media / self.paralelismo
+
+    def instantanea(self) -> Dict[str, Any]:
+        """
+        Devuelve el estado del trabajo para enviarlo al navegador.
+        Returns:
+            Dict[str, Any]: Estado, filas hechas, porcentaje y ETA.
+        """
+        eta = self.eta()
+        with self._lock:
+            terminado = self.estado in ("completado", "error")
+            progreso = 100 if terminado else (int(self.hechos * 100 / self.total) if self.total else 0)
+            return {
+                "id": self.id,
+                "estado": self.estado,
+                "hechos": self.hechos,
+                "total": self.total,
+                "tokens": self.tokens,
+                "progreso": progreso,
+                "eta_segundos": 0 if terminado else eta,
+                "eta": "Completado" if terminado else formatear_eta(eta),
+                "error": self.error
+            }
+
+
+# =====================================================
+# GESTOR DE TRABAJOS
+# =====================================================
+class GestorTrabajos:
+    def __init__(self, max_trabajadores: int = 2, retencion: float = 3600.0, max_interactivos: int = 4,
+                 archivo_bloqueo: Optional[str] = None):
+        """
+        Cola de trabajos atendida por un pool de hilos en segundo plano. Los trabajos
+        interactivos (un texto o documento suelto) tienen su propio pool para no esperar
+        detrás de los Excel grandes.
+
+        El registro de trabajos vive en la memoria de este proceso: /progreso y /resultado
+        solo encuentran un trabajo si los atiende el mismo proceso que lo encoló. El servidor
+        debe ejecutarse como un único proceso con varios hilos (p. ej. gunicorn -w 1 --threads 8).
+        Con `archivo_bloqueo`, el primer trabajo toma un bloqueo exclusivo sobre el archivo y
+        un segundo proceso no puede encolar (ProcesoNoUnico).
+        Args:
+            max_trabajadores (int): Trabajos por lotes que se ejecutan a la vez.
+            retencion (float): Segundos que se conserva un trabajo terminado.
+            max_interactivos (int): Trabajos interactivos que se ejecutan a la vez.
+            archivo_bloqueo (Optional[str]): Archivo que reserva el registro para este proceso.
+        """
+        self.retencion = retencion
+        self.archivo_bloqueo = archivo_bloqueo
+        self._pid = os.getpid()
+        self._bloqueo = None
+        self._ejecutor = ThreadPoolExecutor(max_workers=max_trabajadores, thread_name_prefix="trabajo")
+        self._ejecutor_interactivo = ThreadPoolExecutor(max_workers=max_interactivos,
+                                                        thread_name_prefix="trabajo-interactivo")
+        self._trabajos: Dict[str, Trabajo] = {}
+        self._lock = threading.Lock()
+
+    def encolar(self, funcion: Callable[..., Dict[str, Any]], *args, paralelismo: int = 1,
+                interactivo: bool = False, **kwargs) -> Trabajo:
+        """
+        Encola un trabajo. La función recibe el `Trabajo` como primer argumento
+        y devuelve los datos que se mostrarán al terminar, o {"error": ...} si falló.
+        Args:
+            funcion (Callable): Función a ejecutar en segundo plano.
+            paralelismo (int): Filas evaluadas a la vez (para estimar el ETA).
+            interactivo (bool): Ejecutarlo en el pool de trabajos interactivos.
+        Returns:
+            Trabajo: Trabajo creado.
+        """
+        self._purgar()
+        trabajo = Trabajo(paralelismo)
+        with self._lock:
+            self._reservar_proceso()
+            self._trabajos[trabajo.id] = trabajo
+        ejecutor = self._ejecutor_interactivo if interactivo else self._ejecutor
+        ejecutor.submit(self._ejecutar, trabajo, funcion, args, kwargs)
+        return trabajo
+
+    def _reservar_proceso(self) -> None:
+        """
+        Comprueba que solo este proceso encola trabajos. El bloqueo se toma con el primer
+        trabajo y no al crear el gestor: así el proceso vigilante del recargador de Flask,
+        que importa la aplicación pero no atiende peticiones, no lo retiene.
+        """
+        if os.getpid() != self._pid:
+            # Los hilos de los pools no sobreviven a un fork (p. ej. gunicorn --preload con varios workers)
+            raise ProcesoNoUnico("El gestor de trabajos se creó en otro proceso: ejecute un único proceso.")
+        if self._bloqueo is not None or not self.archivo_bloqueo or fcntl is None:
+            return
+        carpeta = os.path.dirname(self.archivo_bloqueo)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        archivo = open(self.archivo_bloqueo, "a")
+        try:
+            fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            archivo.close()
+            raise ProcesoNoUnico(f"Otro proceso ya atiende trabajos ({self.archivo_bloqueo}): "
+                                 "el registro de trabajos exige un único proceso con varios hilos.")
+        self._bloqueo = archivo
+
+    def obtener(self, id_trabajo: str) -> Optional[Trabajo]:
+        with self._lock:
+            return self._trabajos.get(id_trabajo)
+
+    def _ejecutar(self, trabajo: Trabajo, funcion: Callable, args: tuple, kwargs: dict) -> None:
+        trabajo.estado = "en_proceso"
+        try:
+            resultado = funcion(trabajo, *args, **kwargs)
+            # Los fallos previstos (archivo ilegible, modelo caído) se devuelven como {"error": ...}
+            if isinstance(resultado, dict) and resultado.get("error"):
+                trabajo.error = str(resultado["error"])
+                trabajo.estado = "error"
+            else:
+                trabajo.resultado = resultado
+                trabajo.estado = "completado"
+        except Exception as e:
+            print(f"Error en el trabajo {trabajo.id}: {e}")
+            trabajo.error = str(e)
+            trabajo.estado = "error"
+        finally:
+            trabajo.finalizado = time.time()
+
+    def _purgar(self) -> None:
+        """Elimina los trabajos terminados hace más de `retencion` segundos."""
+        limite = time.time() - self.retencion
+        with self._lock:
+            for id_trabajo in [i for i, t in self._trabajos.items()
+                               if t.finalizado is not None and t.finalizado < limite]:
+                del self._trabajos[id_trabajo]